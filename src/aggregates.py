@@ -0,0 +1,236 @@
+import contextlib
+from sqlalchemy import Engine, text
+
+
+# Every aggregate is described by the source table it follows, the columns
+# whose update changes it, and the statements that add a row ({row} = NEW) to
+# or remove a row ({row} = OLD) from the summary. Updates remove the old row
+# and add the new one. Groups that drop to zero are deleted so the summaries
+# hold exactly the groups the plain GROUP BY queries return. Running sums are
+# reset to exactly 0 when their count drops to 0 so float drift does not stick.
+AGGREGATES = {
+    "user_media_counts_entries": {
+        "table": "watchlist_media",
+        "update_of": "watchlists_id",
+        "add": """
+            INSERT INTO agg_user_media_counts (user_id, media_count)
+            SELECT user_id, 1 FROM watchlists WHERE id = {row}.watchlists_id AND user_id IS NOT NULL
+            ON CONFLICT(user_id) DO UPDATE SET media_count = media_count + 1;
+        """,
+        "remove": """
+            UPDATE agg_user_media_counts SET media_count = media_count - 1
+            WHERE user_id = (SELECT user_id FROM watchlists WHERE id = {row}.watchlists_id);
+            DELETE FROM agg_user_media_counts
+            WHERE user_id = (SELECT user_id FROM watchlists WHERE id = {row}.watchlists_id) AND media_count <= 0;
+        """,
+    },
+    "user_media_counts_watchlists": {
+        "table": "watchlists",
+        "update_of": "user_id",
+        "add": """
+            INSERT INTO agg_user_media_counts (user_id, media_count)
+            SELECT {row}.user_id, entries FROM (
+                SELECT count(*) AS entries FROM watchlist_media WHERE watchlists_id = {row}.id
+            ) WHERE entries > 0 AND {row}.user_id IS NOT NULL
+            ON CONFLICT(user_id) DO UPDATE SET media_count = media_count + excluded.media_count;
+        """,
+        "remove": """
+            UPDATE agg_user_media_counts
+            SET media_count = media_count - (SELECT count(*) FROM watchlist_media WHERE watchlists_id = {row}.id)
+            WHERE user_id = {row}.user_id;
+            DELETE FROM agg_user_media_counts WHERE user_id = {row}.user_id AND media_count <= 0;
+        """,
+    },
+    "media_review_stats": {
+        "table": "reviews",
+        "update_of": "media_id, rating",
+        "add": """
+            INSERT INTO agg_media_review_stats (media_id, review_count, rating_sum)
+            SELECT {row}.media_id, 1, coalesce({row}.rating, 0) WHERE {row}.media_id IS NOT NULL
+            ON CONFLICT(media_id) DO UPDATE SET
+                review_count = review_count + 1,
+                rating_sum = rating_sum + excluded.rating_sum;
+        """,
+        "remove": """
+            UPDATE agg_media_review_stats
+            SET review_count = review_count - 1, rating_sum = rating_sum - coalesce({row}.rating, 0)
+            WHERE media_id = {row}.media_id;
+            DELETE FROM agg_media_review_stats WHERE media_id = {row}.media_id AND review_count <= 0;
+        """,
+    },
+    # Every genre has a row, also when none of its media is rated (rating_count
+    # 0, average NULL like AVG over only NULLs); it goes with the last media
+    "genre_rating_stats": {
+        "table": "medias",
+        "update_of": "genre, rating",
+        "add": """
+            INSERT INTO agg_genre_rating_stats (genre, rating_count, rating_sum)
+            VALUES ({row}.genre, {row}.rating IS NOT NULL, coalesce({row}.rating, 0))
+            ON CONFLICT(genre) DO UPDATE SET
+                rating_count = rating_count + excluded.rating_count,
+                rating_sum = rating_sum + excluded.rating_sum;
+        """,
+        "remove": """
+            UPDATE agg_genre_rating_stats
+            SET rating_count = rating_count - 1,
+                rating_sum = CASE WHEN rating_count = 1 THEN 0 ELSE rating_sum - {row}.rating END
+            WHERE genre = {row}.genre AND {row}.rating IS NOT NULL;
+            DELETE FROM agg_genre_rating_stats
+            WHERE genre = {row}.genre AND NOT EXISTS (SELECT 1 FROM medias WHERE genre = {row}.genre);
+        """,
+    },
+    "series_episode_counts": {
+        "table": "episodes",
+        "update_of": "series_id",
+        "add": """
+            INSERT INTO agg_series_episode_counts (series_id, episode_count)
+            VALUES ({row}.series_id, 1)
+            ON CONFLICT(series_id) DO UPDATE SET episode_count = episode_count + 1;
+        """,
+        "remove": """
+            UPDATE agg_series_episode_counts SET episode_count = episode_count - 1
+            WHERE series_id = {row}.series_id;
+            DELETE FROM agg_series_episode_counts WHERE series_id = {row}.series_id AND episode_count <= 0;
+        """,
+    },
+    "subscription_revenue": {
+        "table": "subscriptions",
+        "update_of": "subscription_type, price",
+        "add": """
+            INSERT INTO agg_subscription_revenue (subscription_type, subscription_count, total_revenue)
+            VALUES ({row}.subscription_type, 1, {row}.price)
+            ON CONFLICT(subscription_type) DO UPDATE SET
+                subscription_count = subscription_count + 1,
+                total_revenue = total_revenue + excluded.total_revenue;
+        """,
+        "remove": """
+            UPDATE agg_subscription_revenue
+            SET subscription_count = subscription_count - 1, total_revenue = total_revenue - {row}.price
+            WHERE subscription_type = {row}.subscription_type;
+            DELETE FROM agg_subscription_revenue
+            WHERE subscription_type = {row}.subscription_type AND subscription_count <= 0;
+        """,
+    },
+}
+
+AGGREGATE_TABLES = {
+    "agg_user_media_counts", "agg_media_review_stats", "agg_genre_rating_stats",
+    "agg_series_episode_counts", "agg_subscription_revenue",
+}
+
+# Full recomputation, used to backfill databases created before the triggers
+REFRESH_STATEMENTS = [
+    "DELETE FROM agg_user_media_counts",
+    """
+    INSERT INTO agg_user_media_counts (user_id, media_count)
+    SELECT watchlists.user_id, count(*) FROM watchlists
+    JOIN watchlist_media ON watchlists.id = watchlist_media.watchlists_id
+    WHERE watchlists.user_id IS NOT NULL
+    GROUP BY watchlists.user_id
+    """,
+    "DELETE FROM agg_media_review_stats",
+    """
+    INSERT INTO agg_media_review_stats (media_id, review_count, rating_sum)
+    SELECT media_id, count(*), coalesce(sum(rating), 0) FROM reviews
+    WHERE media_id IS NOT NULL
+    GROUP BY media_id
+    """,
+    "DELETE FROM agg_genre_rating_stats",
+    """
+    INSERT INTO agg_genre_rating_stats (genre, rating_count, rating_sum)
+    SELECT genre, count(rating), coalesce(sum(rating), 0) FROM medias
+    GROUP BY genre
+    """,
+    "DELETE FROM agg_series_episode_counts",
+    """
+    INSERT INTO agg_series_episode_counts (series_id, episode_count)
+    SELECT series_id, count(*) FROM episodes GROUP BY series_id
+    """,
+    "DELETE FROM agg_subscription_revenue",
+    """
+    INSERT INTO agg_subscription_revenue (subscription_type, subscription_count, total_revenue)
+    SELECT subscription_type, count(*), sum(price) FROM subscriptions GROUP BY subscription_type
+    """,
+]
+
+
+def aggregate_trigger_statements():
+    """Builds the CREATE TRIGGER statements for all AGGREGATES."""
+    statements = []
+    for name, aggregate in AGGREGATES.items():
+        table = aggregate["table"]
+        add_new = aggregate["add"].format(row="NEW")
+        remove_old = aggregate["remove"].format(row="OLD")
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{name}_insert AFTER INSERT ON {table} "
+            f"BEGIN {add_new} END"
+        )
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{name}_delete AFTER DELETE ON {table} "
+            f"BEGIN {remove_old} END"
+        )
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{name}_update AFTER UPDATE OF {aggregate['update_of']} ON {table} "
+            f"BEGIN {remove_old} {add_new} END"
+        )
+    return statements
+
+
+def _transaction(bind):
+    # An Engine gets its own transaction, a Connection (e.g. inside
+    # AsyncConnection.run_sync) is used as is
+    return bind.begin() if isinstance(bind, Engine) else contextlib.nullcontext(bind)
+
+
+def install_aggregate_triggers(bind):
+    """
+    Creates the triggers that keep the agg_* tables up to date, replacing
+    triggers installed from an older definition. Idempotent.
+
+    Returns:
+        list: Names of the triggers created or replaced.
+    """
+    changed = []
+    with _transaction(bind) as connection:
+        installed = dict(connection.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")).all())
+        for statement in aggregate_trigger_statements():
+            name = statement.split()[5]
+            # sqlite_master keeps the statement without IF NOT EXISTS
+            if installed.get(name) == statement.replace(" IF NOT EXISTS", "", 1):
+                continue
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            connection.execute(text(statement))
+            changed.append(name)
+    return changed
+
+
+def refresh_aggregates(bind):
+    """Recomputes every agg_* table from the base tables."""
+    with _transaction(bind) as connection:
+        for statement in REFRESH_STATEMENTS:
+            connection.execute(text(statement))
+
+
+def ensure_aggregates(bind, existing_tables):
+    """
+    Installs the aggregate triggers and backfills the agg_* tables when they
+    or their triggers are new, e.g. on a database created before them.
+
+    Parameters:
+    ----------
+    bind : Engine or Connection
+        The database.
+    existing_tables : iterable of str
+        Tables that existed before Base.metadata.create_all ran.
+
+    Returns:
+    -------
+    bool
+        Whether the agg_* tables were recomputed.
+    """
+    with _transaction(bind) as connection:
+        changed = install_aggregate_triggers(connection)
+        if changed or not AGGREGATE_TABLES <= set(existing_tables):
+            refresh_aggregates(connection)
+            return True
+    return False
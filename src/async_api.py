@@ -0,0 +1,212 @@
+import asyncio
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from neo4j import AsyncGraphDatabase
+
+from classes import Base, Watchlist, Media, watchlist_media
+from aggregates import ensure_aggregates
+from change_log import install_change_capture
+from queries import Queries, STREAM_PAGE_SIZE
+from read_model import READ_MODELS, WatchlistMediaRow
+from recommendations import SIMILAR_MEDIA_QUERY, RECOMMEND_FOR_USER_QUERY
+from utils import ENGINE_PROFILES, apply_pragmas, ensure_indexes, FIND_WATCHLIST_QUERY, FIND_USERS_FOR_MOVIE_QUERY, ALL_REVIEWS_QUERY
+
+
+# Default number of lookups gather_limited lets run at the same time
+DEFAULT_CONCURRENCY = 32
+
+
+# SQLite side (aiosqlite)
+
+def create_async_tuned_engine(database_name:str, profile:str="default"):
+    """
+    Async counterpart of utils.create_tuned_engine, using the aiosqlite driver.
+
+    The connect-time pragmas of the profile are applied through the
+    underlying sync engine, pool settings are passed through unchanged.
+    """
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown engine profile '{profile}', expected one of {list(ENGINE_PROFILES)}")
+    settings = ENGINE_PROFILES[profile]
+    engine = create_async_engine(f'sqlite+aiosqlite:///{database_name}', **settings["pool"])
+    apply_pragmas(engine.sync_engine, settings["pragmas"])
+    return engine
+
+
+async def async_setup(database_name:str, profile:str="default", change_capture:bool=False):
+    """
+    Async counterpart of utils.setup: creates the tables, missing indexes,
+    aggregate triggers and, with change_capture=True, the change capture
+    triggers if needed and returns a session factory and the engine.
+
+    Returns:
+    -------
+    Session : async_sessionmaker
+        Factory for AsyncSession objects, use one session per concurrent task.
+    engine : AsyncEngine
+        The async engine.
+    """
+    engine = create_async_tuned_engine(database_name, profile)
+    async with engine.begin() as connection:
+        existing_tables = await connection.run_sync(lambda sync_connection: inspect(sync_connection).get_table_names())
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.run_sync(ensure_indexes)
+        await connection.run_sync(ensure_aggregates, existing_tables)
+        if change_capture:
+            await connection.run_sync(install_change_capture)
+    Session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    return Session, engine
+
+
+class AsyncQueries:
+    """
+    The Queries aggregations for AsyncSession, returning rows as dicts
+    instead of printing them.
+
+    The query builders of Queries are reused as is through
+    AsyncSession.run_sync, so both APIs always run the same SQL.
+    """
+
+    def __init__(self, materialized=False):
+        self.queries = Queries(materialized)
+
+    async def fetch(self, session, name):
+        """
+        Runs one of the Queries aggregations.
+
+        Parameters:
+        ----------
+        session : AsyncSession
+            The session to query with.
+        name : str
+            Name of the query, e.g. 'count_reviews_per_media'.
+
+        Returns:
+        -------
+        list of dict
+            One dict per group, keyed by column name, in the Queries order.
+        """
+        def run(sync_session):
+            query, key = getattr(self.queries, f"_{name}")(sync_session)
+            names = [description["name"] for description in query.column_descriptions]
+            return [dict(zip(names, row)) for row in query.order_by(key).all()]
+        return await session.run_sync(run)
+
+    async def count_media_per_user(self, session):
+        return await self.fetch(session, "count_media_per_user")
+
+    async def average_rating_by_genre(self, session):
+        return await self.fetch(session, "average_rating_by_genre")
+
+    async def count_reviews_per_media(self, session):
+        return await self.fetch(session, "count_reviews_per_media")
+
+    async def total_revenue_by_subscription_type(self, session):
+        return await self.fetch(session, "total_revenue_by_subscription_type")
+
+    async def count_episodes_per_series(self, session):
+        return await self.fetch(session, "count_episodes_per_series")
+
+
+async def fetch_listing(session, name, after=None, limit=STREAM_PAGE_SIZE):
+    """
+    Returns one keyset page of a read_model listing, the async form of the
+    print_data listings.
+
+    Parameters:
+    ----------
+    session : AsyncSession
+        The session to query with.
+    name : str
+        One of read_model.READ_MODELS ('users', 'media', 'reviews', ...).
+    after : int, optional
+        Only rows with an id greater than this, i.e. the last id of the previous page.
+    limit : int
+        Maximum number of rows.
+
+    Returns:
+    -------
+    list
+        read_model named tuples ordered by id.
+    """
+    row_type, query, key = READ_MODELS[name]
+    if after is not None:
+        query = query.where(key > after)
+    result = await session.execute(query.order_by(key).limit(limit))
+    return [row_type._make(row) for row in result]
+
+
+async def fetch_watchlist_media(session, watchlist_id):
+    """Returns the WatchlistMediaRow entries of one watchlist ordered by media id."""
+    watchlists = Watchlist.__table__
+    medias = Media.__table__
+    result = await session.execute(
+        select(watchlists.c.id, watchlists.c.user_id, medias.c.id, medias.c.title)
+        .join_from(watchlists, watchlist_media, watchlist_media.c.watchlists_id == watchlists.c.id)
+        .join(medias, medias.c.id == watchlist_media.c.medias_id)
+        .where(watchlists.c.id == watchlist_id)
+        .order_by(medias.c.id)
+    )
+    return [WatchlistMediaRow._make(row) for row in result]
+
+
+# Graph side (async Neo4j driver)
+
+def neo4j_async_init(uri, auth=None):
+    """
+    Creates an async Neo4j driver. Unlike neo4j_init nothing is run here,
+    call await driver.verify_connectivity() to test the connection.
+    """
+    return AsyncGraphDatabase.driver(uri, auth=auth)
+
+
+async def run_read(driver, query, **parameters):
+    """Runs a read query and returns its records as a list of dicts."""
+    async with driver.session() as session:
+        result = await session.run(query, parameters)
+        return await result.data()
+
+
+async def find_watchlist_for_user(driver, user_id):
+    """[{'User', 'Movie', 'ReleaseYear'}] for the movies on a user's watchlist."""
+    return await run_read(driver, FIND_WATCHLIST_QUERY, user_id=user_id)
+
+
+async def find_users_for_movie(driver, movie_id):
+    """[{'Movie', 'User', 'Email'}] for the users with a movie on their watchlist."""
+    return await run_read(driver, FIND_USERS_FOR_MOVIE_QUERY, movie_id=movie_id)
+
+
+async def get_all_reviews(driver):
+    """[{'ReviewerID', 'ReviewID', 'Rating', 'MovieTitle', 'ReleaseYear'}] ordered by rating, highest first."""
+    return await run_read(driver, ALL_REVIEWS_QUERY)
+
+
+async def find_similar_media(driver, media_id, limit=10):
+    """[{'MediaID', 'Title', 'Score'}] precomputed SIMILAR_TO neighbours of a media."""
+    return await run_read(driver, SIMILAR_MEDIA_QUERY, media_id=media_id, limit=limit)
+
+
+async def recommend_for_user(driver, user_id, limit=10):
+    """[{'MediaID', 'Title', 'Score'}] media similar to a user's watchlist that are not on it."""
+    return await run_read(driver, RECOMMEND_FOR_USER_QUERY, user_id=user_id, limit=limit)
+
+
+async def gather_limited(awaitables, limit=DEFAULT_CONCURRENCY):
+    """
+    Awaits all awaitables with at most limit of them running at once and
+    returns their results in order.
+
+    Example:
+        watchlists = await gather_limited(
+            find_watchlist_for_user(driver, user_id) for user_id in user_ids
+        )
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(bounded(awaitable) for awaitable in awaitables))
+
@@ -0,0 +1,236 @@
+import argparse
+import bisect
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+from collections import Counter, defaultdict
+import sqlalchemy
+
+from utils import setup
+from classes import Media, Review
+from queries import Queries
+from query_plans import query_methods
+import columnar_export as cex
+import export as exp
+import populate_data as ppd
+import print_data as prd
+import synthetic_data as syn
+
+
+POPULATE_FUNCTIONS = [
+    ppd.populate_users,
+    ppd.populate_watchlists,
+    ppd.populate_media,
+    ppd.populate_cast,
+    ppd.populate_episodes,
+    ppd.populate_reviews,
+    ppd.populate_watchlist_media,
+]
+
+EXPORT_FUNCTIONS = [
+    prd.queries_to_json,
+    prd.reviewandwatchlist_to_json,
+]
+
+# Streaming exports of export.py, timed per (name, format, compression)
+STREAMING_EXPORTS = [
+    ("table", "reviews", "ndjson", None),
+    ("table", "reviews", "ndjson", "gzip"),
+    ("table", "watchlist_media", "json", None),
+    ("read_model", "media", "ndjson", None),
+    ("query", "count_reviews_per_media", "ndjson", None),
+]
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+
+def timed(results, group, name, function, *args, **kwargs):
+    """Runs function with stdout silenced and appends its wall time to results."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        value = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    results.append({"group": group, "name": name, "seconds": round(elapsed, 6)})
+    return value
+
+
+# Naive counterparts of the ranking queries: fetch the raw rows and rank in Python
+
+def naive_top_media_by_rating(session, n=10, min_reviews=5):
+    ratings = defaultdict(list)
+    for media_id, rating in session.query(Review.media_id, Review.rating).filter(Review.rating.isnot(None)):
+        ratings[media_id].append(rating)
+    titles = dict(session.query(Media.id, Media.title))
+    averages = sorted(
+        ((sum(values) / len(values), len(values), media_id)
+         for media_id, values in ratings.items() if len(values) >= min_reviews),
+        key=lambda item: (-item[0], item[2])
+    )
+    result = []
+    for position, (average, count, media_id) in enumerate(averages, 1):
+        rank = result[-1][3] if result and result[-1][1] == average else position
+        if rank > n:
+            break
+        result.append([titles[media_id], average, count, rank])
+    return result
+
+
+def naive_top_genres_per_decade(session, n=3):
+    counts = defaultdict(Counter)
+    for genre, release_year in session.query(Media.genre, Media.release_year):
+        counts[release_year // 10 * 10][genre] += 1
+    result = []
+    for decade in sorted(counts):
+        ranked = sorted(counts[decade].items(), key=lambda item: (-item[1], item[0]))
+        result.extend([decade, genre, count, rank] for rank, (genre, count) in enumerate(ranked[:n], 1))
+    return result
+
+
+def naive_rating_percentiles_by_genre(session, percentiles=(0.25, 0.5, 0.75, 0.9)):
+    ratings = defaultdict(list)
+    query = session.query(Media.genre, Review.rating).join(Review, Media.id == Review.media_id) \
+        .filter(Review.rating.isnot(None))
+    for genre, rating in query:
+        ratings[genre].append(rating)
+    result = []
+    for genre in sorted(ratings):
+        values = sorted(ratings[genre])
+        # Nearest rank: the smallest value whose cumulative share reaches the percentile
+        row = [genre]
+        for percentile in percentiles:
+            index = next(i for i, value in enumerate(values)
+                         if bisect.bisect_right(values, value) / len(values) >= percentile)
+            row.append(values[index])
+        result.append(row)
+    return result
+
+
+def rows_match(rows, expected, rel_tol=1e-9):
+    """
+    Compares query results row by row, floats with math.isclose: SQL AVG and
+    a Python mean add up the same values in different orders.
+    """
+    if len(rows) != len(expected):
+        return False
+    for row, expected_row in zip(rows, expected):
+        if len(row) != len(expected_row):
+            return False
+        for value, expected_value in zip(row, expected_row):
+            if isinstance(value, float) and isinstance(expected_value, float):
+                if not math.isclose(value, expected_value, rel_tol=rel_tol):
+                    return False
+            elif value != expected_value:
+                return False
+    return True
+
+
+RANKING_QUERIES = {
+    "top_media_by_rating": naive_top_media_by_rating,
+    "top_genres_per_decade": naive_top_genres_per_decade,
+    "rating_percentiles_by_genre": naive_rating_percentiles_by_genre,
+}
+
+
+def run_benchmark(scale, workdir, seed=42, profile="bulk_load"):
+    """
+    Generates a synthetic database of the given scale in workdir and times the
+    loaders, every Queries method (plain and materialized), the ranking
+    queries against their naive counterparts and the exports (print_data
+    JSON files, the streaming exports of export.py and, when pyarrow is
+    installed, the columnar exports of columnar_export.py).
+
+    Returns:
+        list: One {"group", "name", "seconds"} dict per measurement.
+    """
+    results = []
+    database = os.path.join(workdir, "benchmark.db")
+    catalog_file = os.path.join(workdir, "catalog.jsonl")
+    session, engine = setup(database, profile)
+
+    timed(results, "populate", "populate_synthetic", syn.populate_synthetic, session, scale, catalog_file, seed)
+
+    # The sample loaders use fixed ids, run them against a second, empty database
+    sample_session, sample_engine = setup(os.path.join(workdir, "sample.db"), profile)
+    for function in POPULATE_FUNCTIONS:
+        timed(results, "populate", function.__name__, function, sample_session)
+    sample_session.close()
+    sample_engine.dispose()
+
+    for materialized in (False, True):
+        queries = Queries(materialized=materialized)
+        group = "queries_materialized" if materialized else "queries"
+        for name in query_methods():
+            timed(results, group, name, getattr(queries, name), session)
+
+    # Window function rankings against fetching everything and ranking in Python
+    queries = Queries()
+    for name, naive in RANKING_QUERIES.items():
+        ranked = timed(results, "ranking", name, getattr(queries, name), session)
+        expected = timed(results, "ranking_naive", name, naive, session)
+        if not rows_match(ranked, expected):
+            raise AssertionError(f"{name} differs from its naive counterpart")
+
+    # The exports write to json/ relative to the working directory
+    os.makedirs(os.path.join(workdir, "json"), exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for function in EXPORT_FUNCTIONS:
+            timed(results, "export", function.__name__, function, session)
+    finally:
+        os.chdir(cwd)
+
+    export_dir = os.path.join(workdir, "exports")
+    os.makedirs(export_dir, exist_ok=True)
+    for kind, name, fmt, compression in STREAMING_EXPORTS:
+        suffix = f".{fmt}" + (".gz" if compression == "gzip" else "")
+        filename = os.path.join(export_dir, f"{name}{suffix}")
+        function = {"table": exp.export_table, "read_model": exp.export_read_model,
+                    "query": exp.export_query}[kind]
+        timed(results, "export_streaming", f"{kind}:{name}{suffix}", function, session, name, filename,
+              fmt, compression)
+    if cex.pa is not None:
+        for fmt in COLUMNAR_FORMATS:
+            timed(results, "export_columnar", fmt, cex.export_all_columnar, engine,
+                  os.path.join(export_dir, fmt), fmt)
+
+    session.close()
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times loaders, queries and exports on synthetic data.")
+    parser.add_argument("--scale", action="append", choices=list(syn.SCALES),
+                        help="Scale to run, repeatable (default: 10k)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file for the results")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "seed": args.seed,
+        "runs": [],
+    }
+    for scale in args.scale or ["10k"]:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = run_benchmark(scale, workdir, args.seed)
+        report["runs"].append({"scale": scale, "rows": syn.expected_rows(scale), "results": results})
+        for result in results:
+            print(f"{scale:>4} {result['group']:<22} {result['name']:<36} {result['seconds']:>10.4f}s")
+
+    with open(args.output, "w") as json_file:
+        json.dump(report, json_file, indent=4)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
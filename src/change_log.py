@@ -0,0 +1,214 @@
+import json
+from collections import namedtuple
+from sqlalchemy import delete, func, select, text
+
+from classes import Base, ChangeLog, ChangeConsumerOffset
+from aggregates import _transaction
+
+
+CHANGE_BATCH_SIZE = 1000
+
+# Tables whose row changes are captured into change_log
+CAPTURED_TABLES = (
+    "users", "medias", "movies", "series", "reviews", "watchlists", "watchlist_media",
+    "casts", "actors", "directors",
+)
+
+# Name prefix of the change capture triggers
+TRIGGER_PREFIX = "cdc_"
+
+# One change_log entry, key and data decoded into dicts (data is None for deletes)
+Change = namedtuple("Change", "seq table_name operation key data changed_at")
+
+change_log = ChangeLog.__table__
+
+
+def _json_object(table, row):
+    # json_object('col', NEW.col, ...) for the given columns of a row
+    return "json_object(" + ", ".join(f"'{column.name}', {row}.{column.name}" for column in table) + ")"
+
+
+def change_trigger_statements():
+    """
+    Builds the CREATE TRIGGER statements that append every insert, update
+    and delete on CAPTURED_TABLES to change_log.
+
+    row_key is a JSON object of the primary key columns, data a JSON object
+    of the whole new row. An update that changes the primary key is logged
+    as a delete of the old key followed by an insert of the new one.
+    """
+    statements = []
+    for name in CAPTURED_TABLES:
+        table = Base.metadata.tables[name]
+        primary_key = list(table.primary_key.columns)
+        columns = list(table.columns)
+        key_changed = " OR ".join(f"OLD.{column.name} IS NOT NEW.{column.name}" for column in primary_key)
+
+        def entry(operation, row, data=True):
+            return (
+                f"INSERT INTO change_log (table_name, operation, row_key, data, changed_at) VALUES ("
+                f"'{name}', '{operation}', {_json_object(primary_key, row)}, "
+                f"{_json_object(columns, row) if data else 'NULL'}, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));"
+            )
+
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS cdc_{name}_insert AFTER INSERT ON {name} "
+            f"BEGIN {entry('INSERT', 'NEW')} END"
+        )
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS cdc_{name}_delete AFTER DELETE ON {name} "
+            f"BEGIN {entry('DELETE', 'OLD', data=False)} END"
+        )
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS cdc_{name}_update AFTER UPDATE ON {name} "
+            f"WHEN NOT ({key_changed}) BEGIN {entry('UPDATE', 'NEW')} END"
+        )
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS cdc_{name}_rekey AFTER UPDATE ON {name} "
+            f"WHEN {key_changed} BEGIN {entry('DELETE', 'OLD', data=False)} {entry('INSERT', 'NEW')} END"
+        )
+    return statements
+
+
+def install_change_capture(bind):
+    """
+    Creates the change capture triggers. Idempotent.
+
+    Capture is opt-in (utils.setup(..., change_capture=True)), every captured
+    write costs an extra change_log insert. bind is an Engine or a
+    Connection, e.g. inside AsyncConnection.run_sync.
+    """
+    with _transaction(bind) as connection:
+        for statement in change_trigger_statements():
+            connection.execute(text(statement))
+
+
+def change_capture_installed(bind):
+    """True if the database has change capture triggers."""
+    with _transaction(bind) as connection:
+        return connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name LIKE :prefix LIMIT 1"),
+            {"prefix": TRIGGER_PREFIX + "%"},
+        ).first() is not None
+
+
+def _to_change(row):
+    return Change(row.seq, row.table_name, row.operation, json.loads(row.row_key),
+                  json.loads(row.data) if row.data is not None else None, row.changed_at)
+
+
+def read_changes(session, after=0, limit=CHANGE_BATCH_SIZE, tables=None):
+    """
+    Returns up to limit changes with a sequence number greater than after.
+
+    Parameters:
+    ----------
+    session : Session
+        The session to read with.
+    after : int
+        Offset, i.e. the seq of the last change already processed.
+    limit : int
+        Maximum number of changes.
+    tables : iterable of str, optional
+        Only changes of these tables.
+
+    Returns:
+    -------
+    list of Change
+        Ordered by seq.
+    """
+    query = select(change_log).where(change_log.c.seq > after)
+    if tables is not None:
+        query = query.where(change_log.c.table_name.in_(list(tables)))
+    rows = session.execute(query.order_by(change_log.c.seq).limit(limit))
+    return [_to_change(row) for row in rows]
+
+
+def iter_change_batches(session, after=0, batch_size=CHANGE_BATCH_SIZE, tables=None):
+    """Yields lists of changes after an offset until the log is exhausted."""
+    while True:
+        batch = read_changes(session, after, batch_size, tables)
+        if not batch:
+            return
+        yield batch
+        after = batch[-1].seq
+
+
+def latest_seq(session):
+    """The highest sequence number in the log, 0 if it is empty."""
+    return session.execute(select(func.max(change_log.c.seq))).scalar() or 0
+
+
+class ChangeConsumer:
+    """
+    A named reader of the change log with a committed offset in
+    change_consumer_offsets.
+
+    Typical loop:
+        consumer = ChangeConsumer(session, "search_index")
+        for batch in consumer.batches():
+            apply(batch)
+            consumer.commit(batch[-1].seq)
+
+    Delivery is at least once: changes after the last committed offset are
+    read again after a restart.
+    """
+
+    def __init__(self, session, name, tables=None):
+        self.session = session
+        self.name = name
+        self.tables = tables
+        state = session.get(ChangeConsumerOffset, name)
+        if state is None:
+            state = ChangeConsumerOffset(consumer=name, offset=0)
+            session.add(state)
+            session.commit()
+        self.state = state
+
+    @property
+    def offset(self):
+        return self.state.offset
+
+    def poll(self, limit=CHANGE_BATCH_SIZE):
+        """The next changes after the committed offset, without committing."""
+        return read_changes(self.session, self.offset, limit, self.tables)
+
+    def batches(self, batch_size=CHANGE_BATCH_SIZE):
+        """Yields batches after the committed offset, commit() to advance it."""
+        return iter_change_batches(self.session, self.offset, batch_size, self.tables)
+
+    def commit(self, seq):
+        """Stores seq as processed."""
+        self.state.offset = seq
+        self.session.commit()
+
+    def seek(self, seq=0):
+        """Moves the committed offset, e.g. back to 0 to replay the retained log."""
+        self.commit(seq)
+
+
+def compact(session, latest_only=False):
+    """
+    Shrinks the change log.
+
+    Entries every registered consumer has committed are deleted. With
+    latest_only=True only the newest entry per row is kept among the rest,
+    so an INSERT followed by UPDATEs collapses into the last UPDATE and a
+    row ending with DELETE keeps just its DELETE; consumers then have to
+    treat INSERT and UPDATE alike as upserts.
+
+    Returns:
+    -------
+    int
+        Number of entries removed.
+    """
+    offsets = ChangeConsumerOffset.__table__
+    floor = session.execute(select(func.min(offsets.c.offset))).scalar()
+    removed = 0
+    if floor:
+        removed += session.execute(delete(change_log).where(change_log.c.seq <= floor)).rowcount
+    if latest_only:
+        latest = select(func.max(change_log.c.seq)).group_by(change_log.c.table_name, change_log.c.row_key)
+        removed += session.execute(delete(change_log).where(change_log.c.seq.not_in(latest))).rowcount
+    session.commit()
+    return removed
@@ -3,6 +3,7 @@ from __future__ import annotations
 from sqlalchemy import CheckConstraint
 from typing import List, Optional
 from sqlalchemy import Column
+from sqlalchemy import Index
 from sqlalchemy import Table
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped
@@ -39,6 +40,8 @@ watchlist_media = Table(
     Base.metadata,
     Column("medias_id", ForeignKey("medias.id"), primary_key=True),
     Column("watchlists_id", ForeignKey("watchlists.id"), primary_key=True),
+    # The primary key covers lookups by medias_id, this one covers watchlists_id
+    Index("ix_watchlist_media_watchlists_id_medias_id", "watchlists_id", "medias_id"),
 )
 
 
@@ -61,6 +64,11 @@ class User(Base):
         'polymorphic_on': user_type,
     }
 
+    # Natural key for the upserts in populate_data
+    __table_args__ = (
+        Index('ix_users_email', 'email', unique=True),
+    )
+
 
 class MainUser(User):
     __tablename__ = 'main_users'
@@ -113,18 +121,23 @@ class Subscription(Base):
     subscription_type: Mapped[SubscriptionType] = mapped_column(nullable=False)
     startdate: Mapped[date] = mapped_column(nullable=False)
     enddate: Mapped[date] = mapped_column(nullable=False)
-    main_user_id: Mapped[int] = mapped_column(ForeignKey('main_users.id'), nullable=False)
+    main_user_id: Mapped[int] = mapped_column(ForeignKey('main_users.id'), nullable=False, index=True)
 
     # Relationships
     main_user: Mapped["MainUser"] = relationship(back_populates='subscription')
 
+    # Covering index for total_revenue_by_subscription_type
+    __table_args__ = (
+        Index('ix_subscriptions_subscription_type_price', 'subscription_type', 'price'),
+    )
+
 
 class Watchlist(Base):
     __tablename__ = 'watchlists'
     
     # Attributes
     id:Mapped[int] = mapped_column(primary_key=True,)
-    user_id:Mapped[int] = mapped_column(ForeignKey('users.id'))
+    user_id:Mapped[int] = mapped_column(ForeignKey('users.id'), index=True)
     
     # Relationships
     user:Mapped["User"] = relationship(back_populates='watchlist', single_parent=True)
@@ -152,6 +165,14 @@ class Media(Base):
         'polymorphic_on': media_type,
     }
 
+    # Covering indexes for average_rating_by_genre and top_genres_per_decade,
+    # natural key for the upserts
+    __table_args__ = (
+        Index('ix_medias_genre_rating', 'genre', 'rating'),
+        Index('ix_medias_genre_release_year', 'genre', 'release_year'),
+        Index('ix_medias_title_release_year', 'title', 'release_year', unique=True),
+    )
+
     
 class Review(Base):
     __tablename__ = 'reviews'
@@ -159,13 +180,19 @@ class Review(Base):
     # Attributes
     id:Mapped[int] = mapped_column(primary_key=True,)
     rating:Mapped[float] = mapped_column()
-    user_id:Mapped[int] = mapped_column(ForeignKey('users.id'))
+    user_id:Mapped[int] = mapped_column(ForeignKey('users.id'), index=True)
     media_id:Mapped[int] = mapped_column(ForeignKey('medias.id'))
 
     # Relationships
     user:Mapped["User"] = relationship(back_populates='review')
     media:Mapped["Media"] = relationship(back_populates='review')
 
+    # Covers the media_id lookups and the per media rating aggregations
+    # (top_media_by_rating, rating_percentiles_by_genre)
+    __table_args__ = (
+        Index('ix_reviews_media_id_rating', 'media_id', 'rating'),
+    )
+
 
 class Cast(Base):
     __tablename__ = 'casts'
@@ -174,8 +201,8 @@ class Cast(Base):
     id:Mapped[int] = mapped_column(primary_key=True,)
     description:Mapped[str] = mapped_column(nullable=False)
     type:Mapped[CastType] = mapped_column(nullable=False)
-    movie_id:Mapped[int] = mapped_column(ForeignKey('movies.id'), nullable=True)
-    series_id:Mapped[int] = mapped_column(ForeignKey('series.id'), nullable=True)
+    movie_id:Mapped[int] = mapped_column(ForeignKey('movies.id'), nullable=True, index=True)
+    series_id:Mapped[int] = mapped_column(ForeignKey('series.id'), nullable=True, index=True)
 
     # Relationships
     movie:Mapped["Movie"] = relationship(back_populates='cast',)
@@ -236,11 +263,16 @@ class Episode(Base):
     id:Mapped[int] = mapped_column(primary_key=True,)
     title:Mapped[str] = mapped_column(nullable=False)
     episode_number:Mapped[int] = mapped_column(nullable=False)
-    series_id:Mapped[int] = mapped_column(ForeignKey('series.id'), nullable=False)
+    series_id:Mapped[int] = mapped_column(ForeignKey('series.id'), nullable=False, index=True)
 
     # Relationships
     series:Mapped["Series"] = relationship(back_populates='episode')
 
+    # Natural key for the upserts in populate_data
+    __table_args__ = (
+        Index('ix_episodes_series_id_episode_number', 'series_id', 'episode_number', unique=True),
+    )
+
 
 class Director(Cast):
     __tablename__ = 'directors'
@@ -266,3 +298,84 @@ class Actor(Cast):
     __mapper_args__ = {
         'polymorphic_identity': CastType.ACTOR,
     }
+
+
+class GraphSyncState(Base):
+    __tablename__ = 'graph_sync_state'
+
+    # Attributes
+    source:Mapped[str] = mapped_column(primary_key=True)
+    high_water_mark:Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+# Change data capture, written by the triggers in change_log.py
+
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+
+    # Attributes
+    seq:Mapped[int] = mapped_column(primary_key=True)
+    table_name:Mapped[str] = mapped_column(nullable=False)
+    operation:Mapped[str] = mapped_column(nullable=False)
+    row_key:Mapped[str] = mapped_column(nullable=False)
+    data:Mapped[Optional[str]] = mapped_column()
+    changed_at:Mapped[str] = mapped_column(nullable=False)
+
+    # AUTOINCREMENT so sequence numbers are never reused after compaction
+    __table_args__ = (
+        Index('ix_change_log_table_name_row_key', 'table_name', 'row_key'),
+        {'sqlite_autoincrement': True},
+    )
+
+
+class ChangeConsumerOffset(Base):
+    __tablename__ = 'change_consumer_offsets'
+
+    # Attributes
+    consumer:Mapped[str] = mapped_column(primary_key=True)
+    offset:Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+# Materialized aggregates, maintained by the triggers in aggregates.py
+
+class UserMediaCount(Base):
+    __tablename__ = 'agg_user_media_counts'
+
+    # Attributes
+    user_id:Mapped[int] = mapped_column(primary_key=True)
+    media_count:Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class MediaReviewStats(Base):
+    __tablename__ = 'agg_media_review_stats'
+
+    # Attributes
+    media_id:Mapped[int] = mapped_column(primary_key=True)
+    review_count:Mapped[int] = mapped_column(nullable=False, default=0)
+    rating_sum:Mapped[float] = mapped_column(nullable=False, default=0)
+
+
+class GenreRatingStats(Base):
+    __tablename__ = 'agg_genre_rating_stats'
+
+    # Attributes
+    genre:Mapped[str] = mapped_column(primary_key=True)
+    rating_count:Mapped[int] = mapped_column(nullable=False, default=0)
+    rating_sum:Mapped[float] = mapped_column(nullable=False, default=0)
+
+
+class SeriesEpisodeCount(Base):
+    __tablename__ = 'agg_series_episode_counts'
+
+    # Attributes
+    series_id:Mapped[int] = mapped_column(primary_key=True)
+    episode_count:Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class SubscriptionRevenue(Base):
+    __tablename__ = 'agg_subscription_revenue'
+
+    # Attributes
+    subscription_type:Mapped[SubscriptionType] = mapped_column(primary_key=True)
+    subscription_count:Mapped[int] = mapped_column(nullable=False, default=0)
+    total_revenue:Mapped[float] = mapped_column(nullable=False, default=0)
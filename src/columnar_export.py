@@ -0,0 +1,155 @@
+import os
+import time
+from datetime import date
+from sqlalchemy import Date, Float, Integer, select
+
+from classes import Base, Media, Movie, Series, Cast, Actor, Director
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional, only needed for the columnar exports
+    pa = None
+
+
+CHUNK_SIZE = 100000
+COLUMNAR_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+medias = Media.__table__
+casts = Cast.__table__
+
+# Joined-inheritance subclasses flattened with their base table columns
+FLATTENED_VIEWS = {
+    "movies_flat": select(medias, Movie.__table__.c.duration)
+        .join_from(medias, Movie.__table__, Movie.__table__.c.id == medias.c.id),
+    "series_flat": select(medias, Series.__table__.c.season_count)
+        .join_from(medias, Series.__table__, Series.__table__.c.id == medias.c.id),
+    "actors_flat": select(casts, Actor.__table__.c.name)
+        .join_from(casts, Actor.__table__, Actor.__table__.c.id == casts.c.id),
+    "directors_flat": select(casts, Director.__table__.c.name)
+        .join_from(casts, Director.__table__, Director.__table__.c.id == casts.c.id),
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The columnar exports require the pyarrow package")
+
+
+def arrow_type(column_type):
+    """Arrow type for a SQLAlchemy column type. Enums and strings map to string."""
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def arrow_schema(statement):
+    """Builds the Arrow schema of a select from its column types."""
+    return pa.schema([
+        pa.field(column.name, arrow_type(column.type))
+        for column in statement.selected_columns
+    ])
+
+
+def _convert_column(values, field):
+    # SQLite hands back dates as ISO strings
+    if field.type == pa.date32():
+        return [date.fromisoformat(value) if value is not None else None for value in values]
+    return values
+
+
+def record_batches(engine, statement, chunk_size=CHUNK_SIZE):
+    """
+    Yields Arrow record batches of chunk_size rows fetched straight from the DBAPI cursor.
+
+    No ORM objects or SQLAlchemy rows are built, the raw tuples of each
+    fetchmany call are transposed into columns.
+    """
+    _require_pyarrow()
+    schema = arrow_schema(statement)
+    sql = str(statement.compile(engine))
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            arrays = [
+                pa.array(_convert_column(values, field), type=field.type)
+                for values, field in zip(columns, schema)
+            ]
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+        cursor.close()
+    finally:
+        connection.close()
+
+
+def export_columnar(engine, statement, filename, fmt="parquet", chunk_size=CHUNK_SIZE):
+    """
+    Writes the result of a select to a Parquet or Arrow IPC file chunk by chunk.
+
+    Returns:
+        int: Number of rows written.
+    """
+    _require_pyarrow()
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {list(COLUMNAR_FORMATS)}")
+    schema = arrow_schema(statement)
+    rows = 0
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(filename, schema)
+    else:
+        writer = pa.ipc.new_file(filename, schema)
+    try:
+        for batch in record_batches(engine, statement, chunk_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+
+def export_all_columnar(engine, directory, fmt="parquet", chunk_size=CHUNK_SIZE, include_tables=True):
+    """
+    Exports every table and the FLATTENED_VIEWS to one columnar file each.
+
+    Parameters:
+    ----------
+    engine : Engine
+        Engine of the database to export.
+    directory : str
+        Output directory, files are named after the table or view.
+    fmt : str
+        'parquet' or 'arrow'.
+    chunk_size : int
+        Rows per fetchmany call and record batch.
+    include_tables : bool
+        Export the plain tables next to the flattened views.
+
+    Returns:
+    -------
+    dict
+        Rows written per table or view.
+    """
+    os.makedirs(directory, exist_ok=True)
+    statements = {}
+    if include_tables:
+        statements.update({name: select(table) for name, table in Base.metadata.tables.items()})
+    statements.update(FLATTENED_VIEWS)
+
+    counts = {}
+    start = time.perf_counter()
+    for name, statement in statements.items():
+        filename = os.path.join(directory, name + COLUMNAR_FORMATS[fmt])
+        counts[name] = export_columnar(engine, statement, filename, fmt, chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"Exported {sum(counts.values())} rows to {directory} as {fmt} in {elapsed:.2f}s")
+    return counts
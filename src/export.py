@@ -0,0 +1,190 @@
+import gzip
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from enum import Enum
+from sqlalchemy import literal_column, select
+from sqlalchemy.orm import sessionmaker
+
+from classes import Base
+from queries import Queries, STREAM_PAGE_SIZE
+import read_model
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for compression="zstd"
+    zstandard = None
+
+
+FORMATS = ("ndjson", "json")
+COMPRESSIONS = (None, "gzip", "zstd")
+
+
+def json_default(value):
+    """json.dumps fallback for the enum and date columns of the models."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    return json.dumps(value, default=json_default)
+
+
+def open_output(filename, compression=None):
+    """Opens filename for writing text, optionally gzip or zstd compressed."""
+    if compression is None:
+        return open(filename, "w")
+    if compression == "gzip":
+        return gzip.open(filename, "wt")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("compression='zstd' requires the zstandard package")
+        return zstandard.open(filename, "wt")
+    raise ValueError(f"Unknown compression '{compression}', expected one of {COMPRESSIONS}")
+
+
+def table_rows(session, table_name, page_size=STREAM_PAGE_SIZE):
+    """
+    Yields every row of a table as a dict, paging on rowid so memory stays constant.
+
+    Works for all tables of the schema, including watchlist_media which has no id.
+    """
+    table = Base.metadata.tables[table_name]
+    rowid = literal_column(f"{table_name}.rowid")
+    query = select(rowid.label("_rowid"), *table.columns).order_by(rowid).limit(page_size)
+    last_rowid = None
+    while True:
+        page_query = query if last_rowid is None else query.where(rowid > last_rowid)
+        page = session.execute(page_query).mappings().all()
+        if not page:
+            return
+        for row in page:
+            yield {name: value for name, value in row.items() if name != "_rowid"}
+        last_rowid = page[-1]["_rowid"]
+
+
+def query_rows(session, name, queries=None, page_size=STREAM_PAGE_SIZE):
+    """Yields the rows of a Queries method as dicts keyed by column name."""
+    queries = queries or Queries()
+    columns = queries.column_names(session, name)
+    for row in queries.stream(session, name, page_size):
+        yield dict(zip(columns, row))
+
+
+def write_rows(handle, rows, fmt="ndjson"):
+    """
+    Writes rows to an open text handle one at a time.
+
+    fmt='ndjson' writes one JSON document per line, fmt='json' writes a single
+    JSON array. Returns the number of rows written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+    count = 0
+    if fmt == "ndjson":
+        for row in rows:
+            handle.write(dumps(row))
+            handle.write("\n")
+            count += 1
+        return count
+
+    handle.write("[")
+    for row in rows:
+        handle.write(",\n    " if count else "\n    ")
+        handle.write(dumps(row))
+        count += 1
+    handle.write("\n]" if count else "]")
+    return count
+
+
+def export_rows(rows, filename, fmt="ndjson", compression=None):
+    """Streams rows to filename as NDJSON or a JSON array. Returns the row count."""
+    with open_output(filename, compression) as handle:
+        count = write_rows(handle, rows, fmt)
+        if fmt == "json":
+            handle.write("\n")
+    return count
+
+
+def export_sections(sections, filename, compression=None):
+    """
+    Streams several named row iterables into one JSON object of arrays.
+
+    Parameters:
+    ----------
+    sections : iterable of (str, iterable)
+        Section name and its rows, each section is written as it is consumed.
+    filename : str
+        Output file.
+    compression : str, optional
+        None, 'gzip' or 'zstd'.
+    """
+    with open_output(filename, compression) as handle:
+        handle.write("{")
+        for index, (name, rows) in enumerate(sections):
+            handle.write(",\n" if index else "\n")
+            handle.write(f"{dumps(name)}: ")
+            write_rows(handle, rows, "json")
+        handle.write("\n}\n")
+
+
+def export_table(session, table_name, filename, fmt="ndjson", compression=None, page_size=STREAM_PAGE_SIZE):
+    """Streams a table to a file, see export_rows."""
+    return export_rows(table_rows(session, table_name, page_size), filename, fmt, compression)
+
+
+def export_query(session, name, filename, fmt="ndjson", compression=None, queries=None,
+                 page_size=STREAM_PAGE_SIZE):
+    """Streams the result of a Queries method to a file, see export_rows."""
+    return export_rows(query_rows(session, name, queries, page_size), filename, fmt, compression)
+
+
+def export_read_model(session, name, filename, fmt="ndjson", compression=None, page_size=STREAM_PAGE_SIZE):
+    """Streams a read_model listing (flattened across subclasses) to a file, see export_rows."""
+    rows = (row._asdict() for row in read_model.iter_rows(session, name, page_size))
+    return export_rows(rows, filename, fmt, compression)
+
+
+def run_export(Session, job):
+    """Runs one export job dict in its own session."""
+    with Session() as session:
+        kwargs = {
+            "fmt": job.get("fmt", "ndjson"),
+            "compression": job.get("compression"),
+            "page_size": job.get("page_size", STREAM_PAGE_SIZE),
+        }
+        if "table" in job:
+            return export_table(session, job["table"], job["filename"], **kwargs)
+        if "read_model" in job:
+            return export_read_model(session, job["read_model"], job["filename"], **kwargs)
+        return export_query(session, job["query"], job["filename"],
+                            queries=Queries(job.get("materialized", False)), **kwargs)
+
+
+def export_concurrently(engine, jobs, max_workers=4):
+    """
+    Runs several exports in parallel threads, one session each.
+
+    Parameters:
+    ----------
+    engine : Engine
+        Engine of the database to export from.
+    jobs : list of dict
+        Each with 'filename' and one of 'table' (table name), 'read_model'
+        (read_model.READ_MODELS name) or 'query' (Queries method name), optionally 'fmt', 'compression', 'page_size'
+        and 'materialized'.
+    max_workers : int
+        Number of exports running at the same time.
+
+    Returns:
+    -------
+    dict
+        Rows written per output file.
+    """
+    Session = sessionmaker(bind=engine)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        counts = executor.map(lambda job: run_export(Session, job), jobs)
+        return dict(zip((job["filename"] for job in jobs), counts))
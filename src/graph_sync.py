@@ -0,0 +1,444 @@
+import time
+from sqlalchemy import delete, select, tuple_
+from classes import (
+    User,
+    Media,
+    Movie,
+    Series,
+    Review,
+    Watchlist,
+    Cast,
+    Actor,
+    Director,
+    ChangeConsumerOffset,
+    GraphSyncState,
+    watchlist_media
+)
+from change_log import ChangeConsumer, install_change_capture, latest_seq
+from utils import NEO4J_BATCH_SIZE, MERGE_USERS_QUERY, neo4j_write_batches
+
+
+# Movies and series additionally carry the :Media label so reviews, watchlist
+# entries and cast can match either kind with one lookup.
+
+SYNC_MOVIES_QUERY = """
+UNWIND $rows AS row
+MERGE (m:Movie {id: row.id})
+SET m:Media, m.title = row.title, m.release_year = row.release_year,
+    m.rating = row.rating, m.genre = row.genre, m.duration = row.duration
+"""
+
+SYNC_SERIES_QUERY = """
+UNWIND $rows AS row
+MERGE (s:Series {id: row.id})
+SET s:Media, s.title = row.title, s.release_year = row.release_year,
+    s.rating = row.rating, s.genre = row.genre, s.season_count = row.season_count
+"""
+
+# The edge statements drop the edges of a previous version of the row, so an
+# update moving a review, watchlist or credit does not leave the old edge behind.
+
+SYNC_REVIEWS_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {user_id: row.user_id}), (m:Media {id: row.media_id})
+MERGE (r:Review {review_id: row.review_id})
+SET r.rating = row.rating
+WITH r, u, m
+OPTIONAL MATCH (previous:User)-[stale:REVIEWS]->(r) WHERE previous <> u
+DELETE stale
+WITH DISTINCT r, u, m
+OPTIONAL MATCH (r)-[stale:REVIEWS]->(previous:Media) WHERE previous <> m
+DELETE stale
+WITH DISTINCT r, u, m
+MERGE (u)-[:REVIEWS]->(r)
+MERGE (r)-[:REVIEWS]->(m)
+"""
+
+SYNC_WATCHLISTS_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {user_id: row.user_id})
+MERGE (w:Watchlist {watch_id: row.watch_id})
+WITH w, u
+OPTIONAL MATCH (w)-[stale:WATCHED_BY]->(previous:User) WHERE previous <> u
+DELETE stale
+WITH DISTINCT w, u
+MERGE (w)-[:WATCHED_BY]->(u)
+"""
+
+SYNC_WATCHLIST_MEDIA_QUERY = """
+UNWIND $rows AS row
+MATCH (w:Watchlist {watch_id: row.watch_id})-[:WATCHED_BY]->(u:User), (m:Media {id: row.media_id})
+MERGE (u)-[:WATCHLIST]->(m)
+"""
+
+SYNC_ACTORS_QUERY = """
+UNWIND $rows AS row
+MERGE (a:Actor {cast_id: row.cast_id})
+SET a.name = row.name, a.description = row.description, a.type = 'ACTOR',
+    a.movie_id = row.movie_id, a.series_id = row.series_id
+WITH a, row
+OPTIONAL MATCH (a)-[stale:ACTED_IN]->(previous:Media) WHERE previous.id <> coalesce(row.movie_id, row.series_id)
+DELETE stale
+WITH DISTINCT a, row
+MATCH (m:Media {id: coalesce(row.movie_id, row.series_id)})
+MERGE (a)-[:ACTED_IN]->(m)
+"""
+
+SYNC_DIRECTORS_QUERY = """
+UNWIND $rows AS row
+MERGE (d:Director {cast_id: row.cast_id})
+SET d.name = row.name, d.description = row.description, d.type = 'DIRECTOR',
+    d.movie_id = row.movie_id, d.series_id = row.series_id
+WITH d, row
+OPTIONAL MATCH (d)-[stale:DIRECTED]->(previous:Media) WHERE previous.id <> coalesce(row.movie_id, row.series_id)
+DELETE stale
+WITH DISTINCT d, row
+MATCH (m:Media {id: coalesce(row.movie_id, row.series_id)})
+MERGE (d)-[:DIRECTED]->(m)
+"""
+
+# Deletes, keyed like the change_log row_key of the base table
+
+DELETE_USERS_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {user_id: row.id})
+DETACH DELETE u
+"""
+
+DELETE_MEDIAS_QUERY = """
+UNWIND $rows AS row
+MATCH (m:Media {id: row.id})
+DETACH DELETE m
+"""
+
+DELETE_REVIEWS_QUERY = """
+UNWIND $rows AS row
+MATCH (r:Review {review_id: row.id})
+DETACH DELETE r
+"""
+
+DELETE_WATCHLISTS_QUERY = """
+UNWIND $rows AS row
+MATCH (w:Watchlist {watch_id: row.id})
+DETACH DELETE w
+"""
+
+# Removes the user's edge; sync_changes then re-pushes the remaining
+# watchlist entries of the media, restoring it for users who still have the
+# media on another watchlist
+DELETE_WATCHLIST_MEDIA_QUERY = """
+UNWIND $rows AS row
+MATCH (:Watchlist {watch_id: row.watchlists_id})-[:WATCHED_BY]->(:User)-[e:WATCHLIST]->(:Media {id: row.medias_id})
+DELETE e
+"""
+
+DELETE_CASTS_QUERY = """
+UNWIND $rows AS row
+OPTIONAL MATCH (a:Actor {cast_id: row.id})
+OPTIONAL MATCH (d:Director {cast_id: row.id})
+DETACH DELETE a, d
+"""
+
+users = User.__table__
+medias = Media.__table__
+movies = Movie.__table__
+series = Series.__table__
+reviews = Review.__table__
+watchlists = Watchlist.__table__
+casts = Cast.__table__
+actors = Actor.__table__
+directors = Director.__table__
+
+# (source name, key, select, cypher) in dependency order: nodes before the
+# edges that match them. The key is a column or, for watchlist_media, the
+# tuple of primary key columns; every key column is also selected under its
+# own name. Plain table columns keep the selects free of the
+# joined-inheritance loading the mapped classes would add.
+SYNC_SOURCES = [
+    (
+        "users",
+        users.c.id,
+        select(users.c.id, users.c.id.label("user_id"), users.c.username.label("name"), users.c.email),
+        MERGE_USERS_QUERY,
+    ),
+    (
+        "movies",
+        medias.c.id,
+        select(medias.c.id, medias.c.title, medias.c.release_year, medias.c.rating, medias.c.genre,
+               movies.c.duration)
+        .join_from(medias, movies, movies.c.id == medias.c.id),
+        SYNC_MOVIES_QUERY,
+    ),
+    (
+        "series",
+        medias.c.id,
+        select(medias.c.id, medias.c.title, medias.c.release_year, medias.c.rating, medias.c.genre,
+               series.c.season_count)
+        .join_from(medias, series, series.c.id == medias.c.id),
+        SYNC_SERIES_QUERY,
+    ),
+    (
+        "reviews",
+        reviews.c.id,
+        select(reviews.c.id, reviews.c.id.label("review_id"), reviews.c.rating,
+               reviews.c.user_id, reviews.c.media_id),
+        SYNC_REVIEWS_QUERY,
+    ),
+    (
+        "watchlists",
+        watchlists.c.id,
+        select(watchlists.c.id, watchlists.c.id.label("watch_id"), watchlists.c.user_id),
+        SYNC_WATCHLISTS_QUERY,
+    ),
+    (
+        "watchlist_media",
+        (watchlist_media.c.watchlists_id, watchlist_media.c.medias_id),
+        select(
+            watchlist_media.c.watchlists_id,
+            watchlist_media.c.medias_id,
+            watchlist_media.c.watchlists_id.label("watch_id"),
+            watchlist_media.c.medias_id.label("media_id"),
+        ),
+        SYNC_WATCHLIST_MEDIA_QUERY,
+    ),
+    (
+        "actors",
+        casts.c.id,
+        select(casts.c.id, casts.c.id.label("cast_id"), actors.c.name, casts.c.description,
+               casts.c.movie_id, casts.c.series_id)
+        .join_from(casts, actors, actors.c.id == casts.c.id),
+        SYNC_ACTORS_QUERY,
+    ),
+    (
+        "directors",
+        casts.c.id,
+        select(casts.c.id, casts.c.id.label("cast_id"), directors.c.name, casts.c.description,
+               casts.c.movie_id, casts.c.series_id)
+        .join_from(casts, directors, directors.c.id == casts.c.id),
+        SYNC_DIRECTORS_QUERY,
+    ),
+]
+
+# change_log table -> sources re-pushed when one of its rows is inserted or updated
+CHANGE_SOURCES = {
+    "users": ("users",),
+    "medias": ("movies", "series"),
+    "movies": ("movies",),
+    "series": ("series",),
+    "reviews": ("reviews",),
+    "watchlists": ("watchlists",),
+    "watchlist_media": ("watchlist_media",),
+    "casts": ("actors", "directors"),
+    "actors": ("actors",),
+    "directors": ("directors",),
+}
+
+# Deletes of the base tables, children first. Subclass rows (movies, actors,
+# ...) are deleted together with their base row and need no statement.
+DELETE_QUERIES = [
+    ("watchlist_media", DELETE_WATCHLIST_MEDIA_QUERY),
+    ("reviews", DELETE_REVIEWS_QUERY),
+    ("casts", DELETE_CASTS_QUERY),
+    ("watchlists", DELETE_WATCHLISTS_QUERY),
+    ("medias", DELETE_MEDIAS_QUERY),
+    ("users", DELETE_USERS_QUERY),
+]
+
+# change_log consumer tracking what the graph has applied
+GRAPH_SYNC_CONSUMER = "graph_sync"
+# graph_sync_state row holding the change_log seq a running snapshot started at
+SNAPSHOT_STATE = "snapshot"
+
+
+def _key_columns(key):
+    return key if isinstance(key, tuple) else (key,)
+
+
+def get_high_water_mark(session, source):
+    """Returns the last synced key of a source, 0 if it was never synced."""
+    state = session.get(GraphSyncState, source)
+    return state.high_water_mark if state else 0
+
+
+def set_high_water_mark(session, source, value):
+    """Stores the last synced key of a source. Flushes, committing is up to the caller."""
+    state = session.get(GraphSyncState, source)
+    if state is None:
+        state = GraphSyncState(source=source, high_water_mark=value)
+        session.add(state)
+    else:
+        state.high_water_mark = value
+    session.flush()
+
+
+def sync_source(session, driver, source, key, query, cypher, batch_size=NEO4J_BATCH_SIZE, full=False):
+    """
+    Pushes the rows of one source with a key above its high-water mark to Neo4j.
+
+    Rows are read with keyset pagination (key > last key ORDER BY key LIMIT
+    batch_size) and the high-water mark is advanced after every page that
+    was written. For a composite key the mark is its first column and a
+    resumed sync starts over at that value, MERGE makes the repeat harmless.
+    The marks are flushed, not committed; sync_to_neo4j commits them per source.
+
+    Returns:
+        int: Number of rows pushed.
+    """
+    columns = _key_columns(key)
+    mark = 0 if full else get_high_water_mark(session, source)
+    last_key = (mark,) + (0,) * (len(columns) - 1)
+    pushed = 0
+    while True:
+        if len(columns) == 1:
+            condition = columns[0] > last_key[0]
+        else:
+            condition = tuple_(*columns) > tuple_(*last_key)
+        page = session.execute(
+            query.where(condition).order_by(*columns).limit(batch_size)
+        ).mappings().all()
+        if not page:
+            break
+        neo4j_write_batches(driver, cypher, [dict(row) for row in page], batch_size)
+        last_key = tuple(page[-1][column.key] for column in columns)
+        pushed += len(page)
+        set_high_water_mark(session, source, last_key[0])
+    return pushed
+
+
+def snapshot_to_neo4j(session, driver, batch_size=NEO4J_BATCH_SIZE, full=False):
+    """
+    Pushes every row of every source, e.g. on the first sync.
+
+    The change_log position at the start is kept in graph_sync_state until
+    all sources are done; an interrupted snapshot resumes from the per-source
+    high-water marks and then hands over to the change log at that position,
+    so changes made while it ran are applied afterwards.
+
+    Returns:
+        dict: Number of rows pushed per source.
+    """
+    state = session.get(GraphSyncState, SNAPSHOT_STATE)
+    if state is None or full:
+        session.execute(delete(GraphSyncState.__table__))
+        session.add(GraphSyncState(source=SNAPSHOT_STATE, high_water_mark=latest_seq(session)))
+        session.commit()
+        state = session.get(GraphSyncState, SNAPSHOT_STATE)
+    counts = {}
+    for source, key, query, cypher in SYNC_SOURCES:
+        counts[source] = sync_source(session, driver, source, key, query, cypher, batch_size)
+        session.commit()
+    start_seq = state.high_water_mark
+    session.execute(delete(GraphSyncState.__table__))
+    ChangeConsumer(session, GRAPH_SYNC_CONSUMER).commit(start_seq)
+    return counts
+
+
+def _select_by_keys(key, query, keys):
+    columns = _key_columns(key)
+    if len(columns) == 1:
+        return query.where(columns[0].in_([k[0] for k in keys]))
+    return query.where(tuple_(*columns).in_(keys))
+
+
+def apply_changes(session, driver, batch, batch_size=NEO4J_BATCH_SIZE):
+    """
+    Applies one batch of change_log entries to the graph.
+
+    The last operation per row wins: deleted rows are removed children
+    first, inserted and updated rows are read again from SQLite and pushed
+    parents first with the SYNC_SOURCES statements.
+
+    Returns:
+        dict: Rows pushed per source and 'deleted' per table.
+    """
+    last = {}
+    for change in batch:
+        last[(change.table_name, tuple(sorted(change.key.items())))] = change
+    deleted = {}
+    upserted = {}
+    for (table, _), change in last.items():
+        target = deleted if change.operation == "DELETE" else upserted
+        target.setdefault(table, []).append(change.key)
+
+    counts = {}
+    for table, cypher in DELETE_QUERIES:
+        if deleted.get(table):
+            counts[f"deleted_{table}"] = neo4j_write_batches(driver, cypher, deleted[table], batch_size)
+
+    keys_by_source = {}
+    for table, row_keys in upserted.items():
+        for source in CHANGE_SOURCES.get(table, ()):
+            keys_by_source.setdefault(source, set()).update(
+                (row_key["watchlists_id"], row_key["medias_id"]) if table == "watchlist_media" else (row_key["id"],)
+                for row_key in row_keys
+            )
+    if deleted.get("watchlist_media"):
+        media_ids = {row_key["medias_id"] for row_key in deleted["watchlist_media"]}
+        keys_by_source.setdefault("watchlist_media", set()).update(
+            tuple(row) for row in session.execute(
+                select(watchlist_media.c.watchlists_id, watchlist_media.c.medias_id)
+                .where(watchlist_media.c.medias_id.in_(media_ids))
+            )
+        )
+    for source, key, query, cypher in SYNC_SOURCES:
+        keys = sorted(keys_by_source.get(source, ()))
+        pushed = 0
+        for start in range(0, len(keys), batch_size):
+            rows = session.execute(_select_by_keys(key, query, keys[start:start + batch_size])).mappings().all()
+            pushed += neo4j_write_batches(driver, cypher, [dict(row) for row in rows], batch_size)
+        if pushed:
+            counts[source] = pushed
+    return counts
+
+
+def sync_changes(session, driver, batch_size=NEO4J_BATCH_SIZE):
+    """
+    Applies the change_log entries after the graph_sync consumer offset,
+    committing the offset after every batch.
+
+    Returns:
+        dict: Rows pushed per source and deleted per table.
+    """
+    consumer = ChangeConsumer(session, GRAPH_SYNC_CONSUMER, tables=tuple(CHANGE_SOURCES))
+    counts = {}
+    for batch in consumer.batches(batch_size):
+        for name, value in apply_changes(session, driver, batch, batch_size).items():
+            counts[name] = counts.get(name, 0) + value
+        consumer.commit(batch[-1].seq)
+    return counts
+
+
+def sync_to_neo4j(session, driver, batch_size=NEO4J_BATCH_SIZE, full=False):
+    """
+    Mirrors users, media, reviews, watchlists and cast from SQLite into Neo4j.
+
+    The first run (or full=True) pushes every row with snapshot_to_neo4j
+    and installs change capture if the database does not have it yet.
+    After that only the inserts, updates and deletes recorded in the change
+    log since the previous run are applied, tracked by the graph_sync
+    change_log consumer. All writes use MERGE and are safe to repeat. The
+    session is committed as the sync progresses.
+
+    Args:
+        session (Session): Session on the SQLite database.
+        driver (neo4j.Driver): The Neo4j driver object.
+        batch_size (int): Rows per page and per Neo4j transaction.
+        full (bool): Push every row again, e.g. after writes made without change capture.
+
+    Returns:
+        dict: Number of rows pushed per source and deleted per table.
+    """
+    start = time.perf_counter()
+    counts = {}
+    first_run = session.get(ChangeConsumerOffset, GRAPH_SYNC_CONSUMER) is None
+    if first_run:
+        # Changes made from here on are seen by the next run
+        install_change_capture(session.connection())
+        session.commit()
+    if full or first_run or session.get(GraphSyncState, SNAPSHOT_STATE) is not None:
+        counts.update(snapshot_to_neo4j(session, driver, batch_size, full))
+    for name, value in sync_changes(session, driver, batch_size).items():
+        counts[name] = counts.get(name, 0) + value
+    elapsed = time.perf_counter() - start
+    print(f"Synced {sum(counts.values())} rows to Neo4j in {elapsed:.2f}s: {counts}")
+    return counts
@@ -0,0 +1,337 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from classes import Media, Movie, Series, Episode, Cast, Actor, Director, MediaType, CastType
+from populate_data import CATALOG_KINDS, CATALOG_SECTIONS, _next_id
+from jsonl_reader import iter_lines, split_ranges
+
+
+SHARD_BYTES = 8 * 1024 * 1024
+COMMIT_ROWS = 100000
+# Rejected records reported in full, the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+# Fields of each record kind, in row tuple order: (name, type, required)
+CATALOG_FIELDS = {
+    "movie": (("id", int, False), ("title", str, True), ("release_year", int, True),
+              ("rating", float, True), ("genre", str, True), ("duration", int, True)),
+    "series": (("id", int, False), ("title", str, True), ("release_year", int, True),
+               ("rating", float, True), ("genre", str, True), ("season_count", int, True)),
+    "episode": (("title", str, True), ("episode_number", int, True), ("series_id", int, True)),
+    "director": (("id", int, False), ("description", str, True), ("movie_id", int, False),
+                 ("series_id", int, False), ("name", str, True)),
+    "actor": (("id", int, False), ("description", str, True), ("movie_id", int, False),
+              ("series_id", int, False), ("name", str, True)),
+}
+
+
+def plan_shards(filenames, shard_bytes=SHARD_BYTES):
+    """
+    Splits the input into shards for the parse workers.
+
+    A .jsonl file is cut into byte ranges of about shard_bytes, each moved
+    forward to the next line start so no line is split. A .json file is a
+    single document and always one shard.
+
+    Returns:
+    -------
+    list of tuple
+        (filename, start, end) with start/end None for whole .json files.
+    """
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    shards = []
+    for filename in filenames:
+        if not filename.endswith(".jsonl"):
+            shards.append((filename, None, None))
+            continue
+        shards.extend((filename, start, end) for start, end in split_ranges(filename, range_bytes=shard_bytes))
+    return shards
+
+
+def validate_record(kind, record):
+    """Returns the row tuple of a record, raises ValueError if it is invalid."""
+    row = []
+    for name, expected, required in CATALOG_FIELDS[kind]:
+        value = record.get(name)
+        if value is None:
+            if required:
+                raise ValueError(f"{kind} is missing '{name}'")
+        elif expected is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        elif not isinstance(value, expected) or isinstance(value, bool):
+            raise ValueError(f"{kind} '{name}' should be {expected.__name__}, got {value!r}")
+        row.append(value)
+    return tuple(row)
+
+
+def _not_an_object(record):
+    return f"expected a JSON object, got {type(record).__name__}"
+
+
+def _shard_records(filename, start, end):
+    # (location, kind, record) triples of one shard, kind None and an error
+    # message as record for lines that are not catalog records
+    if start is None:
+        with open(filename) as jsonfile:
+            data = json.load(jsonfile)
+        for section, kind in CATALOG_SECTIONS.items():
+            records = data.get(section, [])
+            if isinstance(records, dict):
+                records = [records]
+            for index, record in enumerate(records):
+                location = f"{filename}:{section}[{index}]"
+                if isinstance(record, dict):
+                    yield location, kind, record
+                else:
+                    yield location, None, _not_an_object(record)
+        return
+    for offset, line in iter_lines(filename, start, end):
+        location = f"{filename}@{offset}"
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield location, None, str(e)
+            continue
+        if not isinstance(record, dict):
+            yield location, None, _not_an_object(record)
+            continue
+        yield location, record.pop("kind", None), record
+
+
+def parse_shard(shard, defaults=None):
+    """
+    Worker entry point: parses and validates one shard.
+
+    Returns:
+    -------
+    dict
+        'rows' (kind -> list of row tuples), 'rejected' (count),
+        'errors' (first MAX_REPORTED_ERRORS messages) and 'seconds'.
+    """
+    start_time = time.perf_counter()
+    rows = {kind: [] for kind in CATALOG_KINDS}
+    rejected = 0
+    errors = []
+    defaults = defaults or {}
+    for location, kind, record in _shard_records(*shard):
+        try:
+            if kind is None:
+                raise ValueError(record if isinstance(record, str) else "record has no 'kind'")
+            if kind not in rows:
+                raise ValueError(f"Unknown catalog record kind: {kind}")
+            if kind in defaults:
+                record = {**defaults[kind], **record}
+            rows[kind].append(validate_record(kind, record))
+        except ValueError as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"{location}: {e}")
+    return {"rows": rows, "rejected": rejected, "errors": errors, "seconds": time.perf_counter() - start_time}
+
+
+# Rows whose id or natural key is already taken are skipped (ON CONFLICT DO
+# NOTHING) instead of aborting the load, the writer counts them as rejected.
+# A subtype row is only inserted if its parent row is the one just written.
+
+def _insert_sql(table, columns):
+    return (f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT DO NOTHING")
+
+
+def _child_insert_sql(table, columns, parent, parent_columns):
+    # INSERT ... SELECT needs a WHERE clause before ON CONFLICT
+    condition = " AND ".join(f"{column} = ?" for column in parent_columns)
+    return (f"INSERT INTO {table.name} ({', '.join(columns)}) SELECT {', '.join('?' * len(columns))} "
+            f"WHERE EXISTS (SELECT 1 FROM {parent.name} WHERE {condition}) ON CONFLICT DO NOTHING")
+
+
+MEDIA_KEY = ("id", "title", "release_year", "media_type")
+CAST_KEY = ("id", "type")
+
+MEDIA_SQL = _insert_sql(Media.__table__, ("id", "title", "release_year", "rating", "genre", "media_type"))
+MOVIE_SQL = _child_insert_sql(Movie.__table__, ("id", "duration"), Media.__table__, MEDIA_KEY)
+SERIES_SQL = _child_insert_sql(Series.__table__, ("id", "season_count"), Media.__table__, MEDIA_KEY)
+EPISODE_SQL = _insert_sql(Episode.__table__, ("title", "episode_number", "series_id"))
+CAST_SQL = _insert_sql(Cast.__table__, ("id", "description", "type", "movie_id", "series_id"))
+DIRECTOR_SQL = _child_insert_sql(Director.__table__, ("id", "name"), Cast.__table__, CAST_KEY)
+ACTOR_SQL = _child_insert_sql(Actor.__table__, ("id", "name"), Cast.__table__, CAST_KEY)
+
+
+class CatalogWriter:
+    """
+    The single writer of the pipeline: inserts row tuples from parse_shard
+    with executemany on the session connection, committing every commit_rows
+    rows. Missing ids are allocated after the current maximum like
+    populate_data.bulk_load_catalog does. Rows conflicting with an existing
+    id or natural key (medias title and release_year, episodes series_id
+    and episode_number) are skipped and counted in conflicts.
+    """
+
+    def __init__(self, session, commit_rows=COMMIT_ROWS):
+        self.session = session
+        self.commit_rows = commit_rows
+        self.next_media_id = _next_id(session, Media.__table__)
+        self.next_cast_id = _next_id(session, Cast.__table__)
+        self.counts = {kind: 0 for kind in CATALOG_KINDS}
+        self.conflicts = {kind: 0 for kind in CATALOG_KINDS}
+        self.uncommitted = 0
+
+    def _with_ids(self, rows, attribute):
+        next_id = getattr(self, attribute)
+        result = []
+        for row in rows:
+            if row[0] is None:
+                row = (next_id,) + row[1:]
+                next_id += 1
+            result.append(row)
+        setattr(self, attribute, next_id)
+        return result
+
+    def write(self, rows):
+        """Writes one parse_shard 'rows' dict."""
+        cursor = self.session.connection().connection.cursor()
+        for kind, kind_rows in rows.items():
+            if not kind_rows:
+                continue
+            if kind in ("movie", "series"):
+                media_type = MediaType.MOVIE if kind == "movie" else MediaType.SERIES
+                kind_rows = self._with_ids(kind_rows, "next_media_id")
+                cursor.executemany(MEDIA_SQL, [row[:5] + (media_type.name,) for row in kind_rows])
+                written = cursor.rowcount
+                cursor.executemany(MOVIE_SQL if kind == "movie" else SERIES_SQL,
+                                   [(row[0], row[5], row[0], row[1], row[2], media_type.name) for row in kind_rows])
+            elif kind == "episode":
+                cursor.executemany(EPISODE_SQL, kind_rows)
+                written = cursor.rowcount
+            else:
+                cast_type = CastType.DIRECTOR if kind == "director" else CastType.ACTOR
+                kind_rows = self._with_ids(kind_rows, "next_cast_id")
+                cursor.executemany(CAST_SQL, [(row[0], row[1], cast_type.name, row[2], row[3]) for row in kind_rows])
+                written = cursor.rowcount
+                cursor.executemany(DIRECTOR_SQL if kind == "director" else ACTOR_SQL,
+                                   [(row[0], row[4], row[0], cast_type.name) for row in kind_rows])
+            self.counts[kind] += written
+            self.conflicts[kind] += len(kind_rows) - written
+            self.uncommitted += len(kind_rows)
+        cursor.close()
+        if self.uncommitted >= self.commit_rows:
+            self.commit()
+
+    def commit(self):
+        self.session.commit()
+        self.uncommitted = 0
+
+
+def _throughput(rows, seconds):
+    return {"rows": rows, "seconds": round(seconds, 3), "rows_per_s": round(rows / seconds) if seconds > 0 else None}
+
+
+def ingest_catalog(session, filenames, workers=None, shard_bytes=SHARD_BYTES, max_pending=None,
+                   commit_rows=COMMIT_ROWS, defaults=None):
+    """
+    Loads catalog files with a pool of parse workers feeding a single writer.
+
+    Worker processes turn shards (see plan_shards) into validated row
+    tuples; the calling process writes them in commit_rows sized
+    transactions. At most max_pending shards are parsed or waiting to be
+    written at any time, so a slow writer holds the workers back instead of
+    letting parsed rows pile up in memory. Invalid records, and records
+    whose id or natural key is already in the database (see CatalogWriter),
+    are skipped and reported as rejected.
+
+    Parameters:
+    ----------
+    session : Session
+        The session used to write the rows.
+    filenames : str or list of str
+        .json and/or .jsonl catalog files (see populate_data.iter_catalog_records).
+    workers : int, optional
+        Number of parse processes, os.cpu_count() by default.
+    shard_bytes : int
+        Approximate size of a .jsonl shard.
+    max_pending : int, optional
+        Shards in flight between the stages, 2 * workers by default.
+    commit_rows : int
+        Rows written per transaction.
+    defaults : dict, optional
+        Per-kind values for missing keys, as for bulk_load_catalog.
+
+    Returns:
+    -------
+    dict
+        'counts' per kind, 'rejected', 'errors' and per stage throughput
+        ('parse' in worker CPU time, 'write' and 'wait' in writer time).
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    shards = plan_shards(filenames, shard_bytes)
+    writer = CatalogWriter(session, commit_rows)
+    rejected = 0
+    errors = []
+    parse_seconds = 0.0
+    parsed_rows = 0
+    write_seconds = 0.0
+    wait_seconds = 0.0
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        shard_iter = iter(shards)
+        for shard in shard_iter:
+            pending.append(pool.submit(parse_shard, shard, defaults))
+            if len(pending) >= max_pending:
+                break
+        while pending:
+            # Results are written in shard order so ids are allocated deterministically
+            wait_start = time.perf_counter()
+            result = pending.popleft().result()
+            wait_seconds += time.perf_counter() - wait_start
+            for shard in shard_iter:
+                pending.append(pool.submit(parse_shard, shard, defaults))
+                break
+
+            parse_seconds += result["seconds"]
+            parsed_rows += sum(len(rows) for rows in result["rows"].values())
+            rejected += result["rejected"]
+            errors.extend(result["errors"][:MAX_REPORTED_ERRORS - len(errors)])
+
+            write_start = time.perf_counter()
+            writer.write(result["rows"])
+            write_seconds += time.perf_counter() - write_start
+    write_start = time.perf_counter()
+    writer.commit()
+    write_seconds += time.perf_counter() - write_start
+    elapsed = time.perf_counter() - start
+    for kind, conflicts in writer.conflicts.items():
+        if conflicts:
+            rejected += conflicts
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"{conflicts} {kind} records: id or natural key already in the database")
+
+    total = sum(writer.counts.values())
+    report = {
+        "counts": writer.counts,
+        "rejected": rejected,
+        "errors": errors,
+        "shards": len(shards),
+        "workers": workers,
+        "stages": {
+            "parse": _throughput(parsed_rows, parse_seconds),
+            "write": _throughput(total, write_seconds),
+            "wait": {"seconds": round(wait_seconds, 3)},
+        },
+        "total": _throughput(total, elapsed),
+    }
+    print(
+        f"Ingested {total} rows from {len(shards)} shards with {workers} workers in {elapsed:.2f}s "
+        f"({report['total']['rows_per_s']} rows/s), rejected {rejected}"
+    )
+    for stage, stats in report["stages"].items():
+        print(f"  {stage}: {stats}")
+    for error in errors:
+        print(f"  rejected {error}")
+    return report
@@ -0,0 +1,306 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from sqlalchemy import event
+
+
+logger = logging.getLogger("slow_queries")
+
+SLOW_QUERY_THRESHOLD = 0.1  # seconds
+
+# Upper bounds of the latency histogram buckets in milliseconds
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, float("inf"))
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@functools.lru_cache(maxsize=None)
+def _project_module(filename):
+    """Module name for files of this project except this one, else None."""
+    path = os.path.abspath(filename)
+    if os.path.dirname(path) != SRC_DIR or path == os.path.abspath(__file__):
+        return None
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def calling_function():
+    """Returns 'module.function' of the closest caller inside this project."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = _project_module(frame.f_code.co_filename)
+        if module is not None:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+
+class StatementRecord:
+    """
+    Aggregated measurements for one distinct statement.
+
+    total_time, max_time and the histogram cover the execute calls;
+    fetch_time is the time spent reading the returned rows afterwards
+    (fetch* on the SQLite cursor, consuming a Neo4j result), which can
+    dominate for statements returning many rows.
+    """
+
+    __slots__ = ("statement", "backend", "calls", "total_time", "max_time", "fetch_time", "rows", "histogram",
+                 "callers")
+
+    def __init__(self, statement, backend):
+        self.statement = statement
+        self.backend = backend
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.fetch_time = 0.0
+        self.rows = 0
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+        self.callers = {}
+
+    def add_call(self, elapsed, caller):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.histogram[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, elapsed * 1000)] += 1
+        self.callers[caller] = self.callers.get(caller, 0) + 1
+
+    def add_fetch(self, rows, elapsed):
+        self.rows += rows
+        self.fetch_time += elapsed
+
+    def to_dict(self):
+        total = self.total_time + self.fetch_time
+        return {
+            "backend": self.backend,
+            "statement": self.statement,
+            "calls": self.calls,
+            "total_ms": round(total * 1000, 3),
+            "execute_ms": round(self.total_time * 1000, 3),
+            "fetch_ms": round(self.fetch_time * 1000, 3),
+            "mean_ms": round(total * 1000 / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_time * 1000, 3),
+            "rows": self.rows,
+            "histogram_ms": {str(bound): count for bound, count in zip(HISTOGRAM_BUCKETS_MS, self.histogram)},
+            "callers": self.callers,
+        }
+
+
+class QueryStats:
+    """
+    Collects per-statement latency, row counts and callers for SQLite and Neo4j.
+
+    Statements slower than slow_threshold seconds are logged on the
+    'slow_queries' logger.
+    """
+
+    def __init__(self, slow_threshold=SLOW_QUERY_THRESHOLD):
+        self.slow_threshold = slow_threshold
+        self.records = {}
+
+    def record(self, backend, statement):
+        key = (backend, statement)
+        if key not in self.records:
+            self.records[key] = StatementRecord(statement, backend)
+        return self.records[key]
+
+    def observe(self, backend, statement, elapsed, parameters=None):
+        caller = calling_function()
+        record = self.record(backend, statement)
+        record.add_call(elapsed, caller)
+        if elapsed >= self.slow_threshold:
+            logger.warning("Slow %s statement (%.1f ms) from %s: %s | parameters: %r",
+                           backend, elapsed * 1000, caller, " ".join(statement.split()), parameters)
+        return record
+
+    def summary(self):
+        """Returns all records as dicts, slowest total (execute + fetch) time first."""
+        records = sorted(self.records.values(), key=lambda record: record.total_time + record.fetch_time,
+                         reverse=True)
+        return [record.to_dict() for record in records]
+
+    def summary_table(self, limit=20, width=70):
+        """Formats the slowest statements as a text table."""
+        lines = [f"{'backend':<7} {'calls':>7} {'total ms':>10} {'fetch ms':>10} {'mean ms':>9} {'max ms':>9} "
+                 f"{'rows':>9}  statement"]
+        for entry in self.summary()[:limit]:
+            statement = " ".join(entry["statement"].split())
+            if len(statement) > width:
+                statement = statement[:width - 3] + "..."
+            lines.append(
+                f"{entry['backend']:<7} {entry['calls']:>7} {entry['total_ms']:>10.1f} {entry['fetch_ms']:>10.1f} "
+                f"{entry['mean_ms']:>9.2f} {entry['max_ms']:>9.2f} {entry['rows']:>9}  {statement}"
+            )
+        return "\n".join(lines)
+
+    def dump_json(self, filename):
+        """Writes the summary to a JSON file."""
+        with open(filename, "w") as json_file:
+            json.dump(self.summary(), json_file, indent=4)
+
+
+# SQLite
+
+class CountingCursor(sqlite3.Cursor):
+    """sqlite3 cursor that adds every fetched row and its fetch time to the current statement record."""
+
+    record = None
+
+    def _count(self, rows, start):
+        if self.record is not None:
+            self.record.add_fetch(rows, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._count(0 if row is None else 1, start)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        rows = super().fetchmany(*args, **kwargs)
+        self._count(len(rows), start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._count(len(rows), start)
+        return rows
+
+
+class CountingConnection(sqlite3.Connection):
+    """sqlite3 connection handing out CountingCursors, pass as connect_args={'factory': ...}."""
+
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+
+def instrument_engine(engine, stats):
+    """
+    Records every statement executed on a SQLAlchemy engine into stats.
+
+    Returned rows are only counted, and the time spent fetching them only
+    measured, when the engine was created with
+    connect_args={"factory": CountingConnection}; otherwise the DBAPI
+    rowcount (affected rows of INSERT/UPDATE/DELETE) is used and only the
+    execute call is timed.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        record = stats.observe("sqlite", statement, elapsed, parameters)
+        if isinstance(cursor, CountingCursor):
+            cursor.record = record
+        if cursor.rowcount > 0:
+            record.rows += cursor.rowcount
+
+    return engine
+
+
+# Neo4j
+
+class InstrumentedResult:
+    """
+    Wraps a neo4j Result and counts the records consumed from it. Records
+    are streamed from the server while they are consumed, that time is
+    added to the statement's fetch time.
+    """
+
+    def __init__(self, result, record):
+        self._result = result
+        self._record = record
+
+    def __iter__(self):
+        iterator = iter(self._result)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._record.add_fetch(0, time.perf_counter() - start)
+                return
+            self._record.add_fetch(1, time.perf_counter() - start)
+            yield item
+
+    def single(self, *args, **kwargs):
+        start = time.perf_counter()
+        item = self._result.single(*args, **kwargs)
+        self._record.add_fetch(0 if item is None else 1, time.perf_counter() - start)
+        return item
+
+    def data(self, *args, **kwargs):
+        start = time.perf_counter()
+        items = self._result.data(*args, **kwargs)
+        self._record.add_fetch(len(items), time.perf_counter() - start)
+        return items
+
+    def consume(self):
+        start = time.perf_counter()
+        summary = self._result.consume()
+        self._record.add_fetch(0, time.perf_counter() - start)
+        return summary
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+
+class InstrumentedRunner:
+    """Wraps a neo4j Session or Transaction and times every run call."""
+
+    def __init__(self, runner, stats):
+        self._runner = runner
+        self._stats = stats
+
+    def run(self, query, parameters=None, **kwargs):
+        start = time.perf_counter()
+        result = self._runner.run(query, parameters, **kwargs)
+        elapsed = time.perf_counter() - start
+        # Only log the batch size of UNWIND rows, not the rows themselves
+        logged = {name: len(value) if isinstance(value, list) else value
+                  for name, value in {**(parameters or {}), **kwargs}.items()}
+        record = self._stats.observe("neo4j", query, elapsed, logged)
+        return InstrumentedResult(result, record)
+
+    def begin_transaction(self, *args, **kwargs):
+        return InstrumentedRunner(self._runner.begin_transaction(*args, **kwargs), self._stats)
+
+    def __enter__(self):
+        self._runner.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._runner.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._runner, name)
+
+
+class InstrumentedDriver:
+    """Wraps a neo4j Driver so that sessions record their statements into stats."""
+
+    def __init__(self, driver, stats):
+        self._driver = driver
+        self.stats = stats
+
+    def session(self, *args, **kwargs):
+        return InstrumentedRunner(self._driver.session(*args, **kwargs), self.stats)
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+def instrument_driver(driver, stats):
+    """Returns driver wrapped so every Cypher statement is recorded into stats."""
+    if driver is None:
+        return None
+    return InstrumentedDriver(driver, stats)
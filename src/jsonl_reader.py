@@ -0,0 +1,99 @@
+import json
+import mmap
+import os
+from contextlib import contextmanager
+
+
+RANGE_BYTES = 8 * 1024 * 1024
+
+
+@contextmanager
+def mapped(filename):
+    """
+    Maps a file read-only, yielding the mmap (or b"" for an empty file).
+
+    The operating system pages the file in on access, so the process only
+    holds the pages currently being read; separate readers of the same file
+    share them through the page cache.
+    """
+    with open(filename, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b""
+            return
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapping
+        finally:
+            mapping.close()
+
+
+def split_ranges(filename, parts=None, range_bytes=RANGE_BYTES):
+    """
+    Splits a JSONL file into byte ranges that start and end on line boundaries.
+
+    Parameters:
+    ----------
+    filename : str
+        The JSONL file.
+    parts : int, optional
+        Number of ranges to aim for, overrides range_bytes.
+    range_bytes : int
+        Approximate size of a range.
+
+    Returns:
+    -------
+    list of tuple
+        (start, end) byte offsets covering the whole file, in order.
+    """
+    size = os.path.getsize(filename)
+    if parts:
+        range_bytes = max(1, -(-size // parts))
+    ranges = []
+    with mapped(filename) as data:
+        start = 0
+        while start < size:
+            newline = data.find(b"\n", min(start + range_bytes, size) - 1)
+            end = size if newline == -1 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def iter_lines(filename, start=0, end=None):
+    """
+    Yields (offset, line) for the non-empty lines in [start, end) of a file.
+
+    Only the bytes of one line are copied out of the mapping at a time.
+    start must be a line start, e.g. from split_ranges.
+    """
+    with mapped(filename) as data:
+        end = len(data) if end is None else end
+        position = start
+        while position < end:
+            newline = data.find(b"\n", position, end)
+            line_end = end if newline == -1 else newline
+            line = data[position:line_end]
+            if line.strip():
+                yield position, line
+            position = line_end + 1
+
+
+def iter_jsonl(filename, start=0, end=None):
+    """
+    Lazily decodes the records in a byte range of a JSONL file.
+
+    Readers of different ranges are independent and can run in parallel
+    threads or processes.
+
+    Raises:
+        ValueError: With the filename@offset of the line, if a line is not
+            valid JSON or not a JSON object.
+    """
+    for offset, line in iter_lines(filename, start, end):
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"{filename}@{offset}: {e}") from e
+        if not isinstance(record, dict):
+            raise ValueError(f"{filename}@{offset}: expected a JSON object, got {type(record).__name__}")
+        yield record
@@ -16,6 +16,7 @@ from utils import (
 import populate_data as ppd
 import print_data as prd
 from queries import Queries
+from instrumentation import QueryStats, instrument_driver
 from sqlalchemy import inspect
 
 
@@ -47,7 +48,8 @@ from classes import (
 
 if __name__ == "__main__":
 
-    driver = neo4j_init(uri="bolt://localhost:7687")
+    stats = QueryStats()
+    driver = instrument_driver(neo4j_init(uri="bolt://localhost:7687"), stats)
 
     print(driver)
 
@@ -63,10 +65,13 @@ if __name__ == "__main__":
     neo4j_close_sess(driver)
     #clear_database(driver)
 
+    print(stats.summary_table())
+    stats.dump_json("json/query_stats.json")
+
     '''    database = 'database.db'
 
         try:
-            session, engine = setup(database)
+            session, engine = setup(database, stats=stats)
 
             queries = Queries()
             
@@ -75,7 +80,7 @@ if __name__ == "__main__":
             inspector = inspect(engine)
             tables = inspector.get_table_names()
 
-            session, engine = setup(database)
+            session, engine = setup(database, stats=stats)
             inspector = inspect(engine)
             tables = inspector.get_table_names()
             print("Create tables:")
@@ -1,10 +1,17 @@
 from datetime import date
 import json
+import os
+import time
+from itertools import islice
+from sqlalchemy import delete, func, insert, or_, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from classes import (
     SubscriptionType,
     CastType,
+    MediaType,
 )
 
+from jsonl_reader import iter_jsonl
 from classes import (
     User,
     MainUser,
@@ -19,12 +26,27 @@ from classes import (
     Series,
     Episode,
     Watchlist,
+    UserType,
     watchlist_media
 )
 
 
-def populate_users(session):
-    """Populates the User and MainUser tables with sample data."""
+def populate_users(session, upsert=False):
+    """
+    Populates the User and MainUser tables with sample data.
+    With upsert=True it can be re-run, see upsert_users.
+    """
+    if upsert:
+        ensure_natural_keys(session)
+        upsert_users(session, [
+            {"username": "john_doe", "email": "john@example.com", "iban": "DE89370400440532013000",
+             "price": 29.99, "subscription_type": SubscriptionType.MONTHLY,
+             "start_date": date(2023, 1, 1), "end_date": date(2024, 1, 1)},
+            {"username": "jane_doe", "email": "jane@example.com"},
+        ])
+        session.commit()
+        return
+
     main_user = MainUser(
         username="john_doe",
         email="john@example.com",
@@ -45,17 +67,34 @@ def populate_users(session):
     session.commit()
 
 
-def populate_watchlists(session):
-    """Populates the Watchlist table with sample data."""
+def populate_watchlists(session, upsert=False):
+    """
+    Populates the Watchlist table with sample data.
+    With upsert=True a user that already has a watchlist keeps it.
+    """
     main_user = session.query(MainUser).first()
-    
+    if upsert and main_user.watchlist is not None:
+        return
+
     watchlist = Watchlist(user=main_user)
     session.add(watchlist)
     session.commit()
 
 
-def populate_media(session):
-    """Populates the Media, Movie, and Series tables with sample data."""
+def populate_media(session, upsert=False):
+    """
+    Populates the Media, Movie, and Series tables with sample data.
+    With upsert=True it can be re-run, see upsert_media.
+    """
+    if upsert:
+        ensure_natural_keys(session)
+        upsert_media(session, [{"title": "Inception", "release_year": 2010, "rating": 8.8,
+                                "genre": "Sci-Fi", "duration": 148}], MediaType.MOVIE)
+        upsert_media(session, [{"title": "Breaking Bad", "release_year": 2008, "rating": 9.5,
+                                "genre": "Crime", "season_count": 5}], MediaType.SERIES)
+        session.commit()
+        return
+
     movie = Movie(
         id = 1,
         title="Inception",
@@ -79,8 +118,19 @@ def populate_media(session):
     session.commit()
 
 
-def populate_cast(session):
-    """Populates the Cast, Director, and Actor tables with sample data."""
+def populate_cast(session, upsert=False):
+    """
+    Populates the Cast, Director, and Actor tables with sample data.
+    With upsert=True it can be re-run, see upsert_cast.
+    """
+    if upsert:
+        upsert_cast(session, [{"name": "Christopher Nolan", "description": "Director of Inception",
+                               "title": "Inception"}], CastType.DIRECTOR)
+        upsert_cast(session, [{"name": "Bryan Cranston", "description": "Main actor in Breaking Bad",
+                               "title": "Breaking Bad"}], CastType.ACTOR)
+        session.commit()
+        return
+
     movie = session.query(Movie).filter_by(id=1).first()
     series = session.query(Series).filter_by(id=2).first()
     
@@ -103,9 +153,20 @@ def populate_cast(session):
     session.commit()
 
 
-def populate_episodes(session):
-    """Populates the Episode table with sample data."""
+def populate_episodes(session, upsert=False):
+    """
+    Populates the Episode table with sample data.
+    With upsert=True it can be re-run, see upsert_episodes.
+    """
     series = session.query(Series).first()
+    if upsert:
+        ensure_natural_keys(session)
+        upsert_episodes(session, [
+            {"title": "Pilot", "episode_number": 1, "series_id": series.id},
+            {"title": "Cat's in the Bag...", "episode_number": 2, "series_id": series.id},
+        ])
+        session.commit()
+        return
 
     episode1 = Episode(
         title="Pilot",
@@ -124,10 +185,20 @@ def populate_episodes(session):
     session.commit()
 
 
-def populate_reviews(session):
-    """Populates the Review table with sample data."""
+def populate_reviews(session, upsert=False):
+    """
+    Populates the Review table with sample data.
+    With upsert=True an existing review of the same user and media gets
+    its rating updated instead of a second review being added.
+    """
     user = session.query(User).first()
     media = session.query(Media).first()
+    if upsert:
+        review = session.query(Review).filter_by(user_id=user.id, media_id=media.id).first()
+        if review is not None:
+            review.rating = 9.0
+            session.commit()
+            return
 
     review = Review(
         rating=9.0,
@@ -139,18 +210,30 @@ def populate_reviews(session):
     session.commit()
 
 
-def populate_watchlist_media(session):
-    """Populates the watchlist-media many-to-many relationship with sample data."""
+def populate_watchlist_media(session, upsert=False):
+    """
+    Populates the watchlist-media many-to-many relationship with sample data.
+    With upsert=True only media not yet on the watchlist are added.
+    """
     watchlist = session.query(Watchlist).first()
     media = session.query(Media).all()
+    if upsert:
+        media = [item for item in media if item not in watchlist.media]
 
     watchlist.media.extend(media)  
     session.commit()
 
 #Aufgabe 1
-def create_single_cast(session, filename):
+def create_single_cast(session, filename, upsert=False):
+    if filename.endswith(".jsonl"):
+        return create_cast_from_jsonl(session, filename, upsert=upsert)
     with open(filename) as jsonfile:
         cast_data = json.load(jsonfile)
+        if upsert:
+            upsert_cast(session, [_cast_defaults("director", cast_data["director"])], CastType.DIRECTOR)
+            upsert_cast(session, [_cast_defaults("actor", actor) for actor in cast_data["actors"]], CastType.ACTOR)
+            session.commit()
+            return
         director_data = cast_data["director"]
         director = Director(
             series_id=1,
@@ -170,10 +253,79 @@ def create_single_cast(session, filename):
         session.add(director)
         session.commit()
 
+def _cast_defaults(kind, record):
+    # create_single_cast puts directors on series 1 and actors on movie 1
+    # unless the record names its media
+    if any(key in record for key in ("movie_id", "series_id", "title")):
+        return record
+    return {**record, ("series_id" if kind == "director" else "movie_id"): 1}
+
+
+def create_cast_from_jsonl(session, filename, batch_size=None, upsert=False):
+    """
+    Streams cast records from a JSONL file, one {"kind": "director"|"actor", ...}
+    object per line, without loading the file. Records without movie_id
+    and series_id get the defaults of create_single_cast. With upsert=True
+    records are merged in batches by upsert_cast.
+    """
+    batch_size = batch_size or BULK_BATCH_SIZE
+    added = 0
+    buffers = {"director": [], "actor": []}
+    for record in iter_jsonl(filename):
+        kind = record.pop("kind")
+        record = _cast_defaults(kind, record)
+        if upsert:
+            buffers[kind].append(record)
+            if len(buffers[kind]) >= batch_size:
+                upsert_cast(session, buffers[kind], CastType[kind.upper()])
+                session.commit()
+                buffers[kind] = []
+            added += 1
+            continue
+        model = Director if kind == "director" else Actor
+        session.add(model(movie_id=record.get("movie_id"), series_id=record.get("series_id"),
+                          description=record["description"], type=CastType[kind.upper()], name=record["name"]))
+        added += 1
+        if added % batch_size == 0:
+            session.commit()
+            session.expunge_all()
+    for kind, records in buffers.items():
+        if records:
+            upsert_cast(session, records, CastType[kind.upper()])
+    session.commit()
+    return added
+
 # Aufgabe 2 und 3 
-def create_other_user(session, filename):
+def create_other_user(session, filename, upsert=False, batch_size=None):
+    """
+    Adds the users of a .json (one user) or .jsonl (one per line) file.
+
+    Without upsert an email that is already in the database raises
+    IntegrityError (ix_users_email is unique), .jsonl batches committed
+    before it stay. With upsert existing users are merged on email, see
+    upsert_users.
+    """
+    if filename.endswith(".jsonl"):
+        # One user object per line, streamed and committed every batch_size users
+        batch_size = batch_size or BULK_BATCH_SIZE
+        if upsert:
+            ensure_natural_keys(session)
+        for records in batched(iter_jsonl(filename), batch_size):
+            if upsert:
+                upsert_users(session, records)
+            else:
+                session.add_all(OtherUser(username=user_data["username"], email=user_data["email"])
+                                for user_data in records)
+            session.commit()
+            session.expunge_all()
+        return
     with open(filename) as jsonfile:
         user_data = json.load(jsonfile)
+        if upsert:
+            ensure_natural_keys(session)
+            upsert_users(session, [user_data])
+            session.commit()
+            return
         other_user = OtherUser(
             username=user_data["username"],
             email=user_data["email"]
@@ -185,3 +337,531 @@ def create_other_user(session, filename):
 
         
         
+
+
+
+# Bulk catalog loading
+
+BULK_BATCH_SIZE = 10000
+
+# Order in which buffered kinds are flushed, parents before children
+CATALOG_KINDS = ("movie", "series", "episode", "director", "actor")
+
+# Kinds whose rows the rows of a kind can reference, flushed first
+CATALOG_PARENTS = {
+    "episode": ("series",),
+    "director": ("movie", "series"),
+    "actor": ("movie", "series"),
+}
+
+# Section names used by nested JSON documents such as json/neo4j.json
+CATALOG_SECTIONS = {
+    "movies": "movie",
+    "series": "series",
+    "episodes": "episode",
+    "directors": "director",
+    "director": "director",
+    "actors": "actor",
+}
+
+
+# .json catalogs are parsed whole, larger dumps have to be converted to .jsonl
+MAX_JSON_CATALOG_BYTES = 64 * 1024 * 1024
+
+
+def batched(iterable, batch_size):
+    """Yields lists of at most batch_size items from iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_catalog_records(filename, start=0, end=None):
+    """
+    Streams (kind, record) pairs from a catalog file.
+
+    A .jsonl file is memory-mapped and decoded line by line (see
+    jsonl_reader), every line is one record carrying a "kind" key (movie,
+    series, episode, director or actor); start/end restrict it to a byte
+    range from jsonl_reader.split_ranges. A .json file is
+    expected to look like json/neo4j.json or json/cast.json, i.e. one list
+    (or a single object) per section, and is walked section by section.
+
+    Only .jsonl is streamed: a .json file is loaded whole with json.load, so
+    files above MAX_JSON_CATALOG_BYTES are rejected with a ValueError, large
+    dumps must be written as .jsonl (see synthetic_data.write_catalog_jsonl).
+    """
+    if filename.endswith(".jsonl"):
+        for record in iter_jsonl(filename, start, end):
+            yield record.pop("kind"), record
+    else:
+        size = os.path.getsize(filename)
+        if size > MAX_JSON_CATALOG_BYTES:
+            raise ValueError(f"{filename} is {size} bytes, .json catalogs are read whole and limited to "
+                             f"{MAX_JSON_CATALOG_BYTES}; convert it to .jsonl to stream it")
+        with open(filename) as jsonfile:
+            data = json.load(jsonfile)
+        for section, kind in CATALOG_SECTIONS.items():
+            records = data.get(section, [])
+            if isinstance(records, dict):
+                records = [records]
+            for record in records:
+                yield kind, record
+
+
+def _next_id(session, table):
+    return (session.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _flush_media(session, records, media_type, child_table, child_column, next_id):
+    base_rows = []
+    child_rows = []
+    for record in records:
+        media_id = record.get("id")
+        if media_id is None:
+            media_id = next_id
+            next_id += 1
+        base_rows.append({
+            "id": media_id,
+            "title": record["title"],
+            "release_year": record["release_year"],
+            "rating": record["rating"],
+            "genre": record["genre"],
+            "media_type": media_type,
+        })
+        child_rows.append({"id": media_id, child_column: record[child_column]})
+    session.execute(insert(Media.__table__), base_rows)
+    session.execute(insert(child_table), child_rows)
+    return next_id
+
+
+def _flush_cast(session, records, cast_type, child_table, next_id):
+    base_rows = []
+    child_rows = []
+    for record in records:
+        cast_id = record.get("id")
+        if cast_id is None:
+            cast_id = next_id
+            next_id += 1
+        base_rows.append({
+            "id": cast_id,
+            "description": record["description"],
+            "type": cast_type,
+            "movie_id": record.get("movie_id"),
+            "series_id": record.get("series_id"),
+        })
+        child_rows.append({"id": cast_id, "name": record["name"]})
+    session.execute(insert(Cast.__table__), base_rows)
+    session.execute(insert(child_table), child_rows)
+    return next_id
+
+
+def _flush_episodes(session, records):
+    rows = [
+        {
+            "title": record["title"],
+            "episode_number": record["episode_number"],
+            "series_id": record["series_id"],
+        }
+        for record in records
+    ]
+    session.execute(insert(Episode.__table__), rows)
+
+
+def bulk_load_catalog(session, filename, batch_size=BULK_BATCH_SIZE, defaults=None, upsert=False):
+    """
+    Loads movies, series, episodes and cast from a JSON/JSONL catalog file.
+
+    Records are buffered per kind and written with executemany Core inserts
+    into the joined-inheritance tables (medias + movies/series,
+    casts + actors/directors), one commit per batch. Rows without an id get
+    one allocated after the current maximum of their base table. A full
+    episode or cast buffer flushes the pending movie and series buffers
+    first, so children never reach the database before their parents.
+
+    Parameters:
+    ----------
+    session : Session
+        The session used to write the rows.
+    filename : str
+        Path to a .json or .jsonl catalog file.
+    batch_size : int
+        Number of records per executemany batch.
+    defaults : dict, optional
+        Per-kind values for missing keys, e.g. {"actor": {"movie_id": 1}}
+        for files like json/cast.json that carry no foreign keys.
+    upsert : bool
+        Merge on natural keys (upsert_media, upsert_cast, upsert_episodes)
+        instead of inserting, so the same file can be loaded again and only
+        changed rows are rewritten. Without it a movie, series or episode
+        whose natural key is already in the database raises IntegrityError
+        (the unique indexes of ensure_natural_keys), the batches committed
+        before it stay loaded.
+
+    Returns:
+    -------
+    dict
+        Number of records loaded per kind.
+    """
+    if upsert:
+        ensure_natural_keys(session)
+    next_media_id = _next_id(session, Media.__table__)
+    next_cast_id = _next_id(session, Cast.__table__)
+    buffers = {kind: [] for kind in CATALOG_KINDS}
+    counts = {kind: 0 for kind in CATALOG_KINDS}
+    defaults = defaults or {}
+
+    def flush(kind):
+        nonlocal next_media_id, next_cast_id
+        records = buffers[kind]
+        if not records:
+            return
+        if upsert:
+            if kind in ("movie", "series"):
+                upsert_media(session, records, MediaType[kind.upper()])
+            elif kind == "episode":
+                upsert_episodes(session, records)
+            else:
+                upsert_cast(session, records, CastType[kind.upper()])
+        elif kind == "movie":
+            next_media_id = _flush_media(session, records, MediaType.MOVIE,
+                                         Movie.__table__, "duration", next_media_id)
+        elif kind == "series":
+            next_media_id = _flush_media(session, records, MediaType.SERIES,
+                                         Series.__table__, "season_count", next_media_id)
+        elif kind == "episode":
+            _flush_episodes(session, records)
+        elif kind == "director":
+            next_cast_id = _flush_cast(session, records, CastType.DIRECTOR,
+                                       Director.__table__, next_cast_id)
+        elif kind == "actor":
+            next_cast_id = _flush_cast(session, records, CastType.ACTOR,
+                                       Actor.__table__, next_cast_id)
+        session.commit()
+        counts[kind] += len(records)
+        buffers[kind] = []
+
+    start = time.perf_counter()
+    for kind, record in iter_catalog_records(filename):
+        if kind not in buffers:
+            raise ValueError(f"Unknown catalog record kind: {kind}")
+        if kind in defaults:
+            record = {**defaults[kind], **record}
+        buffers[kind].append(record)
+        if len(buffers[kind]) >= batch_size:
+            # Buffered parents go first so children never point at unwritten rows
+            for parent in CATALOG_PARENTS.get(kind, ()):
+                flush(parent)
+            flush(kind)
+    for kind in CATALOG_KINDS:
+        flush(kind)
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed > 0 else float("inf")
+    print(f"Bulk loaded {total} rows from {filename} in {elapsed:.2f}s ({rate:.0f} rows/s): {counts}")
+    return counts
+
+
+# Upserts on natural keys: media by (title, release_year), users by email,
+# cast by (type, name, media), episodes by (series_id, episode_number).
+# Every statement is INSERT ... ON CONFLICT DO UPDATE ... WHERE <a column
+# differs>, so rows that did not change are not rewritten (and do not fire
+# the aggregate triggers).
+
+NATURAL_KEY_INDEXES = [
+    index
+    for table in (User.__table__, Media.__table__, Episode.__table__)
+    for index in table.indexes
+    if index.unique
+]
+
+# Keys per row-value IN query when looking up ids
+KEY_LOOKUP_CHUNK = 500
+
+
+# Duplicate keys listed when a natural key index cannot be created
+MAX_REPORTED_DUPLICATES = 10
+
+
+def duplicate_natural_keys(session, index):
+    """
+    Returns the (key values..., count) rows of the keys of a unique index
+    that more than one row has. Rows with a NULL key column are not
+    compared, like in the index itself.
+    """
+    columns = list(index.columns)
+    return session.execute(
+        select(*columns, func.count())
+        .where(*(column.is_not(None) for column in columns))
+        .group_by(*columns)
+        .having(func.count() > 1)
+        .order_by(func.count().desc())
+        .limit(MAX_REPORTED_DUPLICATES)
+    ).all()
+
+
+def ensure_natural_keys(session):
+    """
+    Creates the unique natural key indexes on databases created before they
+    existed. The loaders call it once per load before their first upsert,
+    callers of upsert_media, upsert_users and upsert_episodes on such
+    databases have to do the same.
+
+    Raises:
+        RuntimeError: If the rows of an older database repeat a natural key
+            (e.g. two users with the same email), listing the duplicates.
+            They have to be merged or removed before upserting.
+    """
+    connection = session.connection()
+    existing = set(connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"
+    ).scalars())
+    for index in NATURAL_KEY_INDEXES:
+        if index.name in existing:
+            continue
+        duplicates = duplicate_natural_keys(session, index)
+        if duplicates:
+            keys = ", ".join(f"{tuple(row[:-1])} x{row[-1]}" for row in duplicates)
+            columns = ", ".join(column.name for column in index.columns)
+            raise RuntimeError(
+                f"Cannot create unique index {index.name}: {index.table.name} has duplicate "
+                f"({columns}) values: {keys}"
+            )
+        index.create(connection)
+
+
+def _upsert(session, table, rows, key_columns, update_columns):
+    """
+    Upserts rows (dicts with the same keys) into table with executemany.
+
+    Returns:
+        int: Number of rows inserted or changed.
+    """
+    if not rows:
+        return 0
+    statement = sqlite_insert(table)
+    if update_columns:
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: statement.excluded[column] for column in update_columns},
+            where=or_(*(table.c[column].is_distinct_from(statement.excluded[column])
+                        for column in update_columns)),
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=key_columns)
+    return session.execute(statement, rows).rowcount
+
+
+def _ids_by_key(session, table, key_columns, keys):
+    """Maps natural key tuples to the ids of the rows having them."""
+    columns = [table.c[column] for column in key_columns]
+    ids = {}
+    for chunk in batched(set(keys), KEY_LOOKUP_CHUNK):
+        rows = session.execute(select(table.c.id, *columns).where(tuple_(*columns).in_(chunk)))
+        ids.update({tuple(row[1:]): row[0] for row in rows})
+    return ids
+
+
+def upsert_media(session, records, media_type):
+    """
+    Merges movie or series records on (title, release_year).
+
+    New titles are inserted into medias and movies/series (with their "id"
+    if the record has one), existing ones keep their id and get rating,
+    genre and duration/season_count updated where they differ.
+
+    Returns:
+        int: Number of rows inserted or changed across both tables.
+    """
+    medias = Media.__table__
+    if media_type == MediaType.MOVIE:
+        child_table, child_column, other_child = Movie.__table__, "duration", Series.__table__
+    else:
+        child_table, child_column, other_child = Series.__table__, "season_count", Movie.__table__
+    written = _upsert(session, medias, [
+        {
+            "id": record.get("id"),
+            "title": record["title"],
+            "release_year": record["release_year"],
+            "rating": record["rating"],
+            "genre": record["genre"],
+            "media_type": media_type,
+        }
+        for record in records
+    ], ["title", "release_year"], ["rating", "genre", "media_type"])
+
+    ids = _ids_by_key(session, medias, ["title", "release_year"],
+                      [(record["title"], record["release_year"]) for record in records])
+    child_rows = [
+        {"id": ids[(record["title"], record["release_year"])], child_column: record[child_column]}
+        for record in records
+    ]
+    written += _upsert(session, child_table, child_rows, ["id"], [child_column])
+    # A title that changed between movie and series leaves a stale subclass row
+    session.execute(delete(other_child).where(other_child.c.id.in_([row["id"] for row in child_rows])))
+    return written
+
+
+def _subscription_type(value):
+    if isinstance(value, SubscriptionType):
+        return value
+    if value in SubscriptionType.__members__:
+        return SubscriptionType[value]
+    return SubscriptionType(value)
+
+
+def _date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def upsert_users(session, records):
+    """
+    Merges user records on email.
+
+    Records with subscription fields (iban, price, subscription_type,
+    start_date, end_date) are main users and get their subscription
+    inserted or updated, the others are other users. As in JSON files,
+    subscription_type can be a SubscriptionType, its name or its value and
+    the dates date objects or ISO strings.
+
+    Returns:
+        int: Number of rows inserted or changed.
+    """
+    users = User.__table__
+    written = _upsert(session, users, [
+        {
+            "username": record["username"],
+            "email": record["email"],
+            "user_type": UserType.MAIN_USER if "iban" in record else UserType.OTHER_USER,
+        }
+        for record in records
+    ], ["email"], ["username", "user_type"])
+
+    ids = _ids_by_key(session, users, ["email"], [(record["email"],) for record in records])
+    main_records = {ids[(record["email"],)]: record for record in records if "iban" in record}
+    other_ids = {ids[(record["email"],)] for record in records if "iban" not in record}
+    written += _upsert(session, MainUser.__table__, [{"id": id_} for id_ in main_records], ["id"], [])
+    written += _upsert(session, OtherUser.__table__, [{"id": id_} for id_ in other_ids], ["id"], [])
+    # Users that changed type leave a stale subclass row (and subscription)
+    subscriptions = Subscription.__table__
+    session.execute(delete(subscriptions).where(subscriptions.c.main_user_id.in_(list(other_ids))))
+    session.execute(delete(MainUser.__table__).where(MainUser.__table__.c.id.in_(list(other_ids))))
+    session.execute(delete(OtherUser.__table__).where(OtherUser.__table__.c.id.in_(list(main_records))))
+
+    existing = dict(session.execute(
+        select(subscriptions.c.main_user_id, subscriptions.c.id)
+        .where(subscriptions.c.main_user_id.in_(list(main_records)))
+    ).all())
+    rows = [
+        {
+            "id": existing.get(user_id),
+            "iban": record["iban"],
+            "price": record["price"],
+            "subscription_type": _subscription_type(record["subscription_type"]),
+            "startdate": _date(record["start_date"]),
+            "enddate": _date(record["end_date"]),
+            "main_user_id": user_id,
+        }
+        for user_id, record in main_records.items()
+    ]
+    written += _upsert(session, subscriptions, rows, ["id"],
+                       ["iban", "price", "subscription_type", "startdate", "enddate"])
+    return written
+
+
+def _resolve_media(session, records):
+    # Fills movie_id/series_id of records that name their media by title
+    # (and optionally release_year)
+    def is_titled(record):
+        return "title" in record and record.get("movie_id") is None and record.get("series_id") is None
+
+    titles = {record["title"] for record in records if is_titled(record)}
+    if not titles:
+        return records
+    medias = Media.__table__
+    found = {}
+    for chunk in batched(titles, KEY_LOOKUP_CHUNK):
+        for media_id, title, release_year, media_type in session.execute(
+            select(medias.c.id, medias.c.title, medias.c.release_year, medias.c.media_type)
+            .where(medias.c.title.in_(chunk))
+        ):
+            found.setdefault((title, None), (media_id, media_type))
+            found[(title, release_year)] = (media_id, media_type)
+    resolved = []
+    for record in records:
+        if is_titled(record):
+            key = (record["title"], record.get("release_year"))
+            if key not in found:
+                raise ValueError(f"No media titled {key[0]!r} ({key[1]}) for cast member {record['name']!r}")
+            media_id, media_type = found[key]
+            column = "movie_id" if media_type == MediaType.MOVIE else "series_id"
+            record = {**record, column: media_id}
+        resolved.append(record)
+    return resolved
+
+
+def upsert_cast(session, records, cast_type):
+    """
+    Merges director or actor records on (name, movie_id, series_id).
+
+    Records give their media as movie_id/series_id or by "title" (plus
+    "release_year" if titles repeat). Existing credits get their
+    description updated where it differs, new ones are inserted into casts
+    and actors/directors.
+
+    Returns:
+        int: Number of rows inserted or changed.
+    """
+    casts = Cast.__table__
+    child_table = Director.__table__ if cast_type == CastType.DIRECTOR else Actor.__table__
+    records = _resolve_media(session, records)
+
+    def key(record):
+        return (record["name"], record.get("movie_id"), record.get("series_id"))
+
+    existing = {}
+    for chunk in batched({record["name"] for record in records}, KEY_LOOKUP_CHUNK):
+        for cast_id, name, movie_id, series_id in session.execute(
+            select(casts.c.id, child_table.c.name, casts.c.movie_id, casts.c.series_id)
+            .join_from(casts, child_table, child_table.c.id == casts.c.id)
+            .where(child_table.c.name.in_(chunk))
+        ):
+            existing[(name, movie_id, series_id)] = cast_id
+
+    updates = {}
+    new = {}
+    for record in records:
+        if key(record) in existing:
+            updates[key(record)] = {
+                "id": existing[key(record)],
+                "description": record["description"],
+                "type": cast_type,
+                "movie_id": record.get("movie_id"),
+                "series_id": record.get("series_id"),
+            }
+        else:
+            # Duplicates within the input collapse to the last record
+            new[key(record)] = {field: value for field, value in record.items() if field != "id"}
+    written = _upsert(session, casts, list(updates.values()), ["id"], ["description"])
+    if new:
+        _flush_cast(session, list(new.values()), cast_type, child_table, _next_id(session, casts))
+        written += 2 * len(new)
+    return written
+
+
+def upsert_episodes(session, records):
+    """
+    Merges episode records on (series_id, episode_number), updating changed titles.
+
+    Returns:
+        int: Number of rows inserted or changed.
+    """
+    return _upsert(session, Episode.__table__, [
+        {"title": record["title"], "episode_number": record["episode_number"], "series_id": record["series_id"]}
+        for record in records
+    ], ["series_id", "episode_number"], ["title"])
+
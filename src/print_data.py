@@ -1,4 +1,6 @@
 from classes import (
+    MediaType,
+    CastType,
     User,
     MainUser,
     Subscription,
@@ -15,33 +17,69 @@ from classes import (
     watchlist_media
 )
 import json
-from queries import Queries
-
-
-def print_users(session):
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload, with_polymorphic
+from queries import Queries, STREAM_PAGE_SIZE
+from export import export_sections, json_default, open_output
+import read_model
+
+
+def stream_rows(session, model, page_size=STREAM_PAGE_SIZE, options=()):
+    """
+    Yields all entities of a model ordered by id, page_size rows at a time.
+
+    Uses keyset pagination (id > last id ORDER BY id LIMIT page_size) so only
+    one page is held in memory, no matter how big the table is. model may be
+    a with_polymorphic entity, options are passed to Query.options (e.g.
+    selectinload) and apply to every page.
+    """
+    last_id = None
+    while True:
+        query = session.query(model).options(*options)
+        if last_id is not None:
+            query = query.filter(model.id > last_id)
+        page = query.order_by(model.id).limit(page_size).all()
+        if not page:
+            return
+        yield from page
+        last_id = page[-1].id
+
+
+def listing(session, model, name, page_size, lightweight, options=()):
+    """ORM entities from stream_rows, or read_model rows when lightweight is set."""
+    if lightweight:
+        return read_model.iter_rows(session, name, page_size)
+    return stream_rows(session, model, page_size, options)
+
+
+def print_users(session, page_size=STREAM_PAGE_SIZE, lightweight=False):
     """Prints all entries in the User, MainUser, and OtherUser tables."""
-    users = session.query(User).all()
-    for user in users:
+    for user in listing(session, User, "users", page_size, lightweight):
         print(f"ID: {user.id}, Username: {user.username}, Email: {user.email}, Type: {user.user_type}")
 
 
-def print_watchlists(session):
+def print_watchlists(session, page_size=STREAM_PAGE_SIZE, lightweight=False):
     """Prints all entries in the Watchlist table."""
-    watchlists = session.query(Watchlist).all()
-    for watchlist in watchlists:
+    for watchlist in listing(session, Watchlist, "watchlists", page_size, lightweight):
         print(f"ID: {watchlist.id}, User ID: {watchlist.user_id}")
 
 
-def print_media(session):
-    """Prints all entries in the Media, Movie, and Series tables."""
-    media_items = session.query(Media).all()
-    for media in media_items:
-        if isinstance(media, Movie):
+def print_media(session, page_size=STREAM_PAGE_SIZE, eager=True, lightweight=False):
+    """
+    Prints all entries in the Media, Movie, and Series tables.
+
+    With eager=True the subclass tables are joined into every page
+    (with_polymorphic) instead of being loaded per row on first access.
+    With lightweight=True plain read_model rows are printed instead of entities.
+    """
+    entity = with_polymorphic(Media, [Movie, Series]) if eager else Media
+    for media in listing(session, entity, "media", page_size, lightweight):
+        if media.media_type == MediaType.MOVIE:
             print(
                 f"Movie ID: {media.id}, Title: {media.title}, Release Year: {media.release_year}, "
                 f"Rating: {media.rating}, Genre: {media.genre}, Duration: {media.duration}"
             )
-        elif isinstance(media, Series):
+        elif media.media_type == MediaType.SERIES:
             print(
                 f"Series ID: {media.id}, Title: {media.title}, Release Year: {media.release_year}, "
                 f"Rating: {media.rating}, Genre: {media.genre}, Seasons: {media.season_count}"
@@ -53,70 +91,106 @@ def print_media(session):
             )
 
 
-def print_cast(session):
-    """Prints all entries in the Cast, Director, and Actor tables."""
-    cast_items = session.query(Cast).all()
-    for cast in cast_items:
-        if isinstance(cast, Director):
+def print_cast(session, page_size=STREAM_PAGE_SIZE, eager=True, lightweight=False):
+    """
+    Prints all entries in the Cast, Director, and Actor tables.
+
+    With eager=True the subclass tables are joined into every page
+    (with_polymorphic) instead of being loaded per row on first access.
+    With lightweight=True plain read_model rows are printed instead of entities.
+    """
+    entity = with_polymorphic(Cast, [Director, Actor]) if eager else Cast
+    for cast in listing(session, entity, "cast", page_size, lightweight):
+        if cast.type == CastType.DIRECTOR:
             print(f"Director ID: {cast.id}, Name: {cast.name}, Description: {cast.description}")
-        elif isinstance(cast, Actor):
+        elif cast.type == CastType.ACTOR:
             print(f"Actor ID: {cast.id}, Name: {cast.name}, Description: {cast.description}")
         else:
             print(f"Cast ID: {cast.id}, Description: {cast.description}, Type: {cast.type}")
 
 
-def print_episodes(session):
+def print_episodes(session, page_size=STREAM_PAGE_SIZE, lightweight=False):
     """Prints all entries in the Episode table."""
-    episodes = session.query(Episode).all()
-    for episode in episodes:
+    for episode in listing(session, Episode, "episodes", page_size, lightweight):
         print(
             f"Episode ID: {episode.id}, Title: {episode.title}, Episode Number: {episode.episode_number}, "
             f"Series ID: {episode.series_id}"
         )
 
 
-def print_reviews(session):
+def print_reviews(session, page_size=STREAM_PAGE_SIZE, lightweight=False):
     """Prints all entries in the Review table."""
-    reviews = session.query(Review).all()
-    for review in reviews:
+    for review in listing(session, Review, "reviews", page_size, lightweight):
         print(
             f"Review ID: {review.id}, Rating: {review.rating}, User ID: {review.user_id}, Media ID: {review.media_id}"
         )
 
 
-def print_watchlist_media(session):
-    """Prints the media items associated with each watchlist."""
-    watchlists = session.query(Watchlist).all()
-    for watchlist in watchlists:
+def print_watchlist_media(session, page_size=STREAM_PAGE_SIZE, eager=True, lightweight=False):
+    """
+    Prints the media items associated with each watchlist.
+
+    With eager=True the media of a whole page of watchlists are fetched in
+    one extra SELECT ... IN (selectinload) instead of one query per watchlist.
+    With lightweight=True a single joined select yields plain rows instead.
+    """
+    if lightweight:
+        current_watchlist = None
+        for row in read_model.iter_watchlist_media(session, page_size):
+            if row.watchlist_id != current_watchlist:
+                current_watchlist = row.watchlist_id
+                print(f"Watchlist ID: {row.watchlist_id} (User ID: {row.user_id}) has media items:")
+            if row.media_id is not None:
+                print(f"  - Media ID: {row.media_id}, Title: {row.title}")
+        return
+
+    options = (selectinload(Watchlist.media),) if eager else ()
+    for watchlist in stream_rows(session, Watchlist, page_size, options):
         print(f"Watchlist ID: {watchlist.id} (User ID: {watchlist.user_id}) has media items:")
         for media in watchlist.media:
             print(f"  - Media ID: {media.id}, Title: {media.title}")
 
 
 def to_dict(instance):
+    if hasattr(instance, "_asdict"):
+        # read_model rows
+        return instance._asdict()
     return {key: value for key, value in instance.__dict__.items() if not key.startswith('_')}
 
 
-def reviewandwatchlist_to_json(session):
-    review = session.query(Review).filter_by(id=1).first()
-    watchlist = session.query(Watchlist).filter_by(id=1).first()
-    
-    review = to_dict(review)
-    watchlist = to_dict(watchlist)
-    with open("json/reviewwatchlist.json", "w") as json_file:
-        json.dump(review, json_file, indent=4)
-        json.dump(watchlist, json_file, indent=4)
-
-
-def queries_to_json(session):
-
-    queries_instance = Queries()
-    query1 = queries_instance.count_reviews_per_media(session)
-    query2 = queries_instance.average_rating_by_genre(session)
-    query3 = queries_instance.count_episodes_per_series(session)
+def reviewandwatchlist_to_json(session, filename="json/reviewwatchlist.json", review_id=1, watchlist_id=1,
+                               compression=None):
+    """Writes one review and one watchlist as a single JSON object {"review": ..., "watchlist": ...}."""
+    review = session.execute(
+        select(Review.__table__).where(Review.__table__.c.id == review_id)
+    ).mappings().first()
+    watchlist = session.execute(
+        select(Watchlist.__table__).where(Watchlist.__table__.c.id == watchlist_id)
+    ).mappings().first()
+
+    with open_output(filename, compression) as json_file:
+        json.dump(
+            {
+                "review": dict(review) if review else None,
+                "watchlist": dict(watchlist) if watchlist else None,
+            },
+            json_file,
+            indent=4,
+            default=json_default,
+        )
 
-    with open("json/queries.json", "w") as json_file:
-        json.dump(query1, json_file, indent=4)
-        json.dump(query2, json_file, indent=4)
-        json.dump(query3, json_file, indent=4)
 
+def queries_to_json(session, filename="json/queries.json", compression=None, materialized=False):
+    """
+    Streams three query results into one JSON document, one array per query.
+
+    Rows are written as they are fetched (see Queries.stream), so memory does
+    not grow with the result size.
+    """
+    queries_instance = Queries(materialized)
+    names = ["count_reviews_per_media", "average_rating_by_genre", "count_episodes_per_series"]
+    export_sections(
+        ((name, (list(row) for row in queries_instance.stream(session, name))) for name in names),
+        filename,
+        compression,
+    )
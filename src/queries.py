@@ -1,4 +1,4 @@
-from sqlalchemy import func
+from sqlalchemy import case, func
 from classes import (
     User,
     Media,
@@ -7,80 +7,320 @@ from classes import (
     Subscription,
     Episode,
     Series,
+    UserMediaCount,
+    MediaReviewStats,
+    GenreRatingStats,
+    SeriesEpisodeCount,
+    SubscriptionRevenue,
     watchlist_media
 )
 
 
+STREAM_PAGE_SIZE = 1000
+# Averages are rounded to this many decimals in both modes: the running sums
+# of the summary tables and AVG add up the ratings in different orders and
+# can differ in the last binary digits
+AVERAGE_DECIMALS = 9
+
+
 class Queries:
 
+    def __init__(self, materialized=False):
+        """
+        Parameters:
+        ----------
+        materialized : bool
+            Read the agg_* summary tables (see aggregates.py) instead of
+            aggregating the base tables. utils.setup backfills them on
+            databases created before they existed.
+        """
+        self.materialized = materialized
+
+    # Query builders, each returns the query and the column identifying a group
+
+    def _count_media_per_user(self, session):
+        if self.materialized:
+            query = session.query(
+                User.username,
+                UserMediaCount.media_count
+            ).join(UserMediaCount, User.id == UserMediaCount.user_id)
+        else:
+            query = session.query(
+                User.username,
+                func.count(Media.id).label('media_count')
+            ).join(Watchlist, User.id == Watchlist.user_id) \
+            .join(watchlist_media, Watchlist.id == watchlist_media.c.watchlists_id) \
+            .join(Media, Media.id == watchlist_media.c.medias_id) \
+            .group_by(User.id)
+        return query, User.id
+
+    def _average_rating_by_genre(self, session):
+        if self.materialized:
+            query = session.query(
+                GenreRatingStats.genre,
+                func.round(case(
+                    (GenreRatingStats.rating_count > 0, GenreRatingStats.rating_sum / GenreRatingStats.rating_count)
+                ), AVERAGE_DECIMALS).label('average_rating')
+            )
+            return query, GenreRatingStats.genre
+        query = session.query(
+            Media.genre,
+            func.round(func.avg(Media.rating), AVERAGE_DECIMALS).label('average_rating')
+        ).group_by(Media.genre)
+        return query, Media.genre
+
+    # Grouped and ordered on the reviews side, so SQLite walks the
+    # (media_id, rating) index or the summary table and only looks up the
+    # reviewed media instead of scanning medias
+    def _count_reviews_per_media(self, session):
+        if self.materialized:
+            query = session.query(
+                Media.title,
+                MediaReviewStats.review_count
+            ).select_from(MediaReviewStats) \
+            .join(Media, Media.id == MediaReviewStats.media_id)
+            return query, MediaReviewStats.media_id
+        query = session.query(
+            Media.title,
+            func.count(Review.id).label('review_count')
+        ).join(Review, Media.id == Review.media_id) \
+        .group_by(Review.media_id)
+        return query, Review.media_id
+
+    def _total_revenue_by_subscription_type(self, session):
+        if self.materialized:
+            query = session.query(
+                SubscriptionRevenue.subscription_type,
+                SubscriptionRevenue.total_revenue
+            )
+            return query, SubscriptionRevenue.subscription_type
+        query = session.query(
+            Subscription.subscription_type,
+            func.sum(Subscription.price).label('total_revenue')
+        ).group_by(Subscription.subscription_type)
+        return query, Subscription.subscription_type
+
+    def _count_episodes_per_series(self, session):
+        if self.materialized:
+            query = session.query(
+                Series.title,
+                SeriesEpisodeCount.episode_count
+            ).join(SeriesEpisodeCount, Series.id == SeriesEpisodeCount.series_id)
+        else:
+            query = session.query(
+                Series.title,
+                func.count(Episode.id).label('episode_count')
+            ).join(Episode, Series.id == Episode.series_id) \
+            .group_by(Series.id)
+        return query, Series.id
+
+    # Rankings, computed with window functions in SQLite. Only the media
+    # ranking has a summary table to read, decades and rating distributions
+    # always come from the base tables. Their group column is a row_number()
+    # in result order, as ties share the rank and a rank alone cannot be
+    # paged over.
+
+    def _top_media_by_rating(self, session, n=10, min_reviews=5):
+        if self.materialized:
+            # reviews.rating is NOT NULL, so review_count is the rated review count
+            stats = session.query(
+                MediaReviewStats.media_id,
+                func.round(MediaReviewStats.rating_sum / MediaReviewStats.review_count,
+                           AVERAGE_DECIMALS).label('average_rating'),
+                MediaReviewStats.review_count
+            ).filter(MediaReviewStats.review_count >= min_reviews) \
+            .subquery()
+        else:
+            stats = session.query(
+                Review.media_id,
+                func.round(func.avg(Review.rating), AVERAGE_DECIMALS).label('average_rating'),
+                func.count(Review.rating).label('review_count')
+            ).group_by(Review.media_id) \
+            .having(func.count(Review.rating) >= min_reviews) \
+            .subquery()
+        ranked = session.query(
+            stats,
+            func.rank().over(order_by=stats.c.average_rating.desc()).label('rank'),
+            func.row_number().over(order_by=(stats.c.average_rating.desc(), stats.c.media_id)).label('position')
+        ).subquery()
+        query = session.query(
+            Media.title,
+            ranked.c.average_rating,
+            ranked.c.review_count,
+            ranked.c.rank
+        ).join(ranked, Media.id == ranked.c.media_id) \
+        .filter(ranked.c.rank <= n)
+        return query, ranked.c.position
+
+    def _top_genres_per_decade(self, session, n=3):
+        decade = (Media.release_year // 10 * 10).label('decade')
+        counts = session.query(
+            decade,
+            Media.genre,
+            func.count().label('media_count')
+        ).group_by(decade, Media.genre) \
+        .subquery()
+        ranked = session.query(
+            counts,
+            func.row_number().over(
+                partition_by=counts.c.decade,
+                order_by=(counts.c.media_count.desc(), counts.c.genre)
+            ).label('rank'),
+            func.row_number().over(
+                order_by=(counts.c.decade, counts.c.media_count.desc(), counts.c.genre)
+            ).label('position')
+        ).subquery()
+        query = session.query(
+            ranked.c.decade,
+            ranked.c.genre,
+            ranked.c.media_count,
+            ranked.c.rank
+        ).filter(ranked.c.rank <= n)
+        return query, ranked.c.position
+
+    def _rating_percentiles_by_genre(self, session, percentiles=(0.25, 0.5, 0.75, 0.9)):
+        ranked = session.query(
+            Media.genre,
+            Review.rating,
+            func.cume_dist().over(partition_by=Media.genre, order_by=Review.rating).label('cume_dist')
+        ).join(Review, Media.id == Review.media_id) \
+        .filter(Review.rating.isnot(None)) \
+        .subquery()
+        query = session.query(
+            ranked.c.genre,
+            *(func.min(case((ranked.c.cume_dist >= percentile, ranked.c.rating))).label(f'p{percentile * 100:g}')
+              for percentile in percentiles)
+        ).group_by(ranked.c.genre)
+        return query, ranked.c.genre
+
+    def column_names(self, session, name, **parameters):
+        """Returns the column names of the rows yielded by stream(session, name, **parameters)."""
+        query, key = getattr(self, f"_{name}")(session, **parameters)
+        return [description["name"] for description in query.column_descriptions]
+
+    def stream(self, session, name, page_size=STREAM_PAGE_SIZE, **parameters):
+        """
+        Yields the rows of one of the queries below without loading them all.
+
+        Groups are fetched page by page with keyset pagination on the group
+        column (key > last key ORDER BY key LIMIT page_size), so memory stays
+        bounded by page_size whatever the table size.
+
+        Parameters:
+        ----------
+        session : Session
+            The session to query with.
+        name : str
+            Name of the query, e.g. 'count_reviews_per_media'.
+        page_size : int
+            Number of groups fetched per round trip.
+        **parameters
+            Arguments of the query, e.g. n=5 for 'top_media_by_rating'.
+        """
+        query, key = getattr(self, f"_{name}")(session, **parameters)
+        query = query.add_columns(key).order_by(key)
+        last_key = None
+        while True:
+            page_query = query if last_key is None else query.filter(key > last_key)
+            page = page_query.limit(page_size).all()
+            if not page:
+                return
+            for row in page:
+                yield tuple(row[:-1])
+            last_key = page[-1][-1]
+
     def count_media_per_user(self, session):
         """Counts the number of media items in each user's watchlist."""
-        result = session.query(
-            User.username,
-            func.count(Media.id).label('media_count')
-        ).join(Watchlist, User.id == Watchlist.user_id) \
-        .join(watchlist_media, Watchlist.id == watchlist_media.c.watchlists_id) \
-        .join(Media, Media.id == watchlist_media.c.medias_id) \
-        .group_by(User.id) \
-        .all()
+        query, key = self._count_media_per_user(session)
+        result = query.order_by(key).all()
 
         r = []
         for username, media_count in result:
             r.append([username, media_count])
             print(f"Username: {username}, Media Count: {media_count}")
         return r
-    
+
 
     def average_rating_by_genre(self, session):
         """Calculates the average rating of movies and series by genre."""
-        result = session.query(
-            Media.genre,
-            func.avg(Media.rating).label('average_rating')
-        ).group_by(Media.genre) \
-        .all()
+        query, key = self._average_rating_by_genre(session)
+        result = query.order_by(key).all()
         r = []
         for genre, avg_rating in result:
             r.append([genre, avg_rating])
-            print(f"Genre: {genre}, Average Rating: {avg_rating:.2f}")
+            print(f"Genre: {genre}, Average Rating: {'-' if avg_rating is None else f'{avg_rating:.2f}'}")
         return r
 
     def count_reviews_per_media(self, session):
         """Counts the number of reviews per media item."""
-        result = session.query(
-            Media.title,
-            func.count(Review.id).label('review_count')
-        ).join(Review, Media.id == Review.media_id) \
-        .group_by(Media.id) \
-        .all()
+        query, key = self._count_reviews_per_media(session)
+        result = query.order_by(key).all()
         r = []
         for title, review_count in result:
             r.append([title, review_count])
             print(f"Media Title: {title}, Review Count: {review_count}")
         return r
-    
-    
+
+
     def total_revenue_by_subscription_type(self, session):
         """Calculates total revenue by subscription type."""
-        result = session.query(
-            Subscription.subscription_type,
-            func.sum(Subscription.price).label('total_revenue')
-        ).group_by(Subscription.subscription_type) \
-        .all()
+        query, key = self._total_revenue_by_subscription_type(session)
+        result = query.order_by(key).all()
 
         for sub_type, total_revenue in result:
             print(f"Subscription Type: {sub_type}, Total Revenue: ${total_revenue:.2f}")
 
     def count_episodes_per_series(self, session):
         """Counts the number of episodes per series."""
-        result = session.query(
-            Series.title,
-            func.count(Episode.id).label('episode_count')
-        ).join(Episode, Series.id == Episode.series_id) \
-        .group_by(Series.id) \
-        .all()
+        query, key = self._count_episodes_per_series(session)
+        result = query.order_by(key).all()
 
         r = []
         for title, episode_count in result:
             r.append([title, episode_count])
             print(f"Series Title: {title}, Episode Count: {episode_count}")
-        return r
\ No newline at end of file
+        return r
+
+    # Rankings
+
+    def top_media_by_rating(self, session, n=10, min_reviews=5):
+        """
+        Ranks media by average review rating among those with at least
+        min_reviews rated reviews and returns the top n ranks (ties share a
+        rank, so more than n rows are possible).
+        """
+        query, key = self._top_media_by_rating(session, n, min_reviews)
+        result = query.order_by(key).all()
+
+        r = []
+        for title, avg_rating, review_count, rank in result:
+            r.append([title, avg_rating, review_count, rank])
+            print(f"Rank: {rank}, Media Title: {title}, Average Rating: {avg_rating:.2f}, Reviews: {review_count}")
+        return r
+
+    def top_genres_per_decade(self, session, n=3):
+        """Returns the n genres with the most media of every release decade."""
+        query, key = self._top_genres_per_decade(session, n)
+        result = query.order_by(key).all()
+
+        r = []
+        for decade, genre, media_count, rank in result:
+            r.append([decade, genre, media_count, rank])
+            print(f"Decade: {decade}s, Rank: {rank}, Genre: {genre}, Media Count: {media_count}")
+        return r
+
+    def rating_percentiles_by_genre(self, session, percentiles=(0.25, 0.5, 0.75, 0.9)):
+        """
+        Calculates review rating percentiles per genre (nearest rank: the
+        smallest rating whose cumulative share of the genre's ratings
+        reaches the percentile).
+        """
+        query, key = self._rating_percentiles_by_genre(session, percentiles)
+        result = query.order_by(key).all()
+
+        r = []
+        for genre, *values in result:
+            r.append([genre, *values])
+            formatted = ", ".join(f"P{percentile * 100:g}: {value}" for percentile, value in zip(percentiles, values))
+            print(f"Genre: {genre}, {formatted}")
+        return r
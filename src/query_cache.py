@@ -0,0 +1,236 @@
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, attributes
+from sqlalchemy.sql.elements import TextClause
+
+from queries import Queries
+
+
+CACHE_SIZE = 256
+CACHE_TTL = 60.0
+
+# Queries method -> tables whose writes can change its result
+QUERY_TABLES = {
+    "count_media_per_user": {"users", "watchlists", "watchlist_media", "medias"},
+    "average_rating_by_genre": {"medias", "reviews"},
+    "count_reviews_per_media": {"medias", "reviews"},
+    "total_revenue_by_subscription_type": {"subscriptions"},
+    "count_episodes_per_series": {"medias", "series", "episodes"},
+    "top_media_by_rating": {"medias", "reviews"},
+    "top_genres_per_decade": {"medias"},
+    "rating_percentiles_by_genre": {"medias", "reviews"},
+}
+
+
+def flushed_tables(session):
+    """Names of the tables the pending changes of a session write to."""
+    tables = set()
+    for instance, deleted in [(i, False) for i in session.new | session.dirty] + [(i, True) for i in session.deleted]:
+        mapper = inspect(instance).mapper
+        # Objects in session.dirty may only have had a collection changed
+        if instance not in session.dirty or session.is_modified(instance, include_collections=False):
+            tables.update(table.name for table in mapper.tables)
+        # Collection changes only show up as rows in the association table
+        for relationship in mapper.relationships:
+            if relationship.secondary is None:
+                continue
+            if deleted or attributes.get_history(
+                instance, relationship.key, attributes.PASSIVE_NO_INITIALIZE
+            ).has_changes():
+                tables.add(relationship.secondary.name)
+    return tables
+
+
+# Target table of a textual INSERT/REPLACE/UPDATE/DELETE
+TEXT_WRITE_PATTERN = re.compile(
+    r"""^\s*(?:(?:INSERT|REPLACE)(?:\s+OR\s+\w+)?\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+["`\[]?(\w+)""",
+    re.IGNORECASE,
+)
+
+
+def statement_tables(orm_execute_state):
+    """
+    Names of the tables an INSERT/UPDATE/DELETE run through Session.execute
+    writes to, including text() statements.
+    """
+    if isinstance(orm_execute_state.statement, TextClause):
+        match = TEXT_WRITE_PATTERN.match(orm_execute_state.statement.text)
+        return {match.group(1)} if match else set()
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return set()
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None:
+        return {table.name for table in mapper.tables}
+    return {orm_execute_state.statement.table.name}
+
+
+def uncommitted_writes(session):
+    """
+    True if the session's transaction has written to the database. sqlite3
+    only opens a DBAPI transaction for writes; other drivers count any open
+    transaction.
+    """
+    if not session.in_transaction():
+        return False
+    dbapi_connection = session.connection().connection.dbapi_connection
+    return getattr(dbapi_connection, "in_transaction", True)
+
+
+class CachedQueries:
+    """
+    LRU cache with a TTL in front of the Queries methods.
+
+    Results are keyed by method name and arguments (the session is not part
+    of the key). Sessions passed to a call are watched: the tables written
+    by a flush or an INSERT/UPDATE/DELETE statement (Core or text()) are
+    remembered per session and the cached results depending on them are
+    dropped when the session commits; a rollback forgets them. Until then
+    the writing session bypasses the cache for those results, so its
+    uncommitted data is neither served to nor stored for other sessions.
+    Writes made elsewhere (other sessions not passed to watch, raw
+    connections, refresh_aggregates) need an explicit invalidate(). Cache
+    hits return the stored object and do not print.
+    """
+
+    def __init__(self, queries=None, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        """
+        Parameters:
+        ----------
+        queries : Queries
+            The instance to delegate to, a plain Queries() by default.
+        maxsize : int
+            Maximum number of cached results, least recently used go first.
+        ttl : float
+            Seconds a result stays valid, None for no expiry.
+        """
+        self.queries = queries if queries is not None else Queries()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # Bumped by every invalidation, a result computed across one is not stored
+        self.generation = 0
+        # Session -> tables written in its current transaction
+        self.pending = weakref.WeakKeyDictionary()
+
+    def __getattr__(self, name):
+        if name not in QUERY_TABLES:
+            raise AttributeError(name)
+
+        def cached_method(session, *args, **kwargs):
+            return self.call(session, name, *args, **kwargs)
+        cached_method.__name__ = name
+        cached_method.__doc__ = getattr(Queries, name).__doc__
+        return cached_method
+
+    def watch(self, target):
+        """Invalidates on committed writes of target, a Session, sessionmaker or the Session class."""
+        if not event.contains(target, "after_flush", self._after_flush):
+            event.listen(target, "after_flush", self._after_flush)
+            event.listen(target, "do_orm_execute", self._do_orm_execute)
+            event.listen(target, "after_commit", self._after_commit)
+            event.listen(target, "after_rollback", self._after_rollback)
+            # Writes made before the session was watched are unknown, treat
+            # them as touching every table until the transaction ends
+            if isinstance(target, Session) and uncommitted_writes(target):
+                self._written(target, set().union(*QUERY_TABLES.values()))
+
+    def _written(self, session, tables):
+        if tables:
+            with self.lock:
+                self.pending.setdefault(session, set()).update(tables)
+
+    def _after_flush(self, session, flush_context):
+        self._written(session, flushed_tables(session))
+
+    def _do_orm_execute(self, orm_execute_state):
+        self._written(orm_execute_state.session, statement_tables(orm_execute_state))
+
+    def _after_commit(self, session):
+        with self.lock:
+            tables = self.pending.pop(session, None)
+        if tables:
+            self.invalidate(tables)
+
+    def _after_rollback(self, session):
+        with self.lock:
+            self.pending.pop(session, None)
+
+    def _sees_own_writes(self, session, name):
+        with self.lock:
+            return bool(self.pending.get(session, set()) & QUERY_TABLES[name])
+
+    def call(self, session, name, *args, **kwargs):
+        """Returns the cached result of Queries.<name>(session, *args, **kwargs), computing it on a miss."""
+        self.watch(session)
+        if self._sees_own_writes(session, name):
+            return getattr(self.queries, name)(session, *args, **kwargs)
+        key = (name, self.queries.materialized, args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at is None or now < expires_at:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+            generation = self.generation
+
+        result = getattr(self.queries, name)(session, *args, **kwargs)
+
+        with self.lock:
+            # An autoflush during the query makes the result uncommitted
+            if generation != self.generation or self.pending.get(session, set()) & QUERY_TABLES[name]:
+                return result
+            self.entries[key] = (None if self.ttl is None else now + self.ttl, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def invalidate(self, tables=None):
+        """
+        Drops the cached results depending on any of tables, or everything.
+
+        Returns:
+            int: Number of entries dropped.
+        """
+        with self.lock:
+            if tables is None:
+                stale = list(self.entries)
+            else:
+                tables = set(tables)
+                stale = [key for key in self.entries if QUERY_TABLES[key[0]] & tables]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+            self.generation += 1
+        return len(stale)
+
+    def metrics(self):
+        """Hit/miss counters, the current size and the hit rate."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "size": len(self.entries),
+            }
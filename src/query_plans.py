@@ -0,0 +1,205 @@
+import contextlib
+import inspect
+import io
+from sqlalchemy import event, text
+from queries import Queries
+
+
+# Tables that grow with the catalog and its usage. The small dimension tables
+# (users, series) are expected as the outer loop of the per-group queries.
+LARGE_TABLES = ("medias", "reviews", "watchlists", "watchlist_media", "episodes", "casts")
+
+# Tables with fewer rows (per sqlite_stat1) are not checked, scanning them is cheap
+LARGE_TABLE_ROWS = 10000
+
+
+@contextlib.contextmanager
+def capture_statements(engine):
+    """Collects (statement, parameters) of everything executed on the engine."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextlib.contextmanager
+def assert_query_count(engine, expected):
+    """
+    Fails if the block runs more than expected SQL statements on the engine.
+
+    Usage:
+        with assert_query_count(engine, 3):
+            print_watchlist_media(session)
+
+    Raises:
+        AssertionError: Listing the executed statements when over the limit.
+    """
+    with capture_statements(engine) as statements:
+        yield statements
+    if len(statements) > expected:
+        executed = "\n".join(statement for statement, _ in statements)
+        raise AssertionError(f"Expected at most {expected} statements, got {len(statements)}:\n{executed}")
+
+
+def explain_query_plan(engine, statement, parameters=()):
+    """
+    Returns EXPLAIN QUERY PLAN of a SQL statement as (id, parent, detail)
+    rows, parent being the id of the enclosing step (0 at the top level).
+    """
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [(row[0], row[1], row[-1]) for row in rows]
+
+
+def _is_loop(detail):
+    return detail.startswith(("SCAN ", "SEARCH "))
+
+
+def full_table_scans(plan, large_tables=LARGE_TABLES):
+    """
+    Returns the plan details that read all of one of large_tables more than
+    needed.
+
+    A SCAN is flagged when it reads the table rows themselves, without an
+    index (SCAN x) or through one that does not cover the query (SCAN x
+    USING INDEX, a table lookup per entry), or when it repeats per row:
+    inside a correlated subquery or as an inner loop of a join (not the
+    first SCAN/SEARCH among its siblings). A single outer SCAN x USING
+    COVERING INDEX is how whole-table aggregations read their rows and is
+    accepted.
+
+    Parameters:
+    ----------
+    plan : list of tuple
+        (id, parent, detail) rows from explain_query_plan.
+    large_tables : tuple
+        The tables to check.
+    """
+    details = {step: detail for step, _, detail in plan}
+    parents = {step: parent for step, parent, _ in plan}
+    outer_loops = {}
+    for step, parent, detail in plan:
+        if _is_loop(detail):
+            outer_loops.setdefault(parent, step)
+
+    def correlated(step):
+        parent = parents.get(step, 0)
+        while parent:
+            if details.get(parent, "").startswith("CORRELATED"):
+                return True
+            parent = parents.get(parent, 0)
+        return False
+
+    scans = []
+    for step, parent, detail in plan:
+        words = detail.split()
+        if len(words) < 2 or words[0] != "SCAN" or words[1] not in large_tables:
+            continue
+        uncovered = "COVERING" not in words
+        inner_loop = outer_loops[parent] != step
+        if uncovered or inner_loop or correlated(step):
+            scans.append(detail)
+    return scans
+
+
+def table_row_estimates(engine):
+    """
+    Row counts per table from sqlite_stat1 (written by ANALYZE), None if
+    the database was never analyzed. Empty tables have no entry.
+    """
+    with engine.connect() as connection:
+        if connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).first() is None:
+            return None
+        estimates = {}
+        for table, stat in connection.exec_driver_sql("SELECT tbl, stat FROM sqlite_stat1"):
+            rows = int(stat.split()[0])
+            estimates[table] = max(rows, estimates.get(table, 0))
+        return estimates
+
+
+def large_tables_by_size(engine, large_tables=LARGE_TABLES, min_rows=LARGE_TABLE_ROWS):
+    """The tables of large_tables with at least min_rows rows, all of them without statistics."""
+    estimates = table_row_estimates(engine)
+    if estimates is None:
+        return tuple(large_tables)
+    return tuple(table for table in large_tables if estimates.get(table, 0) >= min_rows)
+
+
+def query_methods():
+    """Names of the Queries methods that only take a session."""
+    names = []
+    for name, method in inspect.getmembers(Queries, inspect.isfunction):
+        if name.startswith("_"):
+            continue
+        parameters = list(inspect.signature(method).parameters.values())[2:]
+        if all(parameter.default is not inspect.Parameter.empty for parameter in parameters):
+            names.append(name)
+    return names
+
+
+def check_query_plans(session, engine, large_tables=LARGE_TABLES, analyze=True,
+                      min_rows=LARGE_TABLE_ROWS, exempt=(), materialized=False):
+    """
+    Runs every Queries method under EXPLAIN QUERY PLAN and fails on full scans
+    (see full_table_scans) of the large tables that actually hold at least
+    min_rows rows.
+
+    Parameters:
+    ----------
+    session : Session
+        Session used to run the Queries methods.
+    engine : Engine
+        The engine the session is bound to.
+    large_tables : tuple
+        Tables checked for full scans.
+    analyze : bool
+        Run ANALYZE first so the planner and the size check see real table
+        statistics. Without statistics every table in large_tables is checked.
+    min_rows : int
+        Tables of large_tables with fewer rows in sqlite_stat1 are not checked.
+    exempt : iterable of str
+        Methods allowed to scan.
+    materialized : bool
+        Check Queries(materialized=True), which reads the agg_* tables.
+
+    Returns:
+    -------
+    dict
+        The query plan (id, parent, detail) of every executed statement per method.
+
+    Raises:
+    ------
+    AssertionError
+        If any method not in exempt scans one of the checked large tables.
+    """
+    if analyze:
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+
+    checked_tables = large_tables_by_size(engine, large_tables, min_rows)
+    queries = Queries(materialized)
+    plans = {}
+    violations = []
+    for name in query_methods():
+        with capture_statements(engine) as statements, contextlib.redirect_stdout(io.StringIO()):
+            getattr(queries, name)(session)
+        plans[name] = []
+        for statement, parameters in statements:
+            plan = explain_query_plan(engine, statement, parameters)
+            plans[name].append(plan)
+            if name in exempt:
+                continue
+            for scan in full_table_scans(plan, checked_tables):
+                violations.append(f"{name}: {scan}")
+
+    if violations:
+        raise AssertionError("Full table scans on large tables:\n" + "\n".join(violations))
+    return plans
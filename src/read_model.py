@@ -0,0 +1,140 @@
+from collections import namedtuple
+from sqlalchemy import func, select
+
+from classes import (
+    User,
+    Media,
+    Movie,
+    Series,
+    Review,
+    Watchlist,
+    Cast,
+    Actor,
+    Director,
+    Episode,
+    watchlist_media
+)
+from queries import STREAM_PAGE_SIZE
+
+
+# Read-only rows. Named tuples have no per-instance __dict__, no identity map
+# entry and no instance state, and expose the same attribute names as the
+# ORM classes, so the print_data listings work on either.
+UserRow = namedtuple("UserRow", "id username email user_type")
+MediaRow = namedtuple("MediaRow", "id title release_year rating genre media_type duration season_count")
+ReviewRow = namedtuple("ReviewRow", "id rating user_id media_id")
+WatchlistRow = namedtuple("WatchlistRow", "id user_id")
+CastRow = namedtuple("CastRow", "id description type movie_id series_id name")
+EpisodeRow = namedtuple("EpisodeRow", "id title episode_number series_id")
+WatchlistMediaRow = namedtuple("WatchlistMediaRow", "watchlist_id user_id media_id title")
+
+users = User.__table__
+medias = Media.__table__
+movies = Movie.__table__
+series = Series.__table__
+reviews = Review.__table__
+watchlists = Watchlist.__table__
+casts = Cast.__table__
+actors = Actor.__table__
+directors = Director.__table__
+episodes = Episode.__table__
+
+# name -> (row type, select, key column). Subclass columns come from outer
+# joins, so one statement per page covers the whole inheritance hierarchy.
+READ_MODELS = {
+    "users": (
+        UserRow,
+        select(users.c.id, users.c.username, users.c.email, users.c.user_type),
+        users.c.id,
+    ),
+    "media": (
+        MediaRow,
+        select(medias.c.id, medias.c.title, medias.c.release_year, medias.c.rating, medias.c.genre,
+               medias.c.media_type, movies.c.duration, series.c.season_count)
+        .select_from(medias)
+        .outerjoin(movies, movies.c.id == medias.c.id)
+        .outerjoin(series, series.c.id == medias.c.id),
+        medias.c.id,
+    ),
+    "reviews": (
+        ReviewRow,
+        select(reviews.c.id, reviews.c.rating, reviews.c.user_id, reviews.c.media_id),
+        reviews.c.id,
+    ),
+    "watchlists": (
+        WatchlistRow,
+        select(watchlists.c.id, watchlists.c.user_id),
+        watchlists.c.id,
+    ),
+    "cast": (
+        CastRow,
+        select(casts.c.id, casts.c.description, casts.c.type, casts.c.movie_id, casts.c.series_id,
+               func.coalesce(actors.c.name, directors.c.name).label("name"))
+        .select_from(casts)
+        .outerjoin(actors, actors.c.id == casts.c.id)
+        .outerjoin(directors, directors.c.id == casts.c.id),
+        casts.c.id,
+    ),
+    "episodes": (
+        EpisodeRow,
+        select(episodes.c.id, episodes.c.title, episodes.c.episode_number, episodes.c.series_id),
+        episodes.c.id,
+    ),
+}
+
+
+def iter_rows(session, name, page_size=STREAM_PAGE_SIZE):
+    """
+    Yields the READ_MODELS rows of name ordered by id, one page at a time.
+
+    Parameters:
+    ----------
+    session : Session
+        The session to query with.
+    name : str
+        One of 'users', 'media', 'reviews', 'watchlists', 'cast', 'episodes'.
+    page_size : int
+        Rows fetched per keyset page.
+    """
+    row_type, query, key = READ_MODELS[name]
+    query = query.order_by(key).limit(page_size)
+    last_key = None
+    while True:
+        page_query = query if last_key is None else query.where(key > last_key)
+        page = session.execute(page_query).all()
+        if not page:
+            return
+        for row in page:
+            yield row_type._make(row)
+        last_key = page[-1][0]
+
+
+def iter_watchlist_media(session, page_size=STREAM_PAGE_SIZE):
+    """
+    Yields one WatchlistMediaRow per watchlist entry, ordered by watchlist and
+    media id. Watchlists without media yield one row with media_id None.
+    """
+    # Empty watchlists have a NULL media id, sorted and compared as 0
+    media_key = func.coalesce(medias.c.id, 0)
+    query = select(
+        watchlists.c.id, watchlists.c.user_id, medias.c.id, medias.c.title
+    ).select_from(watchlists) \
+    .outerjoin(watchlist_media, watchlist_media.c.watchlists_id == watchlists.c.id) \
+    .outerjoin(medias, medias.c.id == watchlist_media.c.medias_id) \
+    .order_by(watchlists.c.id, media_key) \
+    .limit(page_size)
+    last_key = None
+    while True:
+        page_query = query
+        if last_key is not None:
+            last_watchlist, last_media = last_key
+            page_query = query.where(
+                (watchlists.c.id > last_watchlist)
+                | ((watchlists.c.id == last_watchlist) & (media_key > (last_media or 0)))
+            )
+        page = session.execute(page_query).all()
+        if not page:
+            return
+        for row in page:
+            yield WatchlistMediaRow._make(row)
+        last_key = (page[-1][0], page[-1][2])
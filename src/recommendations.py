@@ -0,0 +1,224 @@
+import math
+import time
+
+from utils import NEO4J_BATCH_SIZE, neo4j_lookup_batches, neo4j_write_batches
+
+
+# Weighted (m:Media)-[:SIMILAR_TO {score, watchlist, cast, run_id}]->(o:Media)
+# edges are precomputed by build_similarities from two signals:
+#   watchlist: users who watchlisted m also watchlisted o, shared users / sqrt(users of m * users of o)
+#   cast: people credited on both, shared people / sqrt(credits of m * credits of o)
+# Both lie in [0, 1]; score is their weighted sum. Only the top_k edges per
+# media are kept so a lookup reads at most top_k relationships of one node.
+# Movies and series need the :Media label, which both graph_sync.sync_to_neo4j
+# and utils.neo4j_add_relation_actor_movie_director give them.
+
+SIMILARITY_TOP_K = 20
+SIMILARITY_CHUNK_SIZE = 500
+WATCHLIST_WEIGHT = 0.7
+CAST_WEIGHT = 0.3
+
+MEDIA_IDS_QUERY = """
+MATCH (m:Media)
+RETURN m.id AS id
+ORDER BY id
+"""
+
+CO_WATCHLIST_BATCH_QUERY = """
+UNWIND $ids AS media_id
+MATCH (m:Media {id: media_id})
+WITH media_id, m, size([(m)<-[:WATCHLIST]-(:User) | 1]) AS degree
+MATCH (m)<-[:WATCHLIST]-(:User)-[:WATCHLIST]->(other:Media)
+WHERE other <> m
+WITH media_id, degree, other, count(*) AS shared
+RETURN media_id AS id, collect({
+    media_id: other.id, shared: shared, degree: degree,
+    other_degree: size([(other)<-[:WATCHLIST]-(:User) | 1])
+}) AS rows
+"""
+
+# Cast nodes are one per credit, the same person is matched by name; both
+# degrees count distinct names, like shared does, so a person credited twice
+# on one media (e.g. as actor and director) counts once
+SHARED_CAST_BATCH_QUERY = """
+UNWIND $ids AS media_id
+MATCH (m:Media {id: media_id})<-[:ACTED_IN|DIRECTED]-(credit)
+WITH media_id, m, collect(DISTINCT credit.name) AS names
+UNWIND names AS name
+CALL {
+    WITH name
+    MATCH (:Actor {name: name})-[:ACTED_IN]->(other:Media)
+    RETURN other
+    UNION
+    WITH name
+    MATCH (:Director {name: name})-[:DIRECTED]->(other:Media)
+    RETURN other
+}
+WITH media_id, m, size(names) AS degree, other, count(DISTINCT name) AS shared
+WHERE other <> m
+CALL {
+    WITH other
+    MATCH (other)<-[:ACTED_IN|DIRECTED]-(other_credit)
+    RETURN count(DISTINCT other_credit.name) AS other_degree
+}
+RETURN media_id AS id, collect({
+    media_id: other.id, shared: shared, degree: degree, other_degree: other_degree
+}) AS rows
+"""
+
+MERGE_SIMILAR_QUERY = """
+UNWIND $rows AS row
+MATCH (m:Media {id: row.media_id}), (o:Media {id: row.other_id})
+MERGE (m)-[s:SIMILAR_TO]->(o)
+SET s.score = row.score, s.watchlist = row.watchlist, s.cast = row.cast, s.run_id = row.run_id
+"""
+
+# Drops the edges of a media that the current run did not write again
+PRUNE_SIMILAR_QUERY = """
+UNWIND $rows AS row
+MATCH (:Media {id: row.media_id})-[s:SIMILAR_TO]->()
+WHERE s.run_id <> row.run_id
+DELETE s
+"""
+
+SIMILAR_MEDIA_QUERY = """
+MATCH (:Media {id: $media_id})-[s:SIMILAR_TO]->(o:Media)
+RETURN o.id AS MediaID, o.title AS Title, s.score AS Score
+ORDER BY Score DESC, MediaID
+LIMIT $limit
+"""
+
+SIMILAR_MEDIA_BATCH_QUERY = """
+UNWIND $ids AS media_id
+MATCH (:Media {id: media_id})-[s:SIMILAR_TO]->(o:Media)
+WITH media_id, s, o
+ORDER BY s.score DESC, o.id
+RETURN media_id AS id, collect({MediaID: o.id, Title: o.title, Score: s.score}) AS rows
+"""
+
+RECOMMEND_FOR_USER_QUERY = """
+MATCH (u:User {user_id: $user_id})-[:WATCHLIST]->(:Media)-[s:SIMILAR_TO]->(o:Media)
+WHERE NOT (u)-[:WATCHLIST]->(o)
+RETURN o.id AS MediaID, o.title AS Title, sum(s.score) AS Score
+ORDER BY Score DESC, MediaID
+LIMIT $limit
+"""
+
+
+def _cosine(row):
+    return row["shared"] / math.sqrt(row["degree"] * row["other_degree"])
+
+
+def score_similarities(watchlist_rows, cast_rows, top_k=SIMILARITY_TOP_K,
+                       watchlist_weight=WATCHLIST_WEIGHT, cast_weight=CAST_WEIGHT):
+    """
+    Combines the signal rows of one media into its top_k neighbours.
+
+    Args:
+        watchlist_rows (list of dict): Rows of CO_WATCHLIST_BATCH_QUERY.
+        cast_rows (list of dict): Rows of SHARED_CAST_BATCH_QUERY.
+        top_k (int): Number of neighbours kept.
+        watchlist_weight (float): Weight of the co-watchlist similarity.
+        cast_weight (float): Weight of the shared cast similarity.
+
+    Returns:
+        list of dict: other_id, score, watchlist and cast, highest score first.
+    """
+    neighbours = {}
+    for signal, rows in (("watchlist", watchlist_rows), ("cast", cast_rows)):
+        for row in rows:
+            entry = neighbours.setdefault(row["media_id"], {"other_id": row["media_id"], "watchlist": 0.0, "cast": 0.0})
+            entry[signal] = _cosine(row)
+    for entry in neighbours.values():
+        entry["score"] = watchlist_weight * entry["watchlist"] + cast_weight * entry["cast"]
+    ranked = sorted(neighbours.values(), key=lambda entry: (-entry["score"], entry["other_id"]))
+    return ranked[:top_k]
+
+
+def build_similarities(driver, media_ids=None, top_k=SIMILARITY_TOP_K, chunk_size=SIMILARITY_CHUNK_SIZE,
+                       watchlist_weight=WATCHLIST_WEIGHT, cast_weight=CAST_WEIGHT, batch_size=NEO4J_BATCH_SIZE):
+    """
+    Precomputes the SIMILAR_TO edges of every media (or of media_ids).
+
+    Media are processed chunk by chunk: both signals are read with one
+    batched query each, scored in Python, merged and the edges of the
+    chunk that were not rewritten are pruned. Edges are replaced in place,
+    so lookups keep returning the previous neighbours until the new ones
+    are written. Safe to rerun, e.g. after sync_to_neo4j.
+
+    Args:
+        driver (neo4j.Driver): The Neo4j driver object.
+        media_ids (iterable of int): Media to recompute, all :Media nodes by default.
+        top_k (int): Neighbours kept per media.
+        chunk_size (int): Media per signal query.
+        watchlist_weight (float): Weight of the co-watchlist similarity.
+        cast_weight (float): Weight of the shared cast similarity.
+        batch_size (int): Rows per write transaction.
+
+    Returns:
+        dict: Number of 'media' processed and SIMILAR_TO 'edges' written.
+    """
+    start = time.perf_counter()
+    run_id = time.time_ns()
+    with driver.session() as session:
+        if media_ids is None:
+            media_ids = [record["id"] for record in session.run(MEDIA_IDS_QUERY)]
+        media_ids = list(dict.fromkeys(media_ids))
+
+        edges = 0
+        for chunk_start in range(0, len(media_ids), chunk_size):
+            chunk = media_ids[chunk_start:chunk_start + chunk_size]
+            watchlist = neo4j_lookup_batches(driver, CO_WATCHLIST_BATCH_QUERY, chunk, chunk_size, session)
+            cast = neo4j_lookup_batches(driver, SHARED_CAST_BATCH_QUERY, chunk, chunk_size, session)
+            rows = []
+            for media_id in chunk:
+                for entry in score_similarities(watchlist[media_id], cast[media_id], top_k,
+                                                watchlist_weight, cast_weight):
+                    rows.append({**entry, "media_id": media_id, "run_id": run_id})
+            edges += neo4j_write_batches(driver, MERGE_SIMILAR_QUERY, rows, batch_size)
+            neo4j_write_batches(driver, PRUNE_SIMILAR_QUERY,
+                                ({"media_id": media_id, "run_id": run_id} for media_id in chunk), batch_size)
+
+    elapsed = time.perf_counter() - start
+    print(f"Computed {edges} SIMILAR_TO edges for {len(media_ids)} media in {elapsed:.2f}s")
+    return {"media": len(media_ids), "edges": edges}
+
+
+def find_similar_media(driver, media_id, limit=10):
+    """
+    The precomputed neighbours of one media, a single one-hop read.
+
+    Returns:
+        list of dict: [{'MediaID', 'Title', 'Score'}, ...] highest score first.
+    """
+    with driver.session() as session:
+        records = session.run(SIMILAR_MEDIA_QUERY, media_id=media_id, limit=limit).data()
+    for record in records:
+        print(f"Media: {record['Title']}, Score: {record['Score']:.3f}")
+    return records
+
+
+def find_similar_media_batch(driver, media_ids, limit=10, session=None):
+    """
+    Batched find_similar_media: one UNWIND query per chunk of media ids.
+
+    Returns:
+        dict: media_id -> [{'MediaID', 'Title', 'Score'}, ...]
+    """
+    results = neo4j_lookup_batches(driver, SIMILAR_MEDIA_BATCH_QUERY, media_ids, session=session)
+    return {media_id: rows[:limit] for media_id, rows in results.items()}
+
+
+def recommend_for_user(driver, user_id, limit=10):
+    """
+    Media similar to those on a user's watchlist that are not on it yet,
+    scored by the sum of their SIMILAR_TO scores.
+
+    Returns:
+        list of dict: [{'MediaID', 'Title', 'Score'}, ...] highest score first.
+    """
+    with driver.session() as session:
+        records = session.run(RECOMMEND_FOR_USER_QUERY, user_id=user_id, limit=limit).data()
+    for record in records:
+        print(f"Media: {record['Title']}, Score: {record['Score']:.3f}")
+    return records
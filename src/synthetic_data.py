@@ -0,0 +1,241 @@
+import json
+import random
+from datetime import date, timedelta
+from sqlalchemy import insert
+from classes import (
+    SubscriptionType,
+    UserType,
+    User,
+    MainUser,
+    OtherUser,
+    Subscription,
+    Watchlist,
+    Review,
+    watchlist_media
+)
+from populate_data import BULK_BATCH_SIZE, batched, bulk_load_catalog
+
+
+# Scale factors per named size, roughly the total number of rows written
+SCALES = {
+    "10k": {
+        "users": 500,
+        "media": 1000,
+        "episodes_per_series": 5,
+        "reviews_per_user": 5,
+        "watchlist_size": 5,
+        "cast_per_title": 2,
+    },
+    "1m": {
+        "users": 50000,
+        "media": 100000,
+        "episodes_per_series": 5,
+        "reviews_per_user": 5,
+        "watchlist_size": 5,
+        "cast_per_title": 2,
+    },
+    "10m": {
+        "users": 500000,
+        "media": 1000000,
+        "episodes_per_series": 5,
+        "reviews_per_user": 5,
+        "watchlist_size": 5,
+        "cast_per_title": 2,
+    },
+}
+
+GENRES = ["Action", "Comedy", "Crime", "Documentary", "Drama", "Fantasy", "Horror", "Romance", "Sci-Fi", "Thriller"]
+SERIES_SHARE = 0.3
+MAIN_USER_SHARE = 0.5
+SUBSCRIPTION_PRICES = {
+    SubscriptionType.MONTHLY: 9.99,
+    SubscriptionType.YEARLY: 99.99,
+    SubscriptionType.TEST: 0.0,
+}
+
+
+def resolve_scale(scale):
+    """Accepts a name from SCALES or a dict of scale factors."""
+    if isinstance(scale, str):
+        return SCALES[scale]
+    return {**SCALES["10k"], **scale}
+
+
+def expected_rows(scale):
+    """Approximate number of rows populate_synthetic writes for a scale."""
+    factors = resolve_scale(scale)
+    series_count = int(factors["media"] * SERIES_SHARE)
+    main_users = int(factors["users"] * MAIN_USER_SHARE)
+    return (
+        2 * factors["users"] + main_users                    # users, subclass rows, subscriptions
+        + 2 * factors["media"]                               # medias + movies/series
+        + series_count * factors["episodes_per_series"]
+        + 2 * factors["media"] * factors["cast_per_title"]   # casts + actors/directors
+        + factors["users"] * factors["reviews_per_user"]
+        + main_users * (1 + factors["watchlist_size"])       # watchlists + entries
+    )
+
+
+def generate_catalog(scale, seed=42):
+    """
+    Yields (kind, record) pairs for movies, series, episodes and cast.
+
+    Deterministic for a given scale and seed. Media ids run from 1 to
+    scale['media'], the first SERIES_SHARE of them being series.
+    """
+    factors = resolve_scale(scale)
+    rng = random.Random(seed)
+    series_count = int(factors["media"] * SERIES_SHARE)
+    for media_id in range(1, factors["media"] + 1):
+        record = {
+            "id": media_id,
+            "title": f"Title {media_id}",
+            "release_year": rng.randint(1950, 2024),
+            "rating": round(rng.uniform(1.0, 10.0), 1),
+            "genre": rng.choice(GENRES),
+        }
+        is_series = media_id <= series_count
+        if is_series:
+            yield "series", {**record, "season_count": rng.randint(1, 10)}
+        else:
+            yield "movie", {**record, "duration": rng.randint(70, 200)}
+
+        foreign_key = "series_id" if is_series else "movie_id"
+        yield "director", {
+            "name": f"Director {rng.randint(1, factors['media'] // 5 + 1)}",
+            "description": f"Director of Title {media_id}",
+            foreign_key: media_id,
+        }
+        for _ in range(factors["cast_per_title"] - 1):
+            yield "actor", {
+                "name": f"Actor {rng.randint(1, factors['media'] + 1)}",
+                "description": f"Actor in Title {media_id}",
+                foreign_key: media_id,
+            }
+        if is_series:
+            for episode_number in range(1, factors["episodes_per_series"] + 1):
+                yield "episode", {
+                    "title": f"Title {media_id} Episode {episode_number}",
+                    "episode_number": episode_number,
+                    "series_id": media_id,
+                }
+
+
+def write_catalog_jsonl(filename, scale, seed=42):
+    """Writes generate_catalog as a JSONL file readable by bulk_load_catalog."""
+    with open(filename, "w") as jsonl_file:
+        for kind, record in generate_catalog(scale, seed):
+            jsonl_file.write(json.dumps({"kind": kind, **record}) + "\n")
+
+
+def generate_users(scale, seed=42):
+    """
+    Yields (user, subscription) pairs, subscription being None for other users.
+
+    User ids run from 1 to scale['users']; the first MAIN_USER_SHARE are main users.
+    """
+    factors = resolve_scale(scale)
+    rng = random.Random(seed + 1)
+    main_users = int(factors["users"] * MAIN_USER_SHARE)
+    for user_id in range(1, factors["users"] + 1):
+        user = {
+            "id": user_id,
+            "username": f"user_{user_id}",
+            "email": f"user_{user_id}@example.com",
+            "user_type": UserType.MAIN_USER if user_id <= main_users else UserType.OTHER_USER,
+        }
+        subscription = None
+        if user_id <= main_users:
+            subscription_type = rng.choice(list(SubscriptionType))
+            start = date(2020, 1, 1) + timedelta(days=rng.randint(0, 1500))
+            subscription = {
+                "iban": f"DE{rng.randint(10**19, 10**20 - 1)}",
+                "price": SUBSCRIPTION_PRICES[subscription_type],
+                "subscription_type": subscription_type,
+                "startdate": start,
+                "enddate": start + timedelta(days=365),
+                "main_user_id": user_id,
+            }
+        yield user, subscription
+
+
+def generate_reviews(scale, seed=42):
+    """Yields review rows, reviews_per_user for every user."""
+    factors = resolve_scale(scale)
+    rng = random.Random(seed + 2)
+    for user_id in range(1, factors["users"] + 1):
+        for _ in range(factors["reviews_per_user"]):
+            yield {
+                "rating": round(rng.uniform(1.0, 10.0), 1),
+                "user_id": user_id,
+                "media_id": rng.randint(1, factors["media"]),
+            }
+
+
+def generate_watchlist_entries(scale, seed=42):
+    """Yields (watchlist, entries) for every main user, one watchlist each."""
+    factors = resolve_scale(scale)
+    rng = random.Random(seed + 3)
+    main_users = int(factors["users"] * MAIN_USER_SHARE)
+    size = min(factors["watchlist_size"], factors["media"])
+    for user_id in range(1, main_users + 1):
+        watchlist = {"id": user_id, "user_id": user_id}
+        media_ids = rng.sample(range(1, factors["media"] + 1), size)
+        entries = [{"watchlists_id": user_id, "medias_id": media_id} for media_id in media_ids]
+        yield watchlist, entries
+
+
+def _insert_batches(session, table, rows, batch_size):
+    for batch in batched(rows, batch_size):
+        session.execute(insert(table), batch)
+        session.commit()
+
+
+def populate_synthetic(session, scale, catalog_file, seed=42, batch_size=BULK_BATCH_SIZE):
+    """
+    Fills an empty database with deterministic synthetic data for the whole schema.
+
+    The catalog goes through catalog_file (JSONL) and bulk_load_catalog, users,
+    subscriptions, watchlists and reviews are written with Core executemany.
+
+    Parameters:
+    ----------
+    session : Session
+        Session on an empty database.
+    scale : str or dict
+        A name from SCALES or a dict overriding the scale factors.
+    catalog_file : str
+        Path of the intermediate JSONL catalog file.
+    seed : int
+        Seed of the generators, same seed gives the same data.
+    batch_size : int
+        Rows per executemany batch.
+    """
+    write_catalog_jsonl(catalog_file, scale, seed)
+    bulk_load_catalog(session, catalog_file, batch_size)
+
+    users = []
+    main_users = []
+    other_users = []
+    subscriptions = []
+    for user, subscription in generate_users(scale, seed):
+        users.append(user)
+        if subscription is None:
+            other_users.append({"id": user["id"]})
+        else:
+            main_users.append({"id": user["id"]})
+            subscriptions.append(subscription)
+    _insert_batches(session, User.__table__, users, batch_size)
+    _insert_batches(session, MainUser.__table__, main_users, batch_size)
+    _insert_batches(session, OtherUser.__table__, other_users, batch_size)
+    _insert_batches(session, Subscription.__table__, subscriptions, batch_size)
+
+    watchlists = []
+    entries = []
+    for watchlist, watchlist_entries in generate_watchlist_entries(scale, seed):
+        watchlists.append(watchlist)
+        entries.extend(watchlist_entries)
+    _insert_batches(session, Watchlist.__table__, watchlists, batch_size)
+    _insert_batches(session, watchlist_media, entries, batch_size)
+
+    _insert_batches(session, Review.__table__, generate_reviews(scale, seed), batch_size)
@@ -1,14 +1,96 @@
-from sqlalchemy import create_engine, inspect, MetaData
+from sqlalchemy import create_engine, event, inspect, MetaData
 from sqlalchemy.orm import sessionmaker
+import os
+import shutil
 import sqlite3
 import time
 from neo4j import GraphDatabase
 
 
 from classes import Base
+from aggregates import _transaction, ensure_aggregates, install_aggregate_triggers
+from change_log import change_capture_installed, install_change_capture
+from instrumentation import CountingConnection, instrument_engine
+
+
+# Connect-time pragmas and pool settings per workload
+ENGINE_PROFILES = {
+    "default": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,
+        },
+        "pool": {},
+    },
+    "bulk_load": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "OFF",
+            "cache_size": -262144,      # 256 MiB
+            "mmap_size": 268435456,     # 256 MiB
+            "temp_store": "MEMORY",
+            "busy_timeout": 30000,
+        },
+        # One pooled writer connection; overflow covers the short-lived second
+        # connections of backups, exports and EXPLAIN while a session is open
+        "pool": {"pool_size": 1, "max_overflow": 4},
+    },
+    "read_heavy": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -65536,       # 64 MiB per connection
+            "mmap_size": 1073741824,    # 1 GiB
+            "temp_store": "MEMORY",
+            "busy_timeout": 10000,
+        },
+        "pool": {"pool_size": 10, "max_overflow": 20, "pool_pre_ping": True},
+    },
+}
+
+
+def apply_pragmas(engine, pragmas):
+    """
+    Registers a connect listener that applies the given pragmas to every new
+    DBAPI connection of the engine.
+    """
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_tuned_engine(database_name:str, profile:str="default", connect_args=None):
+    """
+    Creates a SQLAlchemy engine for a SQLite file using one of ENGINE_PROFILES.
 
+    Parameters:
+    ----------
+    database_name : str
+        The name of the SQLite database file (e.g., 'example.db').
+    profile : str
+        Name of the profile in ENGINE_PROFILES ('default', 'bulk_load', 'read_heavy').
+    connect_args : dict, optional
+        Passed through to sqlite3.connect.
 
-def setup(database_name:str):
+    Returns:
+    -------
+    engine : Engine
+        The configured engine.
+    """
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown engine profile '{profile}', expected one of {list(ENGINE_PROFILES)}")
+    settings = ENGINE_PROFILES[profile]
+    engine = create_engine(f'sqlite:///{database_name}', connect_args=connect_args or {}, **settings["pool"])
+    apply_pragmas(engine, settings["pragmas"])
+    return engine
+
+
+def setup(database_name:str, profile:str="default", stats=None, change_capture=False):
     '''
     Initializes a SQLite database and returns a session to interact with it.
 
@@ -16,22 +98,55 @@ def setup(database_name:str):
     ----------
     database_name : str
         The name of the SQLite database file (e.g., 'example.db').
+    profile : str
+        Engine profile from ENGINE_PROFILES ('default', 'bulk_load', 'read_heavy').
+    stats : QueryStats, optional
+        When given, every statement on the engine is timed and counted into it
+        (see instrumentation.py).
+    change_capture : bool
+        Install the triggers that record every write into change_log (see
+        change_log.py), needed by graph_sync. Off by default, and best left
+        off for bulk loads since each captured write costs an extra insert.
     
     Returns:
     -------
     session : Session
         A session object that allows interaction with the database.
     '''
-    sqlite3.connect(f'{database_name}')
-    engine = create_engine(f'sqlite:///{database_name}')
+    if stats is not None:
+        engine = create_tuned_engine(database_name, profile, {"factory": CountingConnection})
+        instrument_engine(engine, stats)
+    else:
+        engine = create_tuned_engine(database_name, profile)
+    existing_tables = inspect(engine).get_table_names()
     Base.metadata.create_all(engine)
+    ensure_indexes(engine)
+    # Backfills the agg_* tables when they (or their triggers) are new
+    ensure_aggregates(engine, existing_tables)
+    if change_capture:
+        install_change_capture(engine)
     Session = sessionmaker(bind=engine)
     session = Session()
     return session, engine
 
+def ensure_indexes(bind):
+    """
+    Creates the non-unique indexes that are missing on existing tables,
+    create_all only adds indexes together with a new table. Unique indexes
+    can fail on existing data, see populate_data.ensure_natural_keys.
+
+    bind is an Engine or a Connection, e.g. inside AsyncConnection.run_sync.
+    """
+    with _transaction(bind) as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if not index.unique:
+                    index.create(connection, checkfirst=True)
+
 def drop_all_tables(engine):
     """
     Drops all tables in the provided SQLAlchemy engine and verifies deletion.
+    To only empty the database use the much faster reset_database.
     
     Parameters:
     - engine: SQLAlchemy engine instance connected to the target database.
@@ -54,7 +169,237 @@ def drop_all_tables(engine):
         return f"Some tables still exist: {tables}"
 
 
-def neo4j_init(uri): # DONE
+# Fast reset from a template database
+
+TEMPLATE_SUFFIX = ".template"
+RESET_MODES = ("backup", "copy", "truncate")
+
+
+def create_template(database_name:str, template_name:str=None, seed=None):
+    """
+    Builds a pristine template database to reset database_name from.
+
+    Parameters:
+    ----------
+    database_name : str
+        The database the template is for.
+    template_name : str, optional
+        Path of the template, database_name + TEMPLATE_SUFFIX by default.
+    seed : callable, optional
+        Called with a session on the template to load seed data.
+
+    Returns:
+    -------
+    str
+        The template path.
+    """
+    template_name = template_name or database_name + TEMPLATE_SUFFIX
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(template_name + suffix):
+            os.remove(template_name + suffix)
+    session, engine = setup(template_name)
+    if seed is not None:
+        seed(session)
+        session.commit()
+    session.close()
+    # Fold the WAL into the main file so the template is a single file to copy
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.exec_driver_sql("PRAGMA journal_mode=DELETE")
+    engine.dispose()
+    return template_name
+
+
+def truncate_tables(engine):
+    """
+    Deletes all rows of the Base.metadata tables, children before parents.
+
+    The aggregate and change capture triggers are dropped first, so every
+    DELETE takes SQLite's truncate fast path instead of firing per row, and
+    are then reinstalled, change capture only if it was installed. The
+    change log is emptied as well.
+    """
+    change_capture = change_capture_installed(engine)
+    with engine.begin() as connection:
+        triggers = connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        ).scalars().all()
+        for trigger in triggers:
+            connection.exec_driver_sql(f'DROP TRIGGER "{trigger}"')
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.exec_driver_sql(f'DELETE FROM "{table.name}"')
+    install_aggregate_triggers(engine)
+    if change_capture:
+        install_change_capture(engine)
+
+
+def verify_schema(engine):
+    """
+    Compares the database against Base.metadata using sqlite_master and
+    PRAGMA table_info only, instead of reflecting every table.
+
+    Returns:
+    -------
+    list of str
+        The problems found (missing tables, columns or indexes), empty if none.
+    """
+    problems = []
+    with engine.connect() as connection:
+        existing = dict(connection.exec_driver_sql(
+            "SELECT name, type FROM sqlite_master WHERE type IN ('table', 'index')"
+        ).all())
+        for table in Base.metadata.sorted_tables:
+            if existing.get(table.name) != "table":
+                problems.append(f"missing table {table.name}")
+                continue
+            columns = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+            problems.extend(
+                f"missing column {table.name}.{column.name}"
+                for column in table.columns if column.name not in columns
+            )
+            problems.extend(
+                f"missing index {index.name}"
+                for index in table.indexes if existing.get(index.name) != "index"
+            )
+    return problems
+
+
+def reset_database(engine, mode:str="backup", template_name:str=None):
+    """
+    Empties the database of engine much faster than drop_all_tables + setup.
+
+    Parameters:
+    ----------
+    engine : Engine
+        Engine of the SQLite database to reset.
+    mode : str
+        'backup' copies the template in with SQLite's online backup API while
+        the engine stays usable; 'copy' replaces the database file with the
+        template (all sessions of the engine must be closed, its pool is
+        disposed); 'truncate' keeps the schema and deletes all rows.
+    template_name : str, optional
+        Template to restore from, created empty by create_template if it
+        does not exist yet. Not used by 'truncate'.
+
+    Change capture (change_log.install_change_capture) stays installed if
+    it was before the reset, whatever the template has.
+
+    Returns:
+    -------
+    float
+        Seconds the reset took.
+    """
+    if mode not in RESET_MODES:
+        raise ValueError(f"Unknown reset mode '{mode}', expected one of {list(RESET_MODES)}")
+    start = time.perf_counter()
+    database_name = engine.url.database
+    change_capture = change_capture_installed(engine)
+    if mode != "truncate":
+        template_name = template_name or database_name + TEMPLATE_SUFFIX
+        if not os.path.exists(template_name):
+            create_template(database_name, template_name)
+
+    if mode == "backup":
+        template = sqlite3.connect(template_name)
+        connection = engine.raw_connection()
+        try:
+            template.backup(connection.driver_connection)
+        finally:
+            connection.close()
+            template.close()
+    elif mode == "copy":
+        engine.dispose()
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(database_name + suffix):
+                os.remove(database_name + suffix)
+        shutil.copyfile(template_name, database_name)
+    else:
+        truncate_tables(engine)
+    if change_capture and mode != "truncate":
+        install_change_capture(engine)
+
+    problems = verify_schema(engine)
+    if problems:
+        raise RuntimeError(f"Schema of {database_name} does not match Base.metadata after reset: {problems}")
+    return time.perf_counter() - start
+
+
+# Uniqueness constraints and indexes backing the MERGE/MATCH lookups
+# (kind, name, label, properties)
+NEO4J_SCHEMA = [
+    ("CONSTRAINT", "user_user_id", "User", ("user_id",)),
+    ("CONSTRAINT", "media_id", "Media", ("id",)),
+    ("CONSTRAINT", "movie_id", "Movie", ("id",)),
+    ("CONSTRAINT", "series_id", "Series", ("id",)),
+    ("CONSTRAINT", "review_review_id", "Review", ("review_id",)),
+    ("CONSTRAINT", "watchlist_watch_id", "Watchlist", ("watch_id",)),
+    ("CONSTRAINT", "actor_cast_id", "Actor", ("cast_id",)),
+    ("CONSTRAINT", "director_cast_id", "Director", ("cast_id",)),
+    ("INDEX", "actor_movie_id", "Actor", ("movie_id",)),
+    ("INDEX", "director_movie_id", "Director", ("movie_id",)),
+    # Shared cast lookups of recommendations.py match people by name only
+    ("INDEX", "actor_name", "Actor", ("name",)),
+    ("INDEX", "director_name", "Director", ("name",)),
+]
+
+
+def neo4j_schema_statement(kind, name, label, properties):
+    """Builds the idempotent CREATE statement for one NEO4J_SCHEMA entry."""
+    if kind == "CONSTRAINT":
+        if len(properties) == 1:
+            target = f"n.{properties[0]}"
+        else:
+            target = "(" + ", ".join(f"n.{prop}" for prop in properties) + ")"
+        return f"CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:{label}) REQUIRE {target} IS UNIQUE"
+    columns = ", ".join(f"n.{prop}" for prop in properties)
+    return f"CREATE INDEX {name} IF NOT EXISTS FOR (n:{label}) ON ({columns})"
+
+
+def neo4j_bootstrap_schema(driver):
+    """
+    Creates the constraints and indexes from NEO4J_SCHEMA. Safe to run repeatedly.
+
+    A statement that fails, e.g. a uniqueness constraint on data that already
+    has duplicates (left by the old CREATE based writes), is reported with
+    its error and the remaining entries are still created.
+
+    Args:
+        driver (neo4j.Driver): The Neo4j driver object.
+
+    Returns:
+        list: (statement, error) for every entry that could not be created.
+    """
+    failed = []
+    with driver.session() as session:
+        for entry in NEO4J_SCHEMA:
+            statement = neo4j_schema_statement(*entry)
+            try:
+                session.run(statement).consume()
+            except Exception as e:
+                failed.append((statement, e))
+                print(f"Failed to create Neo4j {entry[0].lower()} {entry[1]}: {e}\n    {statement}")
+    created = len(NEO4J_SCHEMA) - len(failed)
+    print(f"Neo4j schema bootstrapped ({created} of {len(NEO4J_SCHEMA)} constraints and indexes).")
+    return failed
+
+
+def neo4j_missing_schema(driver):
+    """
+    Lists the NEO4J_SCHEMA entries that do not exist in the database.
+
+    Args:
+        driver (neo4j.Driver): The Neo4j driver object.
+
+    Returns:
+        list: The missing (kind, name, label, properties) entries.
+    """
+    with driver.session() as session:
+        existing = {record["name"] for record in session.run("SHOW CONSTRAINTS YIELD name")}
+        existing |= {record["name"] for record in session.run("SHOW INDEXES YIELD name")}
+    return [entry for entry in NEO4J_SCHEMA if entry[1] not in existing]
+
+
+def neo4j_init(uri, bootstrap_schema=True): # DONE
     """
     Initializes a connection to the Neo4j database.
 
@@ -62,9 +407,12 @@ def neo4j_init(uri): # DONE
         uri (str): The URI of the Neo4j instance (default is "bolt://localhost:7687").
         user (str): The username for the Neo4j database (default is "neo4j").
         password (str): The password for the Neo4j database (default is "password").
+        bootstrap_schema (bool): Create the constraints and indexes from NEO4J_SCHEMA.
+            Entries that fail are reported by neo4j_bootstrap_schema, the
+            driver is returned regardless.
 
     Returns:
-        driver (neo4j.Driver): The Neo4j driver object.
+        driver (neo4j.Driver): The Neo4j driver object, None if the connection failed.
     """
     try:
         # Create the driver
@@ -73,124 +421,198 @@ def neo4j_init(uri): # DONE
         # Test the connection
         with driver.session() as session:
             session.run("RETURN 'Neo4j connection successful!' AS message")
-        
-        print("Neo4j connection initialized successfully.")
-        return driver
     except Exception as e:
         print(f"Failed to initialize Neo4j connection: {e}")
         return None
 
-def neo4j_add_relation_user_review_movie(driver):
+    print("Neo4j connection initialized successfully.")
+    if bootstrap_schema:
+        neo4j_bootstrap_schema(driver)
+    return driver
+
+# Batched, parameterized Cypher writes
+
+NEO4J_BATCH_SIZE = 1000
+
+MERGE_USERS_QUERY = """
+UNWIND $rows AS row
+MERGE (u:User {user_id: row.user_id})
+SET u.name = row.name, u.email = row.email
+"""
+
+MERGE_REVIEWS_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {user_id: row.user_id}), (m:Movie {id: row.movie_id})
+MERGE (r:Review {review_id: row.review_id})
+SET r.rating = row.rating
+MERGE (r)-[:REVIEWS]->(m)
+MERGE (u)-[:REVIEWS]->(r)
+"""
+
+MERGE_WATCHLISTS_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {user_id: row.user_id}), (m:Movie {id: row.movie_id})
+MERGE (w:Watchlist {watch_id: row.watch_id})
+MERGE (w)-[:WATCHED_BY]->(u)
+MERGE (u)-[:WATCHLIST]->(m)
+"""
+
+# :Media as in graph_sync, recommendations.py only matches that label
+MERGE_MOVIES_QUERY = """
+UNWIND $rows AS row
+MERGE (m:Movie {id: row.id})
+SET m:Media, m.title = row.title, m.release_year = row.release_year, m.rating = row.rating,
+    m.genre = row.genre, m.duration = row.duration
+"""
+
+MERGE_ACTORS_QUERY = """
+UNWIND $rows AS row
+MERGE (a:Actor {cast_id: row.cast_id})
+SET a.name = row.name, a.description = row.description, a.type = 'ACTOR', a.movie_id = row.movie_id
+WITH a, row
+MATCH (m:Movie {id: row.movie_id})
+MERGE (a)-[:ACTED_IN]->(m)
+"""
+
+MERGE_DIRECTORS_QUERY = """
+UNWIND $rows AS row
+MERGE (d:Director {cast_id: row.cast_id})
+SET d.name = row.name, d.description = row.description, d.type = 'DIRECTOR', d.movie_id = row.movie_id
+WITH d, row
+MATCH (m:Movie {id: row.movie_id})
+MERGE (d)-[:DIRECTED]->(m)
+"""
+
+SAMPLE_USER = {"user_id": 1, "name": "John Doe", "email": "johndoe@example.com"}
+
+SAMPLE_REVIEWS = [
+    {"review_id": 101, "movie_id": 1, "rating": 9},
+    {"review_id": 102, "movie_id": 2, "rating": 8}
+]
+
+SAMPLE_WATCHLISTS = [
+    {"watch_id": 201, "movie_id": 1},
+    {"watch_id": 202, "movie_id": 2}
+]
+
+SAMPLE_MOVIES = [
+    {"id": 1, "title": "Inception", "release_year": 2010, "rating": 8.8, "genre": "Sci-Fi", "duration": 148},
+    {"id": 2, "title": "Interstellar", "release_year": 2014, "rating": 8.6, "genre": "Sci-Fi", "duration": 169}
+]
+
+SAMPLE_ACTORS = [
+    {"cast_id": 1, "description": "Main actor in Inception", "name": "Leonardo DiCaprio", "movie_id": 1},
+    {"cast_id": 2, "description": "Main actor in Interstellar", "name": "Matthew McConaughey", "movie_id": 2},
+    {"cast_id": 3, "description": "Supporting actor in Interstellar", "name": "Anne Hathaway", "movie_id": 2}
+]
+
+SAMPLE_DIRECTORS = [
+    {"cast_id": 4, "description": "Director of Inception", "name": "Christopher Nolan", "movie_id": 1},
+    {"cast_id": 5, "description": "Director of Interstellar", "name": "Christopher Nolan", "movie_id": 2}
+]
+
+
+def neo4j_write_batches(driver, query, rows, batch_size=NEO4J_BATCH_SIZE):
     """
-    Adds a user and their reviews linked to movies in the Neo4j database.
+    Runs a parameterized UNWIND query over rows, one explicit transaction per batch.
 
     Args:
         driver (neo4j.Driver): The Neo4j driver object.
-    """
-    user = {"user_id": 1, "name": "John Doe", "email": "johndoe@example.com"}
-    reviews = [
-        {"review_id": 101, "movie_id": 1, "rating": 9},
-        {"review_id": 102, "movie_id": 2, "rating": 8}
-    ]
-
-    # Create or Merge User Node
-    user_query = f"""
-    MERGE (:User {{user_id: {user['user_id']}, name: '{user['name']}', email: '{user['email']}'}})
-    """
-
-    # Create Review Nodes and Link to Movies
-    review_queries = []
-    for review in reviews:
-        review_queries.append(f"""
-        MATCH (m:Movie {{id: {review['movie_id']}}})
-        MERGE (r:Review {{review_id: {review['review_id']}, rating: {review['rating']}}})
-        MERGE (r)-[:REVIEWS]->(m)
-        MERGE (:User {{user_id: {user['user_id']}}})-[:REVIEWS]->(r)
-        """)
+        query (str): Cypher statement that reads its input from $rows.
+        rows (iterable of dict): The parameter rows.
+        batch_size (int): Number of rows sent per transaction.
 
+    Returns:
+        int: Number of rows written.
+    """
+    written = 0
+    batch = []
     with driver.session() as session:
-        # Create or Merge User Node
-        session.run(user_query)
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _run_batch(session, query, batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            _run_batch(session, query, batch)
+            written += len(batch)
+    return written
 
-        # Create Reviews and Relationships
-        for query in review_queries:
-            session.run(query)
 
-    print("User, their reviews, and links to movies have been added to the Neo4j database.")
+def _run_batch(session, query, batch):
+    with session.begin_transaction() as tx:
+        tx.run(query, rows=batch)
+        tx.commit()
 
-def neo4j_add_relation_user_watchlists(driver):
+
+def neo4j_add_relation_user_review_movie(driver, user=None, reviews=None, batch_size=NEO4J_BATCH_SIZE):
     """
-    Adds a user and their watchlists to the Neo4j database.
+    Adds a user and their reviews linked to movies in the Neo4j database.
 
     Args:
         driver (neo4j.Driver): The Neo4j driver object.
+        user (dict): user_id, name and email of the reviewer (defaults to a sample user).
+        reviews (list of dict): review_id, movie_id and rating per review (defaults to sample reviews).
+        batch_size (int): Number of rows sent per transaction.
     """
-    user = {"user_id": 1, "name": "John Doe", "email": "johndoe@example.com"}
-    watchlists = [
-        {"watch_id": 201, "movie_id": 1},
-        {"watch_id": 202, "movie_id": 2}
-    ]
+    user = user or SAMPLE_USER
+    reviews = reviews if reviews is not None else SAMPLE_REVIEWS
 
-    user_query = f"""
-    MERGE (:User {{user_id: {user['user_id']}, name: '{user['name']}', email: '{user['email']}'}})
-    """
+    neo4j_write_batches(driver, MERGE_USERS_QUERY, [user], batch_size)
+    neo4j_write_batches(
+        driver,
+        MERGE_REVIEWS_QUERY,
+        ({**review, "user_id": user["user_id"]} for review in reviews),
+        batch_size
+    )
 
-    watchlist_queries = []
-    for watchlist in watchlists:
-        watchlist_queries.append(f"""
-        MATCH (u:User {{user_id: {user['user_id']}}}), (m:Movie {{id: {watchlist['movie_id']}}})
-        CREATE (:Watchlist {{watch_id: {watchlist['watch_id']}}})-[:WATCHED_BY]->(u)-[:WATCHLIST]->(m)
-        """)
+    print("User, their reviews, and links to movies have been added to the Neo4j database.")
 
-    with driver.session() as session:
-        # Create or Match User
-        session.run(user_query)
+def neo4j_add_relation_user_watchlists(driver, user=None, watchlists=None, batch_size=NEO4J_BATCH_SIZE):
+    """
+    Adds a user and their watchlists to the Neo4j database.
+
+    Args:
+        driver (neo4j.Driver): The Neo4j driver object.
+        user (dict): user_id, name and email of the owner (defaults to a sample user).
+        watchlists (list of dict): watch_id and movie_id per entry (defaults to sample watchlists).
+        batch_size (int): Number of rows sent per transaction.
+    """
+    user = user or SAMPLE_USER
+    watchlists = watchlists if watchlists is not None else SAMPLE_WATCHLISTS
 
-        # Create Watchlist Relationships
-        for query in watchlist_queries:
-            session.run(query)
+    neo4j_write_batches(driver, MERGE_USERS_QUERY, [user], batch_size)
+    neo4j_write_batches(
+        driver,
+        MERGE_WATCHLISTS_QUERY,
+        ({**watchlist, "user_id": user["user_id"]} for watchlist in watchlists),
+        batch_size
+    )
 
     print("User and their watchlist have been added to the Neo4j database.")
 
 
-def neo4j_add_relation_actor_movie_director(driver):
-    # Queries for Movies, Actors, Directors, and Relationships
-    movie_queries = [
-        "CREATE (:Movie {id: 1, title: 'Inception', release_year: 2010, rating: 8.8, genre: 'Sci-Fi', duration: 148})",
-        "CREATE (:Movie {id: 2, title: 'Interstellar', release_year: 2014, rating: 8.6, genre: 'Sci-Fi', duration: 169})"
-    ]
-
-    actor_queries = [
-        "CREATE (:Actor {description: 'Main actor in Inception', type: 'ACTOR', name: 'Leonardo DiCaprio', movie_id: 1})",
-        "CREATE (:Actor {description: 'Main actor in Interstellar', type: 'ACTOR', name: 'Matthew McConaughey', movie_id: 2})",
-        "CREATE (:Actor {description: 'Supporting actor in Interstellar', type: 'ACTOR', name: 'Anne Hathaway', movie_id: 2})"
-    ]
-
-    director_queries = [
-        "CREATE (:Director {description: 'Director of Inception', type: 'DIRECTOR', name: 'Christopher Nolan', movie_id: 1})",
-        "CREATE (:Director {description: 'Director of Interstellar', type: 'DIRECTOR', name: 'Christopher Nolan', movie_id: 2})"
-    ]
-
-    relationship_queries = [
-        "MATCH (d:Director {movie_id: 1}), (m:Movie {id: 1}) CREATE (d)-[:DIRECTED]->(m)",
-        "MATCH (d:Director {movie_id: 2}), (m:Movie {id: 2}) CREATE (d)-[:DIRECTED]->(m)",
-        "MATCH (a:Actor {movie_id: 1}), (m:Movie {id: 1}) CREATE (a)-[:ACTED_IN]->(m)",
-        "MATCH (a:Actor {movie_id: 2}), (m:Movie {id: 2}) CREATE (a)-[:ACTED_IN]->(m)"
-    ]
-
-    # Execute Queries
-    with driver.session() as session:
-        for query in movie_queries:
-            session.run(query)
-
-        for query in actor_queries:
-            session.run(query)
+def neo4j_add_relation_actor_movie_director(driver, movies=None, actors=None, directors=None,
+                                            batch_size=NEO4J_BATCH_SIZE):
+    """
+    Adds movies, their actors and directors and the ACTED_IN/DIRECTED edges.
 
-        for query in director_queries:
-            session.run(query)
+    Args:
+        driver (neo4j.Driver): The Neo4j driver object.
+        movies (list of dict): Movie properties keyed by id (defaults to sample movies).
+        actors (list of dict): cast_id, name, description and movie_id per actor (defaults to sample actors).
+        directors (list of dict): cast_id, name, description and movie_id per director (defaults to sample directors).
+        batch_size (int): Number of rows sent per transaction.
+    """
+    movies = movies if movies is not None else SAMPLE_MOVIES
+    actors = actors if actors is not None else SAMPLE_ACTORS
+    directors = directors if directors is not None else SAMPLE_DIRECTORS
 
-        for query in relationship_queries:
-            session.run(query)
+    # Movies first so the cast statements can match them
+    neo4j_write_batches(driver, MERGE_MOVIES_QUERY, movies, batch_size)
+    neo4j_write_batches(driver, MERGE_ACTORS_QUERY, actors, batch_size)
+    neo4j_write_batches(driver, MERGE_DIRECTORS_QUERY, directors, batch_size)
 
     print("All data and relationships have been added to the Neo4j database.")
 
@@ -272,28 +694,106 @@ def check_data_in_db(driver):
             print(record)
 
 
+# Read queries, shared with the async API in async_api.py
+
+FIND_WATCHLIST_QUERY = """
+MATCH (u:User {user_id: $user_id})-[:WATCHLIST]->(m:Movie)
+RETURN u.name AS User, m.title AS Movie, m.release_year AS ReleaseYear
+"""
+
+FIND_USERS_FOR_MOVIE_QUERY = """
+MATCH (u:User)-[:WATCHLIST]->(m:Movie {id: $movie_id})
+RETURN m.title AS Movie, u.name AS User, u.email AS Email
+"""
+
+ALL_REVIEWS_QUERY = """
+MATCH (u:User)-[:REVIEWS]->(r:Review)-[:REVIEWS]->(m:Movie)
+RETURN
+    u.user_id AS ReviewerID,
+    r.review_id AS ReviewID,
+    r.rating AS Rating,
+    m.title AS MovieTitle,
+    m.release_year AS ReleaseYear
+ORDER BY Rating DESC
+"""
+
+
+# Batched forms, one record per id with its rows collected as maps
+FIND_WATCHLISTS_BATCH_QUERY = """
+UNWIND $ids AS user_id
+MATCH (u:User {user_id: user_id})-[:WATCHLIST]->(m:Movie)
+RETURN user_id AS id, collect({User: u.name, Movie: m.title, ReleaseYear: m.release_year}) AS rows
+"""
+
+FIND_USERS_FOR_MOVIES_BATCH_QUERY = """
+UNWIND $ids AS movie_id
+MATCH (u:User)-[:WATCHLIST]->(m:Movie {id: movie_id})
+RETURN movie_id AS id, collect({Movie: m.title, User: u.name, Email: u.email}) AS rows
+"""
+
+NEO4J_LOOKUP_CHUNK_SIZE = 5000
+
+
 def find_watchlist_for_user(driver, user_id):
-    query = """
-    MATCH (u:User {user_id: $user_id})-[:WATCHLIST]->(m:Movie)
-    RETURN u.name AS User, m.title AS Movie, m.release_year AS ReleaseYear
-    """
     with driver.session() as session:
-        result = session.run(query, user_id=user_id)
+        result = session.run(FIND_WATCHLIST_QUERY, user_id=user_id)
         for record in result:
             print(f"User: {record['User']}, Movie: {record['Movie']}, Release Year: {record['ReleaseYear']}")
 
 
 def find_users_for_movie(driver, movie_id):
-    query = """
-    MATCH (u:User)-[:WATCHLIST]->(m:Movie {id: $movie_id})
-    RETURN m.title AS Movie, u.name AS User, u.email AS Email
-    """
     with driver.session() as session:
-        result = session.run(query, movie_id=movie_id)
+        result = session.run(FIND_USERS_FOR_MOVIE_QUERY, movie_id=movie_id)
         for record in result:
             print(f"Movie: {record['Movie']}, User: {record['User']}, Email: {record['Email']}")
 
 
+def neo4j_lookup_batches(driver, query, ids, chunk_size=NEO4J_LOOKUP_CHUNK_SIZE, session=None):
+    """
+    Runs a batched lookup query (UNWIND $ids ... RETURN id, rows) chunk by chunk.
+
+    Args:
+        driver (neo4j.Driver): The Neo4j driver object.
+        query (str): Query taking $ids and returning one 'id' and 'rows' record per id found.
+        ids (iterable): The ids to look up, duplicates are looked up once.
+        chunk_size (int): Number of ids sent per query.
+        session (neo4j.Session): Session to run the chunks on, e.g. to reuse one
+            across many calls. By default one session is opened for all chunks.
+
+    Returns:
+        dict: Every requested id mapped to its list of row dicts, empty if nothing matched.
+    """
+    ids = list(dict.fromkeys(ids))
+    results = {id_: [] for id_ in ids}
+    if session is None:
+        with driver.session() as session:
+            return neo4j_lookup_batches(driver, query, ids, chunk_size, session)
+    for start in range(0, len(ids), chunk_size):
+        for record in session.run(query, ids=ids[start:start + chunk_size]):
+            results[record["id"]] = list(record["rows"])
+    return results
+
+
+def find_watchlists_for_users(driver, user_ids, chunk_size=NEO4J_LOOKUP_CHUNK_SIZE, session=None):
+    """
+    Batched find_watchlist_for_user: one UNWIND query per chunk of user ids.
+
+    Returns:
+        dict: user_id -> [{'User', 'Movie', 'ReleaseYear'}, ...]
+    """
+    return neo4j_lookup_batches(driver, FIND_WATCHLISTS_BATCH_QUERY, user_ids, chunk_size, session)
+
+
+def find_users_for_movies(driver, movie_ids, chunk_size=NEO4J_LOOKUP_CHUNK_SIZE, session=None):
+    """
+    Batched find_users_for_movie: one UNWIND query per chunk of movie ids.
+
+    Returns:
+        dict: movie_id -> [{'Movie', 'User', 'Email'}, ...]
+    """
+    return neo4j_lookup_batches(driver, FIND_USERS_FOR_MOVIES_BATCH_QUERY, movie_ids, chunk_size, session)
+
+
 def get_all_reviews(driver):
     """
     Retrieves all reviews with user and movie details.
@@ -301,18 +801,8 @@ def get_all_reviews(driver):
     Args:
         driver (neo4j.Driver): The Neo4j driver object.
     """
-    query = """
-    MATCH (u:User)-[:REVIEWS]->(r:Review)-[:REVIEWS]->(m:Movie)
-    RETURN 
-        u.user_id AS ReviewerID,
-        r.review_id AS ReviewID,
-        r.rating AS Rating,
-        m.title AS MovieTitle,
-        m.release_year AS ReleaseYear
-    ORDER BY Rating DESC
-    """
     with driver.session() as session:
-        result = session.run(query)
+        result = session.run(ALL_REVIEWS_QUERY)
         for record in result:
             print(f"Reviewer: {record['ReviewerID']}, "
                   f"ReviewID: {record['ReviewID']}, Rating: {record['Rating']}, "
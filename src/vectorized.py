@@ -0,0 +1,156 @@
+import time
+import numpy as np
+
+from classes import SubscriptionType
+from queries import AVERAGE_DECIMALS
+
+
+# Columns loaded into the snapshot: name -> (SQL, dtype per column)
+SNAPSHOT_QUERIES = {
+    "users": ("SELECT id, username FROM users ORDER BY id", (np.int64, object)),
+    "watchlists": ("SELECT id, user_id FROM watchlists ORDER BY id", (np.int64, np.int64)),
+    "watchlist_media": ("SELECT watchlists_id, medias_id FROM watchlist_media", (np.int64, np.int64)),
+    "medias": ("SELECT id, title, genre, rating FROM medias ORDER BY id", (np.int64, object, object, np.float64)),
+    "series": ("SELECT id FROM series ORDER BY id", (np.int64,)),
+    "reviews": ("SELECT media_id FROM reviews", (np.int64,)),
+    "episodes": ("SELECT series_id FROM episodes", (np.int64,)),
+    "subscriptions": ("SELECT subscription_type, price FROM subscriptions", (object, np.float64)),
+}
+
+
+# Stands in for NULL in integer key columns, ids are always positive
+MISSING_KEY = -1
+
+
+def to_array(values, dtype):
+    if dtype is np.int64:
+        return np.fromiter((MISSING_KEY if value is None else value for value in values), dtype, len(values))
+    # NULL becomes NaN for floats and stays None for objects
+    return np.array(values, dtype=dtype)
+
+
+def load_columns(cursor, sql, dtypes):
+    """Runs sql and returns one NumPy array per selected column."""
+    cursor.execute(sql)
+    rows = cursor.fetchall()
+    if not rows:
+        return [np.array([], dtype=dtype) for dtype in dtypes]
+    return [to_array(column, dtype) for column, dtype in zip(zip(*rows), dtypes)]
+
+
+def lookup(sorted_keys, keys):
+    """
+    Positions of keys in sorted_keys and a mask of the keys that were found,
+    the vectorized equivalent of an inner join on a primary key.
+    """
+    positions = np.searchsorted(sorted_keys, keys)
+    positions = np.minimum(positions, max(len(sorted_keys) - 1, 0))
+    found = sorted_keys[positions] == keys if len(sorted_keys) else np.zeros(len(keys), dtype=bool)
+    return positions, found
+
+
+def count_by_key(keys):
+    """Sorted distinct keys and their number of occurrences."""
+    return np.unique(keys, return_counts=True)
+
+
+class VectorizedQueries:
+    """
+    Computes the Queries aggregations on an in-memory column snapshot.
+
+    refresh() loads the needed columns of all tables into NumPy arrays in one
+    pass; every aggregation afterwards is a handful of vectorized group-by
+    operations (np.unique, np.bincount, np.searchsorted) without touching the
+    database. Results have the same rows and order as the SQL versions.
+    Averages are rounded to queries.AVERAGE_DECIMALS like the SQL ones,
+    because NumPy and SQLite add the ratings up in different orders; sums can
+    still differ from SQLite in the last floating point digits.
+    """
+
+    def __init__(self, engine, load=True):
+        self.engine = engine
+        self.columns = {}
+        if load:
+            self.refresh()
+
+    def refresh(self):
+        """Reloads the snapshot from the database."""
+        start = time.perf_counter()
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for name, (sql, dtypes) in SNAPSHOT_QUERIES.items():
+                self.columns[name] = load_columns(cursor, sql, dtypes)
+            cursor.close()
+        finally:
+            connection.close()
+        # Genres as compact integer codes into a sorted category array
+        genres = self.columns["medias"][2]
+        self.genre_categories, self.genre_codes = np.unique(genres.astype(str), return_inverse=True)
+        self.load_time = time.perf_counter() - start
+
+    def count_media_per_user(self):
+        """[username, media count] per user with watchlist entries, ordered by user id."""
+        user_ids, usernames = self.columns["users"]
+        watchlist_ids, watchlist_user_ids = self.columns["watchlists"]
+        entry_watchlists, entry_medias = self.columns["watchlist_media"]
+        media_ids = self.columns["medias"][0]
+
+        watchlist_positions, watchlist_found = lookup(watchlist_ids, entry_watchlists)
+        _, media_found = lookup(media_ids, entry_medias)
+        owners = watchlist_user_ids[watchlist_positions[watchlist_found & media_found]]
+        owners, counts = count_by_key(owners)
+        user_positions, user_found = lookup(user_ids, owners)
+        return [
+            [usernames[position], int(count)]
+            for position, count in zip(user_positions[user_found], counts[user_found])
+        ]
+
+    def average_rating_by_genre(self):
+        """
+        [genre, average rating] per genre, ordered by genre. As with AVG, the
+        average of a genre whose ratings are all NULL is None.
+        """
+        ratings = self.columns["medias"][3]
+        rated = ~np.isnan(ratings)
+        codes = self.genre_codes[rated]
+        sums = np.bincount(codes, weights=ratings[rated], minlength=len(self.genre_categories))
+        counts = np.bincount(codes, minlength=len(self.genre_categories))
+        return [
+            [str(genre), round(float(total / count), AVERAGE_DECIMALS) if count else None]
+            for genre, total, count in zip(self.genre_categories, sums, counts)
+        ]
+
+    def count_reviews_per_media(self):
+        """[title, review count] per reviewed media, ordered by media id."""
+        media_ids, titles = self.columns["medias"][:2]
+        reviewed, counts = count_by_key(self.columns["reviews"][0])
+        positions, found = lookup(media_ids, reviewed)
+        return [[titles[position], int(count)] for position, count in zip(positions[found], counts[found])]
+
+    def count_episodes_per_series(self):
+        """[title, episode count] per series with episodes, ordered by series id."""
+        media_ids, titles = self.columns["medias"][:2]
+        series_ids = self.columns["series"][0]
+        series_keys, counts = count_by_key(self.columns["episodes"][0])
+        _, is_series = lookup(series_ids, series_keys)
+        positions, has_media = lookup(media_ids, series_keys)
+        keep = is_series & has_media
+        return [[titles[position], int(count)] for position, count in zip(positions[keep], counts[keep])]
+
+    def total_revenue_by_subscription_type(self):
+        """[SubscriptionType, total revenue] per subscription type, ordered by type name."""
+        types, prices = self.columns["subscriptions"]
+        names, codes = np.unique(types.astype(str), return_inverse=True)
+        totals = np.bincount(codes, weights=prices, minlength=len(names))
+        return [[SubscriptionType[name], float(total)] for name, total in zip(names, totals)]
+
+    def all_aggregations(self):
+        """Every aggregation keyed by its Queries method name."""
+        return {
+            "count_media_per_user": self.count_media_per_user(),
+            "average_rating_by_genre": self.average_rating_by_genre(),
+            "count_reviews_per_media": self.count_reviews_per_media(),
+            "count_episodes_per_series": self.count_episodes_per_series(),
+            "total_revenue_by_subscription_type": self.total_revenue_by_subscription_type(),
+        }
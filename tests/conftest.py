@@ -0,0 +1,23 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+# The modules in src/ import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def synthetic(tmp_path):
+    """Session and engine of a small database filled by synthetic_data.populate_synthetic."""
+    from synthetic_data import populate_synthetic
+    from utils import setup
+
+    session, engine = setup(str(tmp_path / "synthetic.db"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        populate_synthetic(session, {"users": 40, "media": 60}, str(tmp_path / "catalog.jsonl"))
+    yield session, engine
+    session.close()
+    engine.dispose()
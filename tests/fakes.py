@@ -0,0 +1,123 @@
+class FakeDriver:
+    """
+    In-memory stand-in for neo4j.Driver.
+
+    responses maps a query string to a list of record dicts or to a function
+    of the query parameters returning one. Auto-commit runs are recorded in
+    runs as (query, parameters), committed transactions in transactions as
+    lists of (query, parameters).
+    """
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.runs = []
+        self.transactions = []
+        self.rolled_back = []
+
+    def respond(self, query, parameters):
+        records = self.responses.get(query, [])
+        if callable(records):
+            records = records(parameters)
+        return FakeResult(records)
+
+    def session(self, **config):
+        return FakeSession(self)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def run(self, query, parameters=None, **kwargs):
+        parameters = {**(parameters or {}), **kwargs}
+        self.driver.runs.append((query, parameters))
+        return self.driver.respond(query, parameters)
+
+    def begin_transaction(self):
+        return FakeTransaction(self.driver)
+
+
+class FakeTransaction:
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.statements = []
+        self.committed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.committed:
+            self.driver.rolled_back.append(self.statements)
+        return False
+
+    def run(self, query, parameters=None, **kwargs):
+        parameters = {**(parameters or {}), **kwargs}
+        self.statements.append((query, parameters))
+        return self.driver.respond(query, parameters)
+
+    def commit(self):
+        self.committed = True
+        self.driver.transactions.append(self.statements)
+
+
+class FakeResult:
+
+    def __init__(self, records):
+        self.records = [dict(record) for record in records]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def data(self):
+        return self.records
+
+    def consume(self):
+        pass
+
+
+class FakeAsyncDriver(FakeDriver):
+    """In-memory stand-in for neo4j.AsyncDriver, runs are recorded like in FakeDriver."""
+
+    def session(self, **config):
+        return FakeAsyncSession(self)
+
+    async def close(self):
+        pass
+
+
+class FakeAsyncSession:
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def run(self, query, parameters=None, **kwargs):
+        parameters = {**(parameters or {}), **kwargs}
+        self.driver.runs.append((query, parameters))
+        return FakeAsyncResult(self.driver.respond(query, parameters).records)
+
+
+class FakeAsyncResult:
+
+    def __init__(self, records):
+        self.records = records
+
+    async def data(self):
+        return self.records
@@ -0,0 +1,65 @@
+import contextlib
+import io
+import random
+import sqlite3
+
+from sqlalchemy import text
+
+from utils import setup
+from queries import Queries
+
+
+QUERIES = ["count_media_per_user", "average_rating_by_genre", "count_reviews_per_media", "count_episodes_per_series"]
+
+
+def results(session, materialized):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {name: getattr(Queries(materialized), name)(session) for name in QUERIES}
+
+
+def test_setup_backfills_summaries_of_an_existing_database(tmp_path):
+    database = str(tmp_path / "old.db")
+    session, engine = setup(database)
+    session.execute(text("INSERT INTO medias VALUES (1, 'Heat', 1995, 8.3, 'Crime', 'MOVIE'), "
+                         "(2, 'Up', 2009, 8.2, 'Family', 'MOVIE')"))
+    session.commit()
+    session.close()
+    engine.dispose()
+    # A database from before the summaries: no agg_* tables, no triggers
+    connection = sqlite3.connect(database)
+    for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        connection.execute(f"DROP TRIGGER {name}")
+    for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE name LIKE 'agg_%'").fetchall():
+        connection.execute(f"DROP TABLE {name}")
+    connection.commit()
+    connection.close()
+
+    session, engine = setup(database)
+
+    assert results(session, True) == results(session, False)
+    assert results(session, True)["average_rating_by_genre"] == [["Crime", 8.3], ["Family", 8.2]]
+    session.close()
+    engine.dispose()
+
+
+def test_summaries_follow_updates(tmp_path):
+    session, engine = setup(str(tmp_path / "agg.db"))
+    generator = random.Random(1)
+    genres = ["Action", "Drama", "Crime"]
+    for media_id in range(1, 101):
+        session.execute(text("INSERT INTO medias VALUES (:id, :title, 2000, :rating, :genre, 'MOVIE')"), {
+            "id": media_id, "title": f"m{media_id}", "rating": round(generator.uniform(0, 10), 1),
+            "genre": generator.choice(genres),
+        })
+    for _ in range(300):
+        session.execute(text("UPDATE medias SET rating = :rating, genre = :genre WHERE id = :id"), {
+            "id": generator.randint(1, 100), "rating": round(generator.uniform(0, 10), 1),
+            "genre": generator.choice(genres + ["Solo"]),
+        })
+    session.execute(text("DELETE FROM medias WHERE genre = 'Solo'"))
+    session.commit()
+
+    assert results(session, True) == results(session, False)
+    assert "Solo" not in [genre for genre, _ in results(session, True)["average_rating_by_genre"]]
+    session.close()
+    engine.dispose()
@@ -0,0 +1,86 @@
+import asyncio
+import contextlib
+import io
+import sqlite3
+
+from sqlalchemy import text
+
+from async_api import AsyncQueries, async_setup, find_watchlist_for_user, gather_limited
+from fakes import FakeAsyncDriver
+from queries import Queries
+from utils import FIND_WATCHLIST_QUERY, setup
+
+
+def test_async_setup_applies_pragmas_and_missing_indexes(tmp_path):
+    database = str(tmp_path / "async.db")
+    session, engine = setup(database)
+    session.close()
+    engine.dispose()
+    connection = sqlite3.connect(database)
+    connection.execute("DROP INDEX ix_medias_genre_rating")
+    connection.close()
+
+    async def run():
+        Session, engine = await async_setup(database, "bulk_load")
+        async with Session() as session:
+            synchronous = (await session.execute(text("PRAGMA synchronous"))).scalar()
+            indexes = (await session.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index'")
+            )).scalars().all()
+        await engine.dispose()
+        return synchronous, indexes
+
+    synchronous, indexes = asyncio.run(run())
+    assert synchronous == 0  # OFF in the bulk_load profile
+    assert "ix_medias_genre_rating" in indexes
+
+
+def test_async_queries_match_queries(tmp_path):
+    database = str(tmp_path / "queries.db")
+    session, engine = setup(database)
+    session.execute(text("INSERT INTO medias VALUES (1, 'Heat', 1995, 8.3, 'Crime', 'MOVIE'), "
+                         "(2, 'Up', 2009, 8.2, 'Family', 'MOVIE'), (3, 'Ran', 1985, 8.2, 'Drama', 'MOVIE')"))
+    session.commit()
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = [tuple(row) for row in Queries().average_rating_by_genre(session)]
+    session.close()
+    engine.dispose()
+
+    async def run():
+        Session, engine = await async_setup(database)
+        async with Session() as session:
+            rows = await AsyncQueries().average_rating_by_genre(session)
+        await engine.dispose()
+        return rows
+
+    rows = asyncio.run(run())
+    assert [(row["genre"], row["average_rating"]) for row in rows] == expected
+
+
+def test_gather_limited_keeps_order_and_bounds_concurrency():
+    running = 0
+    peak = 0
+
+    async def lookup(value):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001 * (10 - value))
+        running -= 1
+        return value
+
+    results = asyncio.run(gather_limited((lookup(value) for value in range(10)), limit=3))
+    assert results == list(range(10))
+    assert peak == 3
+
+
+def test_graph_lookups_run_against_the_driver():
+    driver = FakeAsyncDriver({
+        FIND_WATCHLIST_QUERY: lambda parameters: [{"User": parameters["user_id"], "Movie": "Heat"}],
+    })
+
+    async def run():
+        return await gather_limited(find_watchlist_for_user(driver, user_id) for user_id in (1, 2))
+
+    assert asyncio.run(run()) == [[{"User": 1, "Movie": "Heat"}], [{"User": 2, "Movie": "Heat"}]]
+    assert driver.runs == [(FIND_WATCHLIST_QUERY, {"user_id": 1}), (FIND_WATCHLIST_QUERY, {"user_id": 2})]
@@ -0,0 +1,13 @@
+from benchmark import rows_match
+
+
+def test_rows_match_tolerates_summation_order():
+    values = [0.1, 0.2, 0.3, 0.7, 9.9]
+    forward = sum(values) / len(values)
+    backward = sum(reversed(values)) / len(values)
+    assert forward != backward
+
+    assert rows_match([["Heat", forward, 5, 1]], [["Heat", backward, 5, 1]])
+    assert not rows_match([["Heat", forward, 5, 1]], [["Heat", forward + 1e-6, 5, 1]])
+    assert not rows_match([["Heat", forward, 5, 1]], [["Heat", forward, 5, 2]])
+    assert not rows_match([["Heat", forward, 5, 1]], [])
@@ -0,0 +1,40 @@
+from sqlalchemy import text
+
+from change_log import change_capture_installed
+from utils import setup, truncate_tables
+
+
+INSERT_USER = "INSERT INTO users VALUES (1, 'ann', 'ann@example.com', 'MAIN_USER')"
+
+
+def change_log_size(session):
+    return session.execute(text("SELECT count(*) FROM change_log")).scalar()
+
+
+def test_change_capture_is_opt_in(tmp_path):
+    session, engine = setup(str(tmp_path / "plain.db"))
+    session.execute(text(INSERT_USER))
+    session.commit()
+
+    assert not change_capture_installed(engine)
+    assert change_log_size(session) == 0
+    truncate_tables(engine)
+    assert not change_capture_installed(engine)
+    session.close()
+    engine.dispose()
+
+
+def test_truncate_tables_keeps_installed_change_capture(tmp_path):
+    session, engine = setup(str(tmp_path / "captured.db"), change_capture=True)
+    session.execute(text(INSERT_USER))
+    session.commit()
+    assert change_log_size(session) == 1
+
+    truncate_tables(engine)
+    session.execute(text(INSERT_USER))
+    session.commit()
+
+    assert change_capture_installed(engine)
+    assert change_log_size(session) == 1
+    session.close()
+    engine.dispose()
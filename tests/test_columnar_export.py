@@ -0,0 +1,32 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from columnar_export import FLATTENED_VIEWS, export_all_columnar, export_columnar, record_batches
+from classes import Movie, Subscription
+
+
+def test_record_batches_follow_the_schema_and_chunk_size(synthetic):
+    session, engine = synthetic
+    batches = list(record_batches(engine, FLATTENED_VIEWS["movies_flat"], chunk_size=16))
+    movies = session.query(Movie).count()
+
+    assert [batch.num_rows for batch in batches[:-1]] == [16] * (len(batches) - 1)
+    assert sum(batch.num_rows for batch in batches) == movies
+    schema = batches[0].schema
+    assert schema.names == ["id", "title", "release_year", "rating", "genre", "media_type", "duration"]
+    assert schema.field("rating").type == pa.float64()
+    assert schema.field("duration").type == pa.int64()
+
+
+def test_parquet_and_arrow_files_hold_every_row(synthetic, tmp_path):
+    session, engine = synthetic
+    counts = export_all_columnar(engine, str(tmp_path / "parquet"), "parquet", chunk_size=50)
+    table = pa.parquet.read_table(tmp_path / "parquet" / "subscriptions.parquet")
+
+    assert counts["subscriptions"] == table.num_rows == session.query(Subscription).count()
+    assert table.schema.field("startdate").type == pa.date32()
+
+    rows = export_columnar(engine, FLATTENED_VIEWS["actors_flat"], str(tmp_path / "actors.arrow"), "arrow")
+    with pa.ipc.open_file(tmp_path / "actors.arrow") as reader:
+        assert reader.read_all().num_rows == rows > 0
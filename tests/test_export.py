@@ -0,0 +1,42 @@
+import gzip
+import json
+
+from classes import watchlist_media
+from queries import Queries
+from export import dumps, export_query, export_read_model, export_sections, export_table, table_rows
+
+
+def test_ndjson_and_gzip_round_trip(synthetic, tmp_path):
+    session, engine = synthetic
+    expected = [json.loads(dumps(row)) for row in table_rows(session, "users")]
+
+    count = export_table(session, "users", str(tmp_path / "users.ndjson"), page_size=7)
+    with open(tmp_path / "users.ndjson") as handle:
+        plain = [json.loads(line) for line in handle]
+    export_table(session, "users", str(tmp_path / "users.ndjson.gz"), compression="gzip", page_size=7)
+    with gzip.open(tmp_path / "users.ndjson.gz", "rt") as handle:
+        compressed = [json.loads(line) for line in handle]
+
+    assert count == len(expected) > 7
+    assert plain == compressed == expected
+    assert {row["user_type"] for row in plain} == {"Main User", "Other User"}
+
+
+def test_json_arrays_and_sections_parse(synthetic, tmp_path):
+    session, engine = synthetic
+    count = export_read_model(session, "media", str(tmp_path / "media.json"), fmt="json")
+    export_query(session, "count_reviews_per_media", str(tmp_path / "reviews.json"), fmt="json", page_size=5)
+    export_sections([("empty", []), ("watchlist_media", table_rows(session, "watchlist_media"))],
+                    str(tmp_path / "sections.json"))
+
+    with open(tmp_path / "media.json") as handle:
+        assert len(json.load(handle)) == count
+    with open(tmp_path / "sections.json") as handle:
+        sections = json.load(handle)
+    assert sections["empty"] == []
+    assert len(sections["watchlist_media"]) == session.query(watchlist_media).count() > 0
+    with open(tmp_path / "reviews.json") as handle:
+        assert json.load(handle) == [
+            {"title": title, "review_count": review_count}
+            for title, review_count in Queries().stream(session, "count_reviews_per_media")
+        ]
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import text
+
+from fakes import FakeDriver
+from utils import setup
+import graph_sync as gs
+
+
+@pytest.fixture
+def session(tmp_path):
+    session, engine = setup(str(tmp_path / "sync.db"))
+    for statement in [
+        "INSERT INTO users VALUES (1, 'ann', 'ann@example.com', 'MAIN_USER'), (2, 'bob', 'bob@example.com', 'MAIN_USER')",
+        "INSERT INTO medias VALUES (1, 'Heat', 1995, 8.3, 'Crime', 'MOVIE'), (2, 'Up', 2009, 8.2, 'Family', 'MOVIE')",
+        "INSERT INTO movies VALUES (1, 170), (2, 96)",
+        "INSERT INTO reviews VALUES (1, 9.0, 1, 1)",
+        "INSERT INTO watchlists VALUES (1, 1), (2, 2)",
+        "INSERT INTO watchlist_media VALUES (1, 1), (2, 1), (1, 2)",
+    ]:
+        session.execute(text(statement))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def pushed(driver, query):
+    return [row for statements in driver.transactions for statement, parameters in statements
+            if statement == query for row in parameters["rows"]]
+
+
+def test_first_sync_pushes_everything_then_only_changes(session):
+    driver = FakeDriver()
+    counts = gs.sync_to_neo4j(session, driver, batch_size=2)
+    assert counts == {"users": 2, "movies": 2, "series": 0, "reviews": 1, "watchlists": 2,
+                      "watchlist_media": 3, "actors": 0, "directors": 0}
+    assert [(row["watch_id"], row["media_id"]) for row in pushed(driver, gs.SYNC_WATCHLIST_MEDIA_QUERY)] == \
+        [(1, 1), (1, 2), (2, 1)]
+
+    driver = FakeDriver()
+    assert gs.sync_to_neo4j(session, driver) == {}
+    assert not driver.transactions
+
+
+def test_updates_and_deletes_reach_the_graph(session):
+    gs.sync_to_neo4j(session, FakeDriver())
+    session.execute(text("UPDATE users SET email = 'ann@example.org' WHERE id = 1"))
+    session.execute(text("UPDATE reviews SET media_id = 2 WHERE id = 1"))
+    session.execute(text("DELETE FROM watchlist_media WHERE watchlists_id = 2 AND medias_id = 1"))
+    session.execute(text("DELETE FROM watchlist_media WHERE watchlists_id = 1"))
+    session.execute(text("DELETE FROM watchlists WHERE id = 1"))
+    session.commit()
+
+    driver = FakeDriver()
+    counts = gs.sync_to_neo4j(session, driver)
+
+    assert [row["email"] for row in pushed(driver, gs.MERGE_USERS_QUERY)] == ["ann@example.org"]
+    assert [(row["review_id"], row["media_id"]) for row in pushed(driver, gs.SYNC_REVIEWS_QUERY)] == [(1, 2)]
+    assert sorted((row["watchlists_id"], row["medias_id"])
+                  for row in pushed(driver, gs.DELETE_WATCHLIST_MEDIA_QUERY)) == [(1, 1), (1, 2), (2, 1)]
+    assert pushed(driver, gs.DELETE_WATCHLISTS_QUERY) == [{"id": 1}]
+    assert counts["deleted_watchlist_media"] == 3
+    # Deletes run before the upserts of the same batch
+    queries = [statements[0][0] for statements in driver.transactions]
+    assert queries.index(gs.DELETE_WATCHLISTS_QUERY) < queries.index(gs.MERGE_USERS_QUERY)
+
+
+def test_interrupted_snapshot_resumes_and_keeps_its_start(session):
+    class Failing(FakeDriver):
+        def session(self, **config):
+            if len(self.transactions) >= 3:
+                raise RuntimeError("connection lost")
+            return super().session(**config)
+
+    with pytest.raises(RuntimeError):
+        gs.sync_to_neo4j(session, Failing(), batch_size=1)
+    session.rollback()
+    start = session.get(gs.GraphSyncState, gs.SNAPSHOT_STATE).high_water_mark
+    assert gs.get_high_water_mark(session, "users") == 2
+
+    session.execute(text("UPDATE medias SET rating = 9.0 WHERE id = 2"))
+    session.commit()
+    driver = FakeDriver()
+    counts = gs.sync_to_neo4j(session, driver)
+
+    assert counts["users"] == 0
+    assert session.get(gs.GraphSyncState, gs.SNAPSHOT_STATE) is None
+    # The update made during the interrupted snapshot is applied from the log
+    assert [row["rating"] for row in pushed(driver, gs.SYNC_MOVIES_QUERY)][-1] == 9.0
+    assert start < gs.latest_seq(session)
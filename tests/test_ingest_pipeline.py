@@ -0,0 +1,112 @@
+import contextlib
+import io
+import json
+
+import pytest
+
+from classes import Actor, Director, Episode, Media, Movie, Series
+from ingest_pipeline import CatalogWriter, ingest_catalog, parse_shard, plan_shards
+from jsonl_reader import iter_lines
+from utils import setup
+
+
+MOVIES = [
+    {"kind": "movie", "title": f"Movie {number}", "release_year": 2000 + number, "rating": 7,
+     "genre": "Drama", "duration": 90 + number}
+    for number in range(20)
+]
+
+
+def write_jsonl(path, records):
+    path.write_text("".join((record if isinstance(record, str) else json.dumps(record)) + "\n"
+                            for record in records))
+    return str(path)
+
+
+@pytest.fixture
+def database(tmp_path):
+    session, engine = setup(str(tmp_path / "ingest.db"))
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_shards_cover_every_line_once(tmp_path):
+    filename = write_jsonl(tmp_path / "catalog.jsonl", MOVIES)
+    catalog_json = tmp_path / "catalog.json"
+    catalog_json.write_text(json.dumps({"movies": MOVIES[:2]}))
+
+    shards = plan_shards([filename, str(catalog_json)], shard_bytes=300)
+
+    assert len(shards) > 2
+    assert shards[-1] == (str(catalog_json), None, None)
+    lines = [line for shard in shards[:-1] for _, line in iter_lines(*shard)]
+    assert [json.loads(line) for line in lines] == MOVIES
+
+
+def test_invalid_records_are_rejected(tmp_path):
+    filename = write_jsonl(tmp_path / "catalog.jsonl", [
+        MOVIES[0],
+        "[1, 2]",
+        "{not json",
+        {"kind": "podcast", "title": "x"},
+        {"title": "no kind"},
+        {**MOVIES[1], "rating": "good"},
+        {**MOVIES[2], "kind": None},
+    ])
+
+    result = parse_shard((filename, 0, None))
+
+    assert [row[1] for row in result["rows"]["movie"]] == ["Movie 0"]
+    assert result["rejected"] == 6
+    assert "expected a JSON object, got list" in result["errors"][0]
+    assert all(error.startswith(f"{filename}@") for error in result["errors"])
+
+
+def test_json_sections_reject_non_objects(tmp_path):
+    filename = tmp_path / "catalog.json"
+    filename.write_text(json.dumps({"movies": [MOVIES[0], "Movie 1"]}))
+
+    result = parse_shard((str(filename), None, None))
+
+    assert len(result["rows"]["movie"]) == 1
+    assert result["errors"] == [f"{filename}:movies[1]: expected a JSON object, got str"]
+
+
+def test_writer_allocates_ids_in_write_order_and_skips_conflicts(database):
+    writer = CatalogWriter(database, commit_rows=2)
+    movie = ("Heat", 1995, 8.3, "Crime", 170)
+    writer.write({"movie": [(None,) + movie, (None, "Ronin", 1998, 7.2, "Action", 122)],
+                  "series": [(10, "Fargo", 2014, 8.9, "Crime", 5)]})
+    writer.write({"movie": [(None,) + movie, (10, "Taken", 2008, 7.8, "Action", 90)],
+                  "episode": [("Pilot", 1, 10), ("Pilot again", 1, 10)],
+                  "director": [(None, "Director", 1, None, "Michael Mann")],
+                  "actor": [(1, "Actor", 1, None, "Al Pacino")]})
+    writer.commit()
+
+    assert writer.counts == {"movie": 2, "series": 1, "episode": 1, "director": 1, "actor": 0}
+    assert writer.conflicts == {"movie": 2, "series": 0, "episode": 1, "director": 0, "actor": 1}
+    assert [(media.id, media.title) for media in database.query(Media).order_by(Media.id)] == [
+        (1, "Heat"), (2, "Ronin"), (10, "Fargo")
+    ]
+    assert [movie.id for movie in database.query(Movie).order_by(Movie.id)] == [1, 2]
+    assert [series.id for series in database.query(Series)] == [10]
+    assert [episode.title for episode in database.query(Episode)] == ["Pilot"]
+    assert [director.name for director in database.query(Director)] == ["Michael Mann"]
+    assert database.query(Actor).count() == 0
+
+
+def test_ingest_writes_shards_in_order_and_rejects_duplicates(database, tmp_path):
+    filename = write_jsonl(tmp_path / "catalog.jsonl", MOVIES + [MOVIES[3], "[1, 2]"])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = ingest_catalog(database, filename, workers=2, shard_bytes=300, commit_rows=5)
+
+    assert report["shards"] > 2
+    assert report["counts"]["movie"] == len(MOVIES)
+    assert report["rejected"] == 2
+    assert "1 movie records: id or natural key already in the database" in report["errors"]
+    assert [(media.id, media.title) for media in database.query(Media).order_by(Media.id)] == [
+        (number + 1, f"Movie {number}") for number in range(len(MOVIES))
+    ]
+    assert database.query(Movie).count() == len(MOVIES)
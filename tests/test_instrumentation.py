@@ -0,0 +1,46 @@
+import time
+
+from sqlalchemy import text
+
+from fakes import FakeDriver
+from instrumentation import QueryStats, instrument_driver
+from utils import setup
+
+
+def test_sqlite_fetch_time_is_recorded(tmp_path):
+    stats = QueryStats()
+    session, engine = setup(str(tmp_path / "stats.db"), stats=stats)
+    statement = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 20000) SELECT i FROM n"
+
+    rows = session.execute(text(statement)).all()
+
+    entry = next(entry for entry in stats.summary() if entry["statement"] == statement)
+    assert len(rows) == entry["rows"] == 20000
+    assert entry["fetch_ms"] > 0
+    assert abs(entry["total_ms"] - entry["execute_ms"] - entry["fetch_ms"]) < 0.002
+    session.close()
+    engine.dispose()
+
+
+def test_neo4j_consumption_counts_as_fetch_time():
+    def slow_records(parameters):
+        class Slow:
+            def __iter__(self):
+                for i in range(3):
+                    time.sleep(0.01)
+                    yield {"i": i}
+        return Slow()
+
+    class SlowDriver(FakeDriver):
+        def respond(self, query, parameters):
+            return slow_records(parameters)
+
+    stats = QueryStats()
+    driver = instrument_driver(SlowDriver(), stats)
+    with driver.session() as session:
+        records = list(session.run("MATCH (n) RETURN n"))
+
+    [entry] = stats.summary()
+    assert len(records) == entry["rows"] == 3
+    assert entry["fetch_ms"] >= 25
+    assert entry["execute_ms"] < entry["fetch_ms"]
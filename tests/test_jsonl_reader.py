@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+from jsonl_reader import iter_jsonl, iter_lines, split_ranges
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def lines_of(filename, ranges):
+    return [line for start, end in ranges for _, line in iter_lines(filename, start, end)]
+
+
+def test_a_cut_exactly_at_a_newline_keeps_the_line_whole(tmp_path):
+    # The first range of 4 bytes ends on the newline of 'aaa'
+    filename = write(tmp_path / "cut.jsonl", b"aaa\nbbb\nccc\n")
+
+    ranges = split_ranges(filename, range_bytes=4)
+
+    assert ranges == [(0, 4), (4, 8), (8, 12)]
+    assert lines_of(filename, ranges) == [b"aaa", b"bbb", b"ccc"]
+
+
+def test_a_missing_final_newline_ends_the_last_range_at_the_file_end(tmp_path):
+    filename = write(tmp_path / "tail.jsonl", b"aaa\nbbb\nccc")
+
+    ranges = split_ranges(filename, range_bytes=5)
+
+    assert ranges == [(0, 8), (8, 11)]
+    assert lines_of(filename, ranges) == [b"aaa", b"bbb", b"ccc"]
+
+
+def test_an_empty_file_has_no_ranges(tmp_path):
+    filename = write(tmp_path / "empty.jsonl", b"")
+
+    assert split_ranges(filename) == []
+    assert split_ranges(filename, parts=4) == []
+    assert list(iter_jsonl(filename)) == []
+
+
+def test_more_parts_than_lines_gives_one_range_per_line(tmp_path):
+    filename = write(tmp_path / "parts.jsonl", b'{"a": 1}\n{"a": 2}\n')
+
+    ranges = split_ranges(filename, parts=10)
+
+    assert ranges == [(0, 9), (9, 18)]
+    assert [record for start, end in ranges for record in iter_jsonl(filename, start, end)] == [{"a": 1}, {"a": 2}]
+
+
+def test_invalid_lines_are_reported_with_their_offset(tmp_path):
+    filename = write(tmp_path / "invalid.jsonl", b'{"a": 1}\n[1, 2]\n')
+
+    with pytest.raises(ValueError, match=f"^{re.escape(filename)}@9: expected a JSON object, got list$"):
+        list(iter_jsonl(filename))
+
+    filename = write(tmp_path / "broken.jsonl", b'{"a": 1}\n{"a":\n')
+    with pytest.raises(ValueError, match=f"^{re.escape(filename)}@9: "):
+        list(iter_jsonl(filename))
@@ -0,0 +1,48 @@
+import contextlib
+import io
+
+import pytest
+
+from print_data import print_cast, print_episodes, print_media, print_watchlist_media
+from query_plans import assert_query_count, capture_statements
+from synthetic_data import populate_synthetic
+from utils import setup
+
+
+LISTINGS = {
+    # Statements for one page: the polymorphic listings join their subclass
+    # tables, print_watchlist_media adds one selectinload SELECT ... IN
+    print_media: 2,
+    print_cast: 2,
+    print_episodes: 2,
+    print_watchlist_media: 3,
+}
+
+
+@pytest.fixture(params=[30, 120])
+def catalog(request, tmp_path):
+    session, engine = setup(str(tmp_path / "listing.db"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        populate_synthetic(session, {"users": request.param, "media": request.param}, str(tmp_path / "catalog.jsonl"))
+    session.expire_all()
+    yield session, engine
+    session.close()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("listing", LISTINGS, ids=lambda listing: listing.__name__)
+def test_listings_run_a_constant_number_of_statements(catalog, listing):
+    session, engine = catalog
+    with assert_query_count(engine, LISTINGS[listing]), contextlib.redirect_stdout(io.StringIO()):
+        listing(session)
+
+
+def test_lazy_loading_is_caught(catalog):
+    session, engine = catalog
+    with capture_statements(engine) as statements, contextlib.redirect_stdout(io.StringIO()):
+        print_watchlist_media(session, eager=False)
+    assert len(statements) > LISTINGS[print_watchlist_media]
+    with pytest.raises(AssertionError, match="Expected at most 3 statements"):
+        with assert_query_count(engine, 3), contextlib.redirect_stdout(io.StringIO()):
+            session.expire_all()
+            print_watchlist_media(session, eager=False)
@@ -0,0 +1,88 @@
+import pytest
+
+from fakes import FakeDriver
+from utils import (
+    MERGE_ACTORS_QUERY,
+    MERGE_DIRECTORS_QUERY,
+    MERGE_MOVIES_QUERY,
+    MERGE_USERS_QUERY,
+    MERGE_REVIEWS_QUERY,
+    SAMPLE_ACTORS,
+    SAMPLE_DIRECTORS,
+    SAMPLE_MOVIES,
+    neo4j_add_relation_actor_movie_director,
+    neo4j_add_relation_user_review_movie,
+    neo4j_lookup_batches,
+    neo4j_write_batches,
+)
+
+
+def batch_sizes(driver):
+    return [len(parameters["rows"]) for statements in driver.transactions for _, parameters in statements]
+
+
+@pytest.mark.parametrize("count, expected", [
+    (0, []),
+    (1, [1]),
+    (3, [3]),
+    (4, [3, 1]),
+    (6, [3, 3]),
+    (7, [3, 3, 1]),
+])
+def test_write_batches_splits_at_batch_size(count, expected):
+    driver = FakeDriver()
+    rows = [{"user_id": i} for i in range(count)]
+
+    written = neo4j_write_batches(driver, MERGE_USERS_QUERY, rows, batch_size=3)
+
+    assert written == count
+    assert batch_sizes(driver) == expected
+    assert not driver.rolled_back
+    assert not driver.runs
+
+
+def test_write_batches_one_statement_per_transaction_in_order():
+    driver = FakeDriver()
+
+    neo4j_write_batches(driver, MERGE_USERS_QUERY, ({"user_id": i} for i in range(5)), batch_size=2)
+
+    assert all(len(statements) == 1 for statements in driver.transactions)
+    assert {query for statements in driver.transactions for query, _ in statements} == {MERGE_USERS_QUERY}
+    sent = [row["user_id"] for statements in driver.transactions for _, parameters in statements
+            for row in parameters["rows"]]
+    assert sent == [0, 1, 2, 3, 4]
+
+
+def test_user_reviews_carry_the_user_id():
+    driver = FakeDriver()
+    user = {"user_id": 7, "name": "Ann", "email": "ann@example.com"}
+    reviews = [{"review_id": i, "movie_id": 1, "rating": 5} for i in range(3)]
+
+    neo4j_add_relation_user_review_movie(driver, user, reviews, batch_size=2)
+
+    queries = [statements[0][0] for statements in driver.transactions]
+    assert queries == [MERGE_USERS_QUERY, MERGE_REVIEWS_QUERY, MERGE_REVIEWS_QUERY]
+    assert batch_sizes(driver) == [1, 2, 1]
+    assert all(row["user_id"] == 7 for statements in driver.transactions[1:] for row in statements[0][1]["rows"])
+
+
+def test_movies_are_written_before_their_cast():
+    driver = FakeDriver()
+
+    neo4j_add_relation_actor_movie_director(driver, batch_size=2)
+
+    queries = [statements[0][0] for statements in driver.transactions]
+    assert queries == [MERGE_MOVIES_QUERY, MERGE_ACTORS_QUERY, MERGE_ACTORS_QUERY, MERGE_DIRECTORS_QUERY]
+    assert batch_sizes(driver) == [len(SAMPLE_MOVIES), 2, 1, len(SAMPLE_DIRECTORS)]
+    assert "cast_id: row.cast_id" in MERGE_ACTORS_QUERY and "cast_id: row.cast_id" in MERGE_DIRECTORS_QUERY
+    assert all("cast_id" in row for row in SAMPLE_ACTORS + SAMPLE_DIRECTORS)
+
+
+def test_lookup_batches_chunks_and_deduplicates_ids():
+    query = "UNWIND $ids AS id RETURN id, rows"
+    driver = FakeDriver({query: lambda parameters: [{"id": i, "rows": [{"value": i}]} for i in parameters["ids"] if i % 2]})
+
+    results = neo4j_lookup_batches(driver, query, [1, 2, 3, 1, 4, 5], chunk_size=2)
+
+    assert [parameters["ids"] for _, parameters in driver.runs] == [[1, 2], [3, 4], [5]]
+    assert results == {1: [{"value": 1}], 2: [], 3: [{"value": 3}], 4: [], 5: [{"value": 5}]}
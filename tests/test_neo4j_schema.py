@@ -0,0 +1,33 @@
+import contextlib
+import io
+
+import utils
+from fakes import FakeDriver
+
+
+def test_schema_failures_are_reported_and_the_driver_is_kept(monkeypatch):
+    failing = utils.neo4j_schema_statement(*utils.NEO4J_SCHEMA[2])
+
+    def duplicate_ids(parameters):
+        raise RuntimeError("Node(12) already exists with label `Movie` and property `id` = 1")
+
+    driver = FakeDriver({failing: duplicate_ids})
+    monkeypatch.setattr(utils.GraphDatabase, "driver", lambda uri: driver)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = utils.neo4j_init("bolt://localhost:7687")
+
+    assert result is driver
+    assert "Failed to initialize Neo4j connection" not in output.getvalue()
+    assert failing in output.getvalue()
+    statements = [statement for statement, _ in driver.runs]
+    assert len(statements) == len(utils.NEO4J_SCHEMA) + 1
+
+
+def test_connection_failures_return_none(monkeypatch):
+    def refuse(uri):
+        raise OSError("Connection refused")
+
+    monkeypatch.setattr(utils.GraphDatabase, "driver", refuse)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert utils.neo4j_init("bolt://localhost:7687") is None
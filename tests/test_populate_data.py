@@ -0,0 +1,152 @@
+import contextlib
+import io
+import json
+import os
+from datetime import date
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+import populate_data
+from classes import Actor, Episode, MainUser, Movie, OtherUser, Review, Series, SubscriptionType, Watchlist, watchlist_media
+from populate_data import (
+    bulk_load_catalog, create_other_user, ensure_natural_keys, populate_cast, populate_episodes, populate_media,
+    populate_reviews, populate_users, populate_watchlist_media, populate_watchlists,
+)
+from utils import setup
+
+
+CATALOG_JSON = os.path.join(os.path.dirname(__file__), "..", "json", "neo4j.json")
+
+POPULATE = [populate_users, populate_watchlists, populate_media, populate_cast, populate_episodes,
+            populate_reviews, populate_watchlist_media]
+
+
+def counts(session):
+    return {
+        "episodes": session.query(Episode).count(),
+        "reviews": session.query(Review).count(),
+        "watchlists": session.query(Watchlist).count(),
+        "watchlist_media": session.query(watchlist_media).count(),
+    }
+
+
+def test_populate_with_upsert_can_be_rerun(tmp_path):
+    session, engine = setup(str(tmp_path / "populate.db"))
+    for populate in POPULATE:
+        populate(session, upsert=True)
+    first = counts(session)
+    for populate in POPULATE:
+        populate(session, upsert=True)
+
+    assert counts(session) == first == {"episodes": 2, "reviews": 1, "watchlists": 1, "watchlist_media": 2}
+    session.close()
+    engine.dispose()
+
+
+def test_upserted_users_from_jsonl_convert_subscription_fields(tmp_path):
+    filename = tmp_path / "users.jsonl"
+    filename.write_text("\n".join(json.dumps(record) for record in [
+        {"username": "ann", "email": "ann@example.com", "iban": "DE1", "price": 9.99,
+         "subscription_type": "Monthly", "start_date": "2024-01-01", "end_date": "2024-02-01"},
+        {"username": "bob", "email": "bob@example.com", "iban": "DE2", "price": 99.0,
+         "subscription_type": "YEARLY", "start_date": "2024-01-01", "end_date": "2025-01-01"},
+    ]))
+    session, engine = setup(str(tmp_path / "users.db"))
+    create_other_user(session, str(filename), upsert=True)
+
+    subscriptions = {user.username: user.subscription for user in session.query(MainUser)}
+    assert subscriptions["ann"].subscription_type == SubscriptionType.MONTHLY
+    assert subscriptions["ann"].enddate == date(2024, 2, 1)
+    assert subscriptions["bob"].subscription_type == SubscriptionType.YEARLY
+    session.close()
+    engine.dispose()
+
+
+def write_jsonl(filename, records):
+    filename.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return str(filename)
+
+
+def test_bulk_load_catalog_flushes_parents_before_a_full_child_batch(tmp_path):
+    records = [{"kind": "movie", "title": f"M{i}", "release_year": 2000 + i, "rating": 7.0, "genre": "Drama",
+                "duration": 90} for i in range(3)]
+    records += [{"kind": "actor", "name": f"A{i}", "description": "", "title": f"M{i % 3}"} for i in range(4)]
+    filename = write_jsonl(tmp_path / "catalog.jsonl", records)
+    session, engine = setup(str(tmp_path / "catalog.db"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        counts = bulk_load_catalog(session, filename, batch_size=4, upsert=True)
+        bulk_load_catalog(session, filename, batch_size=4, upsert=True)
+
+    assert counts == {"movie": 3, "series": 0, "episode": 0, "director": 0, "actor": 4}
+    assert session.query(Movie).count() == 3
+    assert sorted(actor.movie_id for actor in session.query(Actor)) == [1, 1, 2, 3]
+    session.close()
+    engine.dispose()
+
+
+def test_bulk_load_catalog_reads_json_sections(tmp_path):
+    session, engine = setup(str(tmp_path / "json.db"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        counts = bulk_load_catalog(session, CATALOG_JSON)
+
+    assert counts["movie"] == session.query(Movie).count() > 0
+    assert counts["series"] == session.query(Series).count() > 0
+    session.close()
+    engine.dispose()
+
+
+def test_large_json_catalogs_are_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(populate_data, "MAX_JSON_CATALOG_BYTES", 10)
+    with pytest.raises(ValueError, match="convert it to .jsonl"):
+        list(populate_data.iter_catalog_records(CATALOG_JSON))
+
+
+def test_natural_keys_are_not_created_over_duplicates(tmp_path):
+    filename = tmp_path / "users.jsonl"
+    filename.write_text("\n".join(json.dumps({"username": name, "email": "same@example.com"})
+                                  for name in ("ann", "bob")))
+    session, engine = setup(str(tmp_path / "old.db"))
+    # A database from before the unique index
+    session.execute(text("DROP INDEX ix_users_email"))
+    create_other_user(session, str(filename))
+
+    with pytest.raises(RuntimeError, match=r"ix_users_email: users has duplicate \(email\) values: "
+                                           r"\('same@example.com',\) x2"):
+        ensure_natural_keys(session)
+    session.rollback()
+
+    session.delete(session.query(OtherUser).filter_by(username="bob").one())
+    ensure_natural_keys(session)
+    session.commit()
+    assert any(index["name"] == "ix_users_email" and index["unique"]
+               for index in inspect(engine).get_indexes("users"))
+    session.close()
+    engine.dispose()
+
+
+def test_repeated_records_fail_without_upsert(tmp_path):
+    users = tmp_path / "users.jsonl"
+    users.write_text(json.dumps({"username": "ann", "email": "ann@example.com"}) + "\n")
+    catalog = tmp_path / "catalog.jsonl"
+    catalog.write_text(json.dumps({"kind": "movie", "title": "Heat", "release_year": 1995, "rating": 8.3,
+                                   "genre": "Crime", "duration": 170}) + "\n")
+    session, engine = setup(str(tmp_path / "repeat.db"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_other_user(session, str(users))
+        bulk_load_catalog(session, str(catalog))
+
+        with pytest.raises(IntegrityError):
+            create_other_user(session, str(users))
+        session.rollback()
+        with pytest.raises(IntegrityError):
+            bulk_load_catalog(session, str(catalog))
+        session.rollback()
+
+        create_other_user(session, str(users), upsert=True)
+        bulk_load_catalog(session, str(catalog), upsert=True)
+    assert session.query(OtherUser).count() == 1
+    assert session.query(Movie).count() == 1
+    session.close()
+    engine.dispose()
@@ -0,0 +1,23 @@
+from sqlalchemy.orm import with_polymorphic
+
+from classes import Media, Movie, Series
+from print_data import listing, stream_rows
+
+
+def test_stream_rows_pages_across_boundaries(synthetic):
+    session, engine = synthetic
+    ids = [media_id for (media_id,) in session.query(Media.id).order_by(Media.id)]
+
+    entity = with_polymorphic(Media, [Movie, Series])
+    streamed = [media.id for media in stream_rows(session, entity, page_size=7)]
+
+    assert len(ids) > 7
+    assert streamed == ids
+
+
+def test_listing_yields_the_same_rows_in_both_modes(synthetic):
+    session, engine = synthetic
+    entities = listing(session, Media, "media", 9, lightweight=False)
+    rows = listing(session, Media, "media", 9, lightweight=True)
+
+    assert [(media.id, media.title) for media in entities] == [(row.id, row.title) for row in rows]
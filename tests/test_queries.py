@@ -0,0 +1,92 @@
+import contextlib
+import io
+
+import pytest
+
+from queries import Queries
+
+
+def printed(method, session):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [tuple(row) for row in method(session)]
+
+
+@pytest.mark.parametrize("name", ["count_media_per_user", "count_reviews_per_media", "count_episodes_per_series"])
+@pytest.mark.parametrize("materialized", [False, True])
+def test_stream_pages_across_boundaries(synthetic, name, materialized):
+    session, engine = synthetic
+    queries = Queries(materialized)
+    expected = printed(getattr(queries, name), session)
+
+    assert len(expected) > 7
+    assert list(queries.stream(session, name, page_size=7)) == expected
+    assert list(queries.stream(session, name, page_size=len(expected))) == expected
+    assert queries.column_names(session, name)[1].endswith("_count")
+
+
+@pytest.fixture
+def rated(tmp_path):
+    """Fixed media and reviews: a tie at the top and media below min_reviews."""
+    from classes import Movie, OtherUser, Review
+    from utils import setup
+
+    session, engine = setup(str(tmp_path / "rated.db"))
+    media = [("A", 1995, "Drama", [5, 5]), ("B", 1998, "Drama", [5, 5, 5]), ("C", 2001, "Comedy", [4, 4]),
+             ("D", 2003, "Comedy", [3]), ("E", 2005, "Drama", [2, 2]), ("F", 2007, "Action", [])]
+    user = OtherUser(username="critic", email="critic@example.com")
+    session.add(user)
+    session.flush()
+    for media_id, (title, year, genre, ratings) in enumerate(media, 1):
+        session.add(Movie(id=media_id, title=title, release_year=year, rating=7.0, genre=genre, duration=90))
+        session.add_all(Review(user_id=user.id, media_id=media_id, rating=rating) for rating in ratings)
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def ranked(method, session, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [tuple(row) for row in method(session, *args)]
+
+
+@pytest.mark.parametrize("materialized", [False, True])
+def test_top_media_ties_share_a_rank_and_need_min_reviews(rated, materialized):
+    queries = Queries(materialized)
+    assert ranked(queries.top_media_by_rating, rated, 1, 2) == [("A", 5.0, 2, 1), ("B", 5.0, 3, 1)]
+    assert ranked(queries.top_media_by_rating, rated, 3, 2) == [
+        ("A", 5.0, 2, 1), ("B", 5.0, 3, 1), ("C", 4.0, 2, 3)
+    ]
+    assert [row[0] for row in ranked(queries.top_media_by_rating, rated, 10, 1)] == ["A", "B", "C", "D", "E"]
+    assert ranked(queries.top_media_by_rating, rated, 10, 4) == []
+
+
+def test_top_genres_per_decade_break_ties_by_genre(rated):
+    queries = Queries()
+    assert ranked(queries.top_genres_per_decade, rated, 1) == [(1990, "Drama", 2, 1), (2000, "Comedy", 2, 1)]
+    assert ranked(queries.top_genres_per_decade, rated, 3) == [
+        (1990, "Drama", 2, 1), (2000, "Comedy", 2, 1), (2000, "Action", 1, 2), (2000, "Drama", 1, 3)
+    ]
+
+
+def test_rating_percentiles_use_the_nearest_rank(rated):
+    # Drama [2, 2, 5, 5, 5, 5, 5], Comedy [3, 4, 4]
+    assert ranked(Queries().rating_percentiles_by_genre, rated, (0, 2 / 7, 0.3, 1 / 3, 0.5, 1)) == [
+        ("Comedy", 3.0, 3.0, 3.0, 3.0, 4.0, 4.0),
+        ("Drama", 2.0, 2.0, 5.0, 5.0, 5.0, 5.0),
+    ]
+
+
+@pytest.mark.parametrize("name, parameters", [
+    ("top_media_by_rating", {"n": 3, "min_reviews": 1}),
+    ("top_genres_per_decade", {"n": 2}),
+    ("rating_percentiles_by_genre", {}),
+])
+@pytest.mark.parametrize("materialized", [False, True])
+def test_rankings_stream_like_the_listings(rated, name, parameters, materialized):
+    queries = Queries(materialized)
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = [tuple(row) for row in getattr(queries, name)(rated, **parameters)]
+
+    assert list(queries.stream(rated, name, page_size=1, **parameters)) == expected
+    assert len(queries.column_names(rated, name, **parameters)) == len(expected[0])
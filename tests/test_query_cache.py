@@ -0,0 +1,75 @@
+import contextlib
+import io
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from classes import Review
+from query_cache import CachedQueries
+from utils import setup
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    session, engine = setup(str(tmp_path / "cache.db"))
+    session.execute(text("INSERT INTO users VALUES (1, 'ann', 'ann@example.com', 'MAIN_USER')"))
+    session.execute(text("INSERT INTO medias VALUES (1, 'Inception', 2010, 8.8, 'Sci-Fi', 'MOVIE')"))
+    session.execute(text("INSERT INTO reviews VALUES (1, 9.0, 1, 1)"))
+    session.commit()
+    session.close()
+    Session = sessionmaker(bind=engine)
+    writer, reader = Session(), Session()
+    yield writer, reader
+    writer.close()
+    reader.close()
+    engine.dispose()
+
+
+def reviews(cache, session):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return cache.count_reviews_per_media(session)
+
+
+def test_results_are_invalidated_on_commit_not_on_flush(sessions):
+    writer, reader = sessions
+    cache = CachedQueries()
+    assert reviews(cache, writer) == [["Inception", 1]]
+
+    writer.add(Review(rating=7.0, user_id=1, media_id=1))
+    writer.flush()
+    # The writer sees its own flushed row, without caching it
+    assert reviews(cache, writer) == [["Inception", 2]]
+    # Other sessions still get the committed state, which may be cached again
+    assert reviews(cache, reader) == [["Inception", 1]]
+    reader.rollback()
+
+    writer.commit()
+    assert reviews(cache, reader) == [["Inception", 2]]
+    assert reviews(cache, writer) == [["Inception", 2]]
+
+
+def test_rolled_back_writes_are_never_served(sessions):
+    writer, reader = sessions
+    cache = CachedQueries()
+    writer.add_all([Review(rating=7.0, user_id=1, media_id=1), Review(rating=6.0, user_id=1, media_id=1)])
+    writer.flush()
+    assert reviews(cache, writer) == [["Inception", 3]]
+
+    writer.rollback()
+    assert reviews(cache, writer) == [["Inception", 1]]
+    assert cache.metrics()["size"] == 1
+
+
+def test_text_statements_invalidate_on_commit(sessions):
+    writer, reader = sessions
+    cache = CachedQueries()
+    assert reviews(cache, reader) == [["Inception", 1]]
+    reader.rollback()
+
+    cache.watch(writer)
+    writer.execute(text("INSERT INTO reviews (rating, user_id, media_id) VALUES (5.0, 1, 1)"))
+    writer.commit()
+
+    assert reviews(cache, reader) == [["Inception", 2]]
+    assert cache.metrics()["invalidations"] == 1
@@ -0,0 +1,62 @@
+import contextlib
+import io
+
+import pytest
+from sqlalchemy import text
+
+from utils import setup
+from synthetic_data import populate_synthetic
+from query_plans import LARGE_TABLE_ROWS, check_query_plans, full_table_scans, large_tables_by_size
+
+
+def test_only_uncovered_or_repeated_scans_are_full_scans():
+    plan = [
+        (3, 0, "SCAN medias USING COVERING INDEX ix_medias_genre_rating"),
+        (5, 0, "SEARCH reviews USING COVERING INDEX ix_reviews_media_id_rating (media_id=?)"),
+        (8, 0, "SCAN casts USING COVERING INDEX ix_casts_movie_id"),
+        (12, 0, "CORRELATED SCALAR SUBQUERY 1"),
+        (15, 12, "SCAN episodes USING COVERING INDEX ix_episodes_series_id"),
+        (20, 0, "CO-ROUTINE anon_1"),
+        (22, 20, "SCAN watchlists"),
+        (30, 0, "SCAN users"),
+    ]
+    assert full_table_scans(plan) == [
+        "SCAN casts USING COVERING INDEX ix_casts_movie_id",         # inner loop of the join
+        "SCAN episodes USING COVERING INDEX ix_episodes_series_id",  # once per outer row
+        "SCAN watchlists",                                           # no index
+    ]
+    assert full_table_scans([(2, 0, "SCAN medias USING INDEX ix_medias_genre_release_year")]) == [
+        "SCAN medias USING INDEX ix_medias_genre_release_year"
+    ]
+
+
+@pytest.fixture(scope="module")
+def large_database(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("plans")
+    session, engine = setup(str(workdir / "plans.db"), "bulk_load")
+    with contextlib.redirect_stdout(io.StringIO()):
+        populate_synthetic(session, {"users": 1000, "media": LARGE_TABLE_ROWS + 2000},
+                           str(workdir / "catalog.jsonl"))
+    yield session, engine
+    session.close()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("materialized", [False, True])
+def test_queries_pass_at_scale(large_database, materialized):
+    session, engine = large_database
+    check_query_plans(session, engine, materialized=materialized)
+    assert "medias" in large_tables_by_size(engine)
+
+
+def test_a_missing_index_is_reported_at_scale(large_database):
+    session, engine = large_database
+    session.execute(text("DROP INDEX ix_medias_genre_rating"))
+    session.commit()
+    try:
+        with pytest.raises(AssertionError, match="average_rating_by_genre: SCAN medias"):
+            check_query_plans(session, engine)
+        check_query_plans(session, engine, exempt=("average_rating_by_genre", "rating_percentiles_by_genre"))
+    finally:
+        session.execute(text("CREATE INDEX ix_medias_genre_rating ON medias (genre, rating)"))
+        session.commit()
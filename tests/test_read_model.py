@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy.orm import with_polymorphic
+
+from classes import Actor, Cast, Director, Media, Movie, Series, User, Watchlist
+from print_data import stream_rows
+from read_model import READ_MODELS, iter_rows, iter_watchlist_media
+
+
+ORM_LISTINGS = {
+    "users": with_polymorphic(User, "*"),
+    "media": with_polymorphic(Media, [Movie, Series]),
+    "cast": with_polymorphic(Cast, [Director, Actor]),
+}
+
+
+@pytest.mark.parametrize("name", list(ORM_LISTINGS))
+def test_rows_match_the_orm_entities(synthetic, name):
+    session, engine = synthetic
+    row_type = READ_MODELS[name][0]
+    rows = list(iter_rows(session, name, page_size=7))
+    entities = list(stream_rows(session, ORM_LISTINGS[name]))
+
+    assert len(rows) == len(entities) > 7
+    for row, entity in zip(rows, entities):
+        assert row == row_type._make(getattr(entity, field, None) for field in row_type._fields)
+
+
+def test_watchlist_media_rows_match_the_relationship(synthetic):
+    session, engine = synthetic
+    expected = [
+        (watchlist.id, watchlist.user_id, media.id, media.title)
+        for watchlist in session.query(Watchlist).order_by(Watchlist.id)
+        for media in sorted(watchlist.media, key=lambda media: media.id)
+    ]
+    rows = [tuple(row) for row in iter_watchlist_media(session, page_size=4) if row.media_id is not None]
+    assert rows == expected
@@ -0,0 +1,115 @@
+import contextlib
+import io
+
+import pytest
+
+from fakes import FakeDriver
+from recommendations import (
+    CO_WATCHLIST_BATCH_QUERY,
+    MEDIA_IDS_QUERY,
+    MERGE_SIMILAR_QUERY,
+    PRUNE_SIMILAR_QUERY,
+    SHARED_CAST_BATCH_QUERY,
+    build_similarities,
+    score_similarities,
+)
+
+
+def signal(media_id, shared, degree, other_degree):
+    return {"media_id": media_id, "shared": shared, "degree": degree, "other_degree": other_degree}
+
+
+def test_scores_weight_the_cosine_of_both_signals():
+    watchlist = [signal(2, 2, 4, 1), signal(3, 1, 4, 4)]
+    cast = [signal(3, 2, 2, 2), signal(4, 1, 2, 8)]
+
+    scored = score_similarities(watchlist, cast, watchlist_weight=0.7, cast_weight=0.3)
+
+    assert [entry["other_id"] for entry in scored] == [2, 3, 4]
+    assert scored[0] == pytest.approx({"other_id": 2, "watchlist": 1.0, "cast": 0.0, "score": 0.7})
+    assert scored[1] == pytest.approx({"other_id": 3, "watchlist": 0.25, "cast": 1.0, "score": 0.475})
+    assert scored[2] == pytest.approx({"other_id": 4, "watchlist": 0.0, "cast": 0.25, "score": 0.075})
+
+
+def test_only_the_top_k_neighbours_are_kept_ties_by_id():
+    watchlist = [signal(5, 1, 1, 1), signal(3, 1, 1, 1), signal(4, 1, 1, 4)]
+
+    scored = score_similarities(watchlist, [], top_k=2)
+
+    assert [entry["other_id"] for entry in scored] == [3, 5]
+    assert score_similarities([], []) == []
+
+
+class FakeGraph:
+    """SIMILAR_TO edges kept in a dict, written and pruned through a FakeDriver."""
+
+    def __init__(self, watchlist, cast, edges=None):
+        self.watchlist = watchlist
+        self.cast = cast
+        self.edges = dict(edges or {})
+        self.driver = FakeDriver({
+            MEDIA_IDS_QUERY: [{"id": media_id} for media_id in (1, 2, 3)],
+            CO_WATCHLIST_BATCH_QUERY: lambda parameters: self.lookup(self.watchlist, parameters),
+            SHARED_CAST_BATCH_QUERY: lambda parameters: self.lookup(self.cast, parameters),
+            MERGE_SIMILAR_QUERY: self.merge,
+            PRUNE_SIMILAR_QUERY: self.prune,
+        })
+
+    @staticmethod
+    def lookup(rows, parameters):
+        return [{"id": media_id, "rows": rows[media_id]} for media_id in parameters["ids"] if media_id in rows]
+
+    def merge(self, parameters):
+        for row in parameters["rows"]:
+            self.edges[row["media_id"], row["other_id"]] = {"score": row["score"], "run_id": row["run_id"]}
+        return []
+
+    def prune(self, parameters):
+        for row in parameters["rows"]:
+            for key in [key for key, edge in self.edges.items()
+                        if key[0] == row["media_id"] and edge["run_id"] != row["run_id"]]:
+                del self.edges[key]
+        return []
+
+    def scores(self):
+        return {key: round(edge["score"], 6) for key, edge in self.edges.items()}
+
+
+def build(graph, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return build_similarities(graph.driver, **kwargs)
+
+
+def test_build_replaces_the_edges_and_prunes_stale_ones():
+    graph = FakeGraph(
+        watchlist={1: [signal(2, 1, 1, 1), signal(3, 1, 1, 4)], 2: [signal(1, 1, 1, 1)]},
+        cast={1: [signal(3, 1, 1, 1)]},
+        edges={(1, 3): {"score": 0.9, "run_id": 0}, (3, 1): {"score": 0.9, "run_id": 0},
+               (3, 2): {"score": 0.5, "run_id": 0}},
+    )
+
+    report = build(graph, top_k=1, chunk_size=2, batch_size=1)
+
+    assert report == {"media": 3, "edges": 2}
+    # Media 1: 0.7 * 1 for media 2 beats 0.7 * 0.5 + 0.3 * 1 for media 3;
+    # media 3 has no signal left, so its old edges go
+    assert graph.scores() == {(1, 2): 0.7, (2, 1): 0.7}
+    signal_runs = [parameters["ids"] for query, parameters in graph.driver.runs
+                   if query == CO_WATCHLIST_BATCH_QUERY]
+    assert signal_runs == [[1, 2], [3]]
+
+    first_run = {edge["run_id"] for edge in graph.edges.values()}
+    build(graph, top_k=2)
+    assert graph.scores() == {(1, 2): 0.7, (1, 3): 0.65, (2, 1): 0.7}
+    assert {edge["run_id"] for edge in graph.edges.values()}.isdisjoint(first_run)
+
+
+def test_build_for_some_media_leaves_the_others_alone():
+    graph = FakeGraph(watchlist={1: [signal(2, 1, 1, 1)], 2: [signal(1, 1, 1, 1)]}, cast={},
+                      edges={(2, 3): {"score": 0.5, "run_id": 0}})
+
+    report = build(graph, media_ids=[1, 1])
+
+    assert report == {"media": 1, "edges": 1}
+    assert graph.scores() == {(1, 2): 0.7, (2, 3): 0.5}
+    assert all(query != MEDIA_IDS_QUERY for query, _ in graph.driver.runs)
@@ -0,0 +1,43 @@
+import contextlib
+import io
+
+import pytest
+
+from change_log import change_capture_installed
+from classes import ChangeLog, Media
+from populate_data import populate_media
+from utils import RESET_MODES, reset_database, setup
+
+
+def populate(session):
+    with contextlib.redirect_stdout(io.StringIO()):
+        populate_media(session)
+    session.commit()
+
+
+@pytest.mark.parametrize("mode", RESET_MODES)
+@pytest.mark.parametrize("change_capture", [False, True])
+def test_reset_empties_the_database_and_keeps_change_capture(tmp_path, mode, change_capture):
+    session, engine = setup(str(tmp_path / "reset.db"), change_capture=change_capture)
+    populate(session)
+    assert session.query(Media).count() > 0
+    session.close()
+
+    reset_database(engine, mode)
+
+    assert change_capture_installed(engine) == change_capture
+    assert session.query(Media).count() == 0
+    assert session.query(ChangeLog).count() == 0
+    populate(session)
+    assert session.query(Media).count() > 0
+    assert (session.query(ChangeLog).count() > 0) == change_capture
+    session.close()
+    engine.dispose()
+
+
+def test_unknown_modes_are_rejected(tmp_path):
+    session, engine = setup(str(tmp_path / "reset.db"))
+    with pytest.raises(ValueError, match="Unknown reset mode"):
+        reset_database(engine, "drop")
+    session.close()
+    engine.dispose()